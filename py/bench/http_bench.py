@@ -0,0 +1,252 @@
+#!/usr/bin/env python3
+"""HTTP load test for jsee.serve() and jsee.create_app().
+
+Each scenario starts a server in a subprocess (so the load generator does
+not share the server's GIL) and drives it with concurrent keep-alive-free
+clients for a fixed duration. Reports throughput and latency percentiles.
+
+  python bench/http_bench.py                        # all scenarios, both servers
+  python bench/http_bench.py json sse --server serve --concurrency 16
+  python bench/http_bench.py --duration 10 --json results.json
+
+Servers:
+  serve  jsee.serve() (ThreadingHTTPServer)
+  wsgi   jsee.create_app() under wsgiref with a thread per request
+"""
+
+import argparse
+import json
+import os
+import socket
+import socketserver
+import subprocess
+import sys
+import threading
+import time
+import http.client
+import uuid
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+
+# -- models ---------------------------------------------------------------
+
+def add(x: int, y: int = 1) -> int:
+  return x + y
+
+
+def table(rows: int = 5000) -> list:
+  return [{'id': i, 'name': 'row {}'.format(i), 'score': i * 0.5, 'ok': i % 2 == 0}
+          for i in range(rows)]
+
+
+IMAGE = os.urandom(256 * 1024)
+
+
+def image(size: int = 1) -> bytes:
+  return IMAGE
+
+
+def upload(data: str = '') -> dict:
+  return {'size': len(data)}
+
+
+def stream(chunks: int = 50):
+  text = ''
+  for i in range(chunks):
+    text += 'token{} '.format(i)
+    yield {'chat': text}
+
+
+# -- scenarios ------------------------------------------------------------
+
+UPLOAD_BYTES = os.urandom(1024 * 1024)
+BOUNDARY = uuid.uuid4().hex
+
+
+def _multipart(name, filename, content):
+  head = ('--{b}\r\nContent-Disposition: form-data; name="{n}"; filename="{f}"\r\n'
+          'Content-Type: application/octet-stream\r\n\r\n').format(b=BOUNDARY, n=name, f=filename)
+  return head.encode() + content + '\r\n--{}--\r\n'.format(BOUNDARY).encode()
+
+
+def _json_post(path, payload):
+  return 'POST', path, json.dumps(payload).encode(), {'Content-Type': 'application/json'}
+
+
+SCENARIOS = {
+  # name: (model, serve kwargs, request)
+  'json': (add, {}, _json_post('/add', {'x': 1, 'y': 2})),
+  'table': (table, {}, _json_post('/table', {'rows': 5000})),
+  'image': (image, {}, _json_post('/image', {'size': 1})),
+  'upload': (upload, {}, ('POST', '/upload', _multipart('data', 'blob.bin', UPLOAD_BYTES),
+                          {'Content-Type': 'multipart/form-data; boundary=' + BOUNDARY})),
+  'sse': (stream, {'stream': True}, _json_post('/stream', {'chunks': 50})),
+  'static': (add, {}, ('GET', '/', None, {})),
+  'api': (add, {}, ('GET', '/api', None, {})),
+}
+
+
+# -- server subprocess ----------------------------------------------------
+
+def _free_port():
+  with socket.socket() as s:
+    s.bind(('127.0.0.1', 0))
+    return s.getsockname()[1]
+
+
+def run_server(scenario, server, port):
+  """Entry point of the server subprocess."""
+  import jsee
+  model, kwargs, _ = SCENARIOS[scenario]
+  if server == 'serve':
+    jsee.serve(model, host='127.0.0.1', port=port, **kwargs)
+    return
+  from wsgiref.simple_server import WSGIRequestHandler, WSGIServer, make_server
+
+  class ThreadingWSGIServer(socketserver.ThreadingMixIn, WSGIServer):
+    daemon_threads = True
+
+  class QuietHandler(WSGIRequestHandler):
+    def log_message(self, format, *args):
+      pass
+
+  app = jsee.create_app(model, host='127.0.0.1', port=port, **kwargs)
+  make_server('127.0.0.1', port, app, ThreadingWSGIServer, QuietHandler).serve_forever()
+
+
+def start_server(scenario, server):
+  port = _free_port()
+  proc = subprocess.Popen(
+    [sys.executable, os.path.abspath(__file__), '--run-server', scenario, server, str(port)],
+    stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
+  deadline = time.time() + 15
+  while time.time() < deadline:
+    try:
+      socket.create_connection(('127.0.0.1', port), timeout=0.5).close()
+      return proc, port
+    except OSError:
+      if proc.poll() is not None:
+        raise RuntimeError('Server failed: ' + proc.stderr.read().decode())
+      time.sleep(0.05)
+  proc.kill()
+  raise RuntimeError('Server did not start')
+
+
+# -- load generator -------------------------------------------------------
+
+def _request(port, method, path, body, headers):
+  conn = http.client.HTTPConnection('127.0.0.1', port, timeout=30)
+  try:
+    conn.request(method, path, body=body, headers=headers)
+    resp = conn.getresponse()
+    data = resp.read()
+    return resp.status, len(data)
+  finally:
+    conn.close()
+
+
+def load(port, request, concurrency, duration, warmup=0.5):
+  """Run `concurrency` client threads for `duration` seconds."""
+  method, path, body, headers = request
+  latencies = []
+  stats = {'errors': 0, 'bytes': 0}
+  lock = threading.Lock()
+  start = time.perf_counter()
+  measure_from = start + warmup
+  stop_at = measure_from + duration
+
+  def client():
+    local, errors, nbytes = [], 0, 0
+    while True:
+      t0 = time.perf_counter()
+      if t0 >= stop_at:
+        break
+      try:
+        status, size = _request(port, method, path, body, headers)
+        ok = status < 400
+      except OSError:
+        ok, size = False, 0
+      t1 = time.perf_counter()
+      if t0 < measure_from:
+        continue
+      if ok:
+        local.append(t1 - t0)
+        nbytes += size
+      else:
+        errors += 1
+    with lock:
+      latencies.extend(local)
+      stats['errors'] += errors
+      stats['bytes'] += nbytes
+
+  threads = [threading.Thread(target=client) for _ in range(concurrency)]
+  for t in threads:
+    t.start()
+  for t in threads:
+    t.join()
+  latencies.sort()
+  return {
+    'requests': len(latencies),
+    'errors': stats['errors'],
+    'rps': len(latencies) / duration,
+    'mb_per_s': stats['bytes'] / duration / 1e6,
+    'p50_ms': percentile(latencies, 50) * 1000,
+    'p99_ms': percentile(latencies, 99) * 1000,
+    'max_ms': (latencies[-1] if latencies else 0) * 1000,
+  }
+
+
+def percentile(sorted_values, p):
+  """Nearest-rank percentile of an ascending list."""
+  if not sorted_values:
+    return 0.0
+  k = max(0, min(len(sorted_values) - 1, int(round(p / 100.0 * len(sorted_values) + 0.5)) - 1))
+  return sorted_values[k]
+
+
+def main(argv=None):
+  parser = argparse.ArgumentParser(description='HTTP load test for jsee servers')
+  parser.add_argument('scenarios', nargs='*', help='Scenarios to run (default: all): ' + ', '.join(SCENARIOS))
+  parser.add_argument('--server', choices=['serve', 'wsgi', 'both'], default='both')
+  parser.add_argument('--concurrency', type=int, default=8)
+  parser.add_argument('--duration', type=float, default=3.0, help='Seconds per scenario')
+  parser.add_argument('--json', metavar='PATH', help='Write results to a JSON file')
+  parser.add_argument('--run-server', nargs=3, metavar=('SCENARIO', 'SERVER', 'PORT'),
+                      help=argparse.SUPPRESS)
+  args = parser.parse_args(argv)
+
+  if args.run_server:
+    scenario, server, port = args.run_server
+    run_server(scenario, server, int(port))
+    return
+
+  scenarios = args.scenarios or list(SCENARIOS)
+  unknown = [s for s in scenarios if s not in SCENARIOS]
+  if unknown:
+    parser.error('unknown scenario: ' + ', '.join(unknown))
+  servers = ['serve', 'wsgi'] if args.server == 'both' else [args.server]
+
+  results = []
+  print('{:<8} {:<6} {:>9} {:>9} {:>9} {:>9} {:>8} {:>7}'.format(
+    'scenario', 'server', 'req/s', 'p50 ms', 'p99 ms', 'max ms', 'MB/s', 'errors'))
+  for scenario in scenarios:
+    for server in servers:
+      proc, port = start_server(scenario, server)
+      try:
+        r = load(port, SCENARIOS[scenario][2], args.concurrency, args.duration)
+      finally:
+        proc.terminate()
+        proc.wait()
+      r.update(scenario=scenario, server=server, concurrency=args.concurrency)
+      results.append(r)
+      print('{:<8} {:<6} {:>9.1f} {:>9.2f} {:>9.2f} {:>9.2f} {:>8.2f} {:>7}'.format(
+        scenario, server, r['rps'], r['p50_ms'], r['p99_ms'], r['max_ms'], r['mb_per_s'], r['errors']))
+
+  if args.json:
+    with open(args.json, 'w') as f:
+      json.dump({'python': sys.version.split()[0], 'results': results}, f, indent=2)
+
+
+if __name__ == '__main__':
+  main()
@@ -0,0 +1,205 @@
+#!/usr/bin/env python3
+"""Micro-benchmarks for the pure functions on every request.
+
+  python bench/micro_bench.py run                    # print timings
+  python bench/micro_bench.py run table --repeat 3   # only benchmarks matching 'table'
+  python bench/micro_bench.py save                   # store bench/baseline.json
+  python bench/micro_bench.py compare                # run, compare to baseline
+  python bench/micro_bench.py compare --current new.json --threshold 0.2
+
+Each benchmark is timed with timeit (autorange, best of --repeat). compare
+exits with status 1 when a benchmark is slower than the baseline by more
+than the threshold (default 10%). Baselines are machine specific: save
+one before a change and compare after it on the same machine.
+"""
+
+import argparse
+import datetime
+import enum
+import json
+import os
+import platform
+import sys
+import timeit
+from typing import Annotated, Literal, Optional
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+import jsee
+from jsee.jsee import (
+  _parse_multipart,
+  _serialize_result,
+  _serialize_value,
+  _to_table_format,
+  generate_schema,
+  jsee_inputs_to_json_schema,
+)
+
+
+DEFAULT_BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'baseline.json')
+
+
+# -- payloads -------------------------------------------------------------
+
+SMALL_DICT = {'result': 42, 'label': 'ok', 'values': [1, 2, 3], 'nested': {'a': 1}}
+RECORDS = [{'id': i, 'name': 'row {}'.format(i), 'score': i * 0.5, 'ok': i % 2 == 0}
+           for i in range(1000)]
+BLOB = os.urandom(1024 * 1024)
+MIXED_TUPLE = (1, 'two', BLOB[:1024], RECORDS[:100], {'k': 'v'})
+WIDE = [{'c{}'.format(c): r * c for c in range(200)} for r in range(100)]
+TALL = [{'a': i, 'b': i * 2, 'c': 'x', 'd': None, 'e': True} for i in range(100000)]
+
+BOUNDARY = 'benchboundary1234567890'
+
+
+def _multipart(fields, files):
+  parts = []
+  for name, value in fields.items():
+    parts.append('--{}\r\nContent-Disposition: form-data; name="{}"\r\n\r\n{}\r\n'.format(
+      BOUNDARY, name, value).encode())
+  for name, content in files.items():
+    parts.append('--{}\r\nContent-Disposition: form-data; name="{}"; filename="{}.bin"\r\n'
+                 'Content-Type: application/octet-stream\r\n\r\n'.format(BOUNDARY, name, name).encode()
+                 + content + b'\r\n')
+  return b''.join(parts) + '--{}--\r\n'.format(BOUNDARY).encode()
+
+
+MULTIPART_TYPE = 'multipart/form-data; boundary=' + BOUNDARY
+MULTIPART_LARGE = _multipart({'n': 5, 'label': 'x'}, {'data': os.urandom(5 * 1024 * 1024)})
+MULTIPART_FIELDS = _multipart({'f{}'.format(i): i for i in range(200)}, {})
+
+
+class Mode(enum.Enum):
+  FAST = 'fast'
+  SLOW = 'slow'
+
+
+def complex_model(
+  text: Annotated[str, jsee.Text()],
+  temperature: Annotated[float, jsee.Slider(0, 2, 0.1)] = 0.7,
+  top_k: Annotated[int, jsee.Slider(1, 100, 1)] = 40,
+  strategy: Annotated[str, jsee.Radio(['greedy', 'sample', 'beam'])] = 'sample',
+  model: Literal['small', 'base', 'large'] = 'base',
+  mode: Mode = Mode.FAST,
+  tags: Annotated[list, jsee.MultiSelect(['a', 'b', 'c', 'd'])] = None,
+  window: Annotated[list, jsee.Range(0, 100, 5)] = None,
+  color: Annotated[str, jsee.Color()] = '#ff0000',
+  since: Optional[datetime.date] = None,
+  verbose: bool = False,
+) -> Annotated[str, jsee.Markdown()]:
+  """Generate text with many options."""
+  return text
+
+
+COMPLEX_INPUTS = generate_schema(complex_model)['inputs']
+MANY_INPUTS = [dict(inp, name='{}_{}'.format(inp['name'], i)) for i in range(10) for inp in COMPLEX_INPUTS]
+
+
+BENCHMARKS = {
+  'serialize_result.small_dict': lambda: _serialize_result(SMALL_DICT),
+  'serialize_result.records_1k': lambda: _serialize_result(RECORDS),
+  'serialize_result.bytes_1mb': lambda: _serialize_result(BLOB),
+  'serialize_result.tuple_mixed': lambda: _serialize_result(MIXED_TUPLE),
+  'serialize_value.scalar': lambda: _serialize_value(3.14),
+  'serialize_value.records_1k': lambda: _serialize_value(RECORDS),
+  'to_table_format.wide_100x200': lambda: _to_table_format(WIDE),
+  'to_table_format.tall_100kx5': lambda: _to_table_format(TALL),
+  'parse_multipart.file_5mb': lambda: _parse_multipart(MULTIPART_TYPE, MULTIPART_LARGE),
+  'parse_multipart.fields_200': lambda: _parse_multipart(MULTIPART_TYPE, MULTIPART_FIELDS),
+  'generate_schema.annotated': lambda: generate_schema(complex_model),
+  'inputs_to_json_schema.11': lambda: jsee_inputs_to_json_schema(COMPLEX_INPUTS),
+  'inputs_to_json_schema.110': lambda: jsee_inputs_to_json_schema(MANY_INPUTS),
+}
+
+
+# -- running and comparing ------------------------------------------------
+
+def run(names=None, repeat=5):
+  """Time the benchmarks. Returns {name: {best, median, number}} in seconds per call."""
+  results = {}
+  for name, func in BENCHMARKS.items():
+    if names and not any(n in name for n in names):
+      continue
+    timer = timeit.Timer(func)
+    number, _ = timer.autorange()
+    times = sorted(t / number for t in timer.repeat(repeat=repeat, number=number))
+    results[name] = {'best': times[0], 'median': times[len(times) // 2], 'number': number}
+  return results
+
+
+def _document(results):
+  return {
+    'python': platform.python_version(),
+    'machine': platform.machine(),
+    'platform': platform.platform(),
+    'created': datetime.datetime.now().isoformat(timespec='seconds'),
+    'results': results,
+  }
+
+
+def _format_time(seconds):
+  for unit, scale in (('s', 1), ('ms', 1e-3), ('us', 1e-6)):
+    if seconds >= scale:
+      return '{:.2f} {}'.format(seconds / scale, unit)
+  return '{:.0f} ns'.format(seconds / 1e-9)
+
+
+def compare(baseline, current, threshold=0.1):
+  """Print a comparison; return the names slower than baseline by > threshold."""
+  slower = []
+  print('{:<32} {:>12} {:>12} {:>9}'.format('benchmark', 'baseline', 'current', 'change'))
+  for name, cur in current.items():
+    base = baseline.get(name)
+    if base is None:
+      print('{:<32} {:>12} {:>12} {:>9}'.format(name, '-', _format_time(cur['best']), 'new'))
+      continue
+    change = cur['best'] / base['best'] - 1
+    flag = ''
+    if change > threshold:
+      slower.append(name)
+      flag = '  SLOWER'
+    print('{:<32} {:>12} {:>12} {:>+8.1f}%{}'.format(
+      name, _format_time(base['best']), _format_time(cur['best']), change * 100, flag))
+  return slower
+
+
+def main(argv=None):
+  parser = argparse.ArgumentParser(description='jsee micro-benchmarks')
+  parser.add_argument('command', choices=['run', 'save', 'compare'])
+  parser.add_argument('names', nargs='*', help='Only benchmarks whose name contains one of these')
+  parser.add_argument('--baseline', default=DEFAULT_BASELINE, help='Baseline JSON (default: bench/baseline.json)')
+  parser.add_argument('--current', help='compare: results JSON to compare instead of running')
+  parser.add_argument('--out', help='run: also write results to this JSON file')
+  parser.add_argument('--threshold', type=float, default=0.1, help='compare: allowed slowdown (0.1 = 10%%)')
+  parser.add_argument('--repeat', type=int, default=5)
+  # Options may come before or after the benchmark names
+  args = parser.parse_intermixed_args(argv)
+
+  if args.command == 'compare':
+    with open(args.baseline) as f:
+      baseline = json.load(f)['results']
+    if args.current:
+      with open(args.current) as f:
+        current = json.load(f)['results']
+    else:
+      current = run(args.names, args.repeat)
+    slower = compare(baseline, current, args.threshold)
+    if slower:
+      print('\n{} benchmark(s) slower than baseline by more than {:.0f}%'.format(
+        len(slower), args.threshold * 100))
+      return 1
+    return 0
+
+  results = run(args.names, args.repeat)
+  for name, r in results.items():
+    print('{:<32} {:>12}  (x{})'.format(name, _format_time(r['best']), r['number']))
+  path = args.baseline if args.command == 'save' else args.out
+  if path:
+    with open(path, 'w') as f:
+      json.dump(_document(results), f, indent=2)
+    print('Saved ' + path)
+  return 0
+
+
+if __name__ == '__main__':
+  sys.exit(main())
@@ -0,0 +1,121 @@
+#!/usr/bin/env python3
+"""Cold start times: `import jsee` and create_app() in a fresh interpreter.
+
+Each measurement runs in a new subprocess (nothing cached in sys.modules)
+and is repeated; the best and median times are reported.
+
+  python bench/startup_bench.py                     # all measurements
+  python bench/startup_bench.py --repeat 20 --json results.json
+
+Measurements:
+  import       import jsee
+  app          create_app(func): schema, OpenAPI, page and runtime at startup
+  app-build    create_app(func, build=DIR) with an artifact from `jsee build`
+  app-schema   create_app(schema with a .py model): imports the model file
+"""
+
+import argparse
+import json
+import os
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+
+PY_ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.insert(0, PY_ROOT)
+
+
+MODEL = '''from typing import Literal
+
+def predict(text: str = 'hello', n: int = 3, scale: float = 1.5,
+            mode: Literal['fast', 'exact'] = 'fast', flags: list = None) -> dict:
+  """Toy model with a few typed inputs."""
+  return {'text': text * n, 'scale': scale, 'mode': mode}
+'''
+
+# Run in the subprocess; prints seconds
+TIMER = '''import sys, time
+t = time.perf_counter()
+{code}
+print(time.perf_counter() - t)
+'''
+
+LOAD_FUNC = '''
+import importlib.util
+spec = importlib.util.spec_from_file_location('model', 'model.py')
+model = importlib.util.module_from_spec(spec)
+spec.loader.exec_module(model)
+'''
+
+MEASUREMENTS = {
+  'import': 'import jsee',
+  'app': 'import jsee' + LOAD_FUNC + 'jsee.create_app(model.predict)',
+  'app-build': 'import jsee' + LOAD_FUNC + "jsee.create_app(model.predict, build='build')",
+  'app-schema': "import jsee\njsee.create_app('schema.json')",
+}
+
+
+def prepare(workdir):
+  with open(os.path.join(workdir, 'model.py'), 'w') as f:
+    f.write(MODEL)
+  with open(os.path.join(workdir, 'schema.json'), 'w') as f:
+    json.dump({'model': {'name': 'predict', 'url': 'model.py'},
+               'inputs': [{'name': 'text', 'type': 'string'}]}, f)
+  # Same loading as the measurement, so the fingerprint matches
+  code = LOAD_FUNC + "from jsee.artifact import build\nbuild(model.predict, 'build')"
+  subprocess.run([sys.executable, '-c', code], cwd=workdir, check=True, env=_env())
+
+
+def _env():
+  env = dict(os.environ)
+  env['PYTHONPATH'] = os.pathsep.join(filter(None, [os.path.abspath(PY_ROOT), env.get('PYTHONPATH')]))
+  # Bytecode is compiled on the first run; later runs are the usual cold start
+  env.pop('PYTHONDONTWRITEBYTECODE', None)
+  return env
+
+
+def measure(code, workdir, repeat):
+  times = []
+  for _ in range(repeat + 1):
+    out = subprocess.run([sys.executable, '-c', TIMER.format(code=code)], cwd=workdir,
+                         check=True, env=_env(), stdout=subprocess.PIPE, universal_newlines=True)
+    times.append(float(out.stdout.strip().splitlines()[-1]))
+  # The first run writes .pyc files
+  times = times[1:]
+  return {'best_ms': min(times) * 1000, 'median_ms': statistics.median(times) * 1000}
+
+
+def main(argv=None):
+  parser = argparse.ArgumentParser(description='jsee cold start benchmark')
+  parser.add_argument('names', nargs='*', help='Measurements to run (default: all): ' + ', '.join(MEASUREMENTS))
+  parser.add_argument('--repeat', type=int, default=10)
+  parser.add_argument('--json', metavar='PATH', help='Write results to a JSON file')
+  args = parser.parse_args(argv)
+
+  names = args.names or list(MEASUREMENTS)
+  unknown = [n for n in names if n not in MEASUREMENTS]
+  if unknown:
+    parser.error('unknown measurement: ' + ', '.join(unknown))
+
+  workdir = tempfile.mkdtemp(prefix='jsee-startup-')
+  results = []
+  try:
+    prepare(workdir)
+    print('{:<12} {:>9} {:>10}'.format('measurement', 'best ms', 'median ms'))
+    for name in names:
+      r = measure(MEASUREMENTS[name], workdir, args.repeat)
+      r['name'] = name
+      results.append(r)
+      print('{:<12} {:>9.1f} {:>10.1f}'.format(name, r['best_ms'], r['median_ms']))
+  finally:
+    shutil.rmtree(workdir, ignore_errors=True)
+
+  if args.json:
+    with open(args.json, 'w') as f:
+      json.dump({'python': sys.version.split()[0], 'results': results}, f, indent=2)
+
+
+if __name__ == '__main__':
+  main()
@@ -1,5 +1,22 @@
-from .jsee import generate_schema, serve, create_app
 from .types import (
   Slider, Text, Radio, Select, MultiSelect, Range, Color,
   Markdown, Html, Code, Image, Table, Svg, File,
 )
+from .streaming import Append, Patch
+
+
+def __getattr__(name):
+  # The server module is imported on first use: model files that only
+  # `import jsee` for annotations (jsee.Slider, ...) start fast
+  if name in ('generate_schema', 'serve', 'create_app'):
+    from . import jsee as _jsee
+    return getattr(_jsee, name)
+  raise AttributeError('module {!r} has no attribute {!r}'.format(__name__, name))
+
+
+__all__ = [
+  'generate_schema', 'serve', 'create_app',
+  'Slider', 'Text', 'Radio', 'Select', 'MultiSelect', 'Range', 'Color',
+  'Markdown', 'Html', 'Code', 'Image', 'Table', 'Svg', 'File',
+  'Append', 'Patch',
+]
@@ -0,0 +1,141 @@
+"""Prebuilt app artifacts for fast cold starts.
+
+`jsee build example.py func -o build/` (or build()) runs the startup work
+once: schema generation, OpenAPI spec, HTML page and a gzip-compressed
+runtime bundle. serve()/create_app() with build='build/' load it instead
+of introspecting the function, rendering the page and reading the bundle.
+
+    build/manifest.json   model source files and build options
+    build/schema.json     schema as served
+    build/openapi.json    OpenAPI spec (without job endpoints)
+    build/index.html      page, with the address filled in at load
+    build/jsee.js.gz      runtime bundle, sent as is to gzip clients
+
+The manifest records the model source files (size, mtime and SHA-256)
+and the build options. An artifact that doesn't match the current sources
+or options is ignored with a warning, and the app is built as usual.
+"""
+
+import inspect
+import json
+import os
+import sys
+
+
+FORMAT = 2
+ADDRESS_MARK = '\x00jsee-address\x00'
+
+# Options that change the schema or page; server options don't
+SCHEMA_OPTIONS = ('title', 'description', 'examples', 'reactive', 'outputs', 'chat',
+                  'stream', 'deterministic', 'pipeline', 'defaults', 'extra_positional')
+
+
+def _source_files(target):
+  if isinstance(target, str):
+    # The model files are in the schema, whose changes are caught below
+    return [target]
+  if isinstance(target, dict):
+    from .models import schema_models
+    return sorted(schema_models(target).values())
+  try:
+    path = inspect.getsourcefile(target)
+  except TypeError:
+    path = None
+  return [path] if path else []
+
+
+def _sha256(path):
+  import hashlib
+  with open(path, 'rb') as f:
+    return hashlib.sha256(f.read()).hexdigest()
+
+
+def _stat(path):
+  st = os.stat(path)
+  return [st.st_size, st.st_mtime_ns]
+
+
+def key(target, kwargs):
+  """What an app's schema is built from, besides the source file contents."""
+  if isinstance(target, (str, dict)):
+    name = target
+  else:
+    name = '{}.{}'.format(getattr(target, '__module__', ''), getattr(target, '__qualname__', repr(target)))
+  # Unset, false and empty options are the same build
+  options = {k: kwargs[k] for k in SCHEMA_OPTIONS if kwargs.get(k) not in (None, False, {}, [])}
+  return json.loads(json.dumps({'target': name, 'options': options}, sort_keys=True,
+                               default=lambda o: getattr(o, '__dict__', str(o))))
+
+
+def sources(target):
+  """{path: [size, mtime_ns, sha256]} of the files target is built from."""
+  paths = _source_files(target)
+  if isinstance(target, str):
+    from .models import schema_models
+    with open(target, 'r') as f:
+      schema = json.load(f)
+    paths += sorted(schema_models(schema, os.path.dirname(os.path.abspath(target))).values())
+  return {os.path.abspath(p): _stat(p) + [_sha256(p)] for p in paths}
+
+
+def _fresh(manifest, target, kwargs):
+  if manifest.get('format') != FORMAT or manifest.get('key') != key(target, kwargs):
+    return False
+  built = manifest.get('sources', {})
+  if not set(map(os.path.abspath, _source_files(target))) <= set(built):
+    return False
+  for path, (size, mtime, digest) in built.items():
+    try:
+      # Hash only files whose size or mtime changed (e.g. a fresh checkout)
+      if _stat(path) != [size, mtime] and _sha256(path) != digest:
+        return False
+    except OSError:
+      return False
+  return True
+
+
+def build(target, path, host='0.0.0.0', port=5050, **kwargs):
+  """Write the artifact for target (as passed to serve) to directory path."""
+  from .jsee import _App, _render_page, generate_openapi_spec
+  # Before _App, which fills in the model URLs of a dict target
+  manifest = {
+    'format': FORMAT,
+    'key': key(target, kwargs),
+    'sources': sources(target),
+  }
+  app = _App(target, host, port, **kwargs)
+  os.makedirs(path, exist_ok=True)
+  files = {
+    'schema.json': json.dumps(app.schema).encode('utf-8'),
+    'openapi.json': json.dumps(generate_openapi_spec(app.schema)).encode('utf-8'),
+    'index.html': _render_page(app.page_schema, app.models, ADDRESS_MARK),
+  }
+  if app.runtime_bytes:
+    import gzip
+    files['jsee.js.gz'] = gzip.compress(app.runtime_bytes, 9, mtime=0)
+  for name, data in files.items():
+    with open(os.path.join(path, name), 'wb') as f:
+      f.write(data)
+  manifest['files'] = sorted(files)
+  with open(os.path.join(path, 'manifest.json'), 'w') as f:
+    json.dump(manifest, f, indent=2)
+  return manifest
+
+
+def load(path, target, kwargs):
+  """Artifact contents for target, or None when missing or stale."""
+  try:
+    with open(os.path.join(path, 'manifest.json'), 'r') as f:
+      manifest = json.load(f)
+  except (OSError, ValueError) as e:
+    print('jsee: ignoring build {}: {}'.format(path, e), file=sys.stderr)
+    return None
+  if not _fresh(manifest, target, kwargs):
+    print('jsee: build {} is out of date; run `jsee build` again'.format(path), file=sys.stderr)
+    return None
+  artifact = {}
+  for name in manifest['files']:
+    with open(os.path.join(path, name), 'rb') as f:
+      artifact[name] = f.read()
+  artifact['schema.json'] = json.loads(artifact['schema.json'])
+  return artifact
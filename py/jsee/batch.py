@@ -0,0 +1,277 @@
+"""Batch runs: one model call per input record.
+
+Used by `jsee example.py func --batch inputs.jsonl --out results.jsonl`
+and by the POST /<model>/batch endpoint. Records are read lazily from JSONL or CSV and run on a thread or process
+pool with a bounded number of calls in flight, so memory stays flat for
+inputs of any length. Each output line is
+
+    {"index": 12, "result": {...}}    or    {"index": 13, "error": "..."}
+
+where index is the record's position in the input. Output is flushed per
+line; --resume skips indexes already in the output file.
+"""
+
+import collections
+import csv
+import inspect
+import json
+import os
+import sys
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+from .jsee import _serialize_result
+
+
+def detect_arg_value(value):
+  """Auto-detect value type: number, JSON, or string."""
+  if not isinstance(value, str):
+    return value
+  # Number
+  try:
+    if '.' in value:
+      return float(value)
+    return int(value)
+  except ValueError:
+    pass
+  # JSON array or object
+  if value.startswith('[') or value.startswith('{'):
+    try:
+      return json.loads(value)
+    except (json.JSONDecodeError, ValueError):
+      pass
+  # Anything else (including file paths) stays a string
+  return value
+
+
+def read_records(path, fmt=None):
+  """Yield input dicts from a JSONL or CSV file ('-' reads JSONL from stdin).
+
+  CSV cells are strings and are coerced with detect_arg_value (empty cells
+  are dropped so the function default applies). JSONL values keep their
+  JSON types; a line that is not a JSON object yields its ValueError in
+  place of the record, so it fails alone (see read_ndjson).
+  """
+  if fmt is None:
+    fmt = 'csv' if path.lower().endswith('.csv') else 'jsonl'
+  f = sys.stdin if path == '-' else open(path, 'r', newline='' if fmt == 'csv' else None)
+  try:
+    if fmt == 'csv':
+      for row in csv.DictReader(f):
+        yield {k: detect_arg_value(v) for k, v in row.items() if k and v != ''}
+    else:
+      for line in f:
+        line = line.strip()
+        if line:
+          yield _parse_record(line)
+  finally:
+    if f is not sys.stdin:
+      f.close()
+
+
+def _parse_record(line):
+  try:
+    record = json.loads(line)
+  except ValueError as e:
+    return ValueError('Invalid JSON: {}'.format(e))
+  if not isinstance(record, dict):
+    return ValueError('Batch records must be JSON objects: ' + line[:80])
+  return record
+
+
+def read_ndjson(rfile, length, chunk_size=64 * 1024):
+  """Yield (index, record) from an NDJSON request body, reading it lazily.
+
+  A line that is not valid JSON yields its ValueError in place of the
+  record, so it fails alone.
+  """
+  def parse(raw):
+    try:
+      return json.loads(raw)
+    except ValueError as e:
+      return ValueError('Invalid JSON: {}'.format(e))
+
+  index = 0
+  buf = b''
+  remaining = length
+  while remaining > 0:
+    chunk = rfile.read(min(chunk_size, remaining))
+    if not chunk:
+      break
+    remaining -= len(chunk)
+    lines = (buf + chunk).split(b'\n')
+    buf = lines.pop()
+    for raw in lines:
+      if raw.strip():
+        yield index, parse(raw)
+        index += 1
+  if buf.strip():
+    yield index, parse(buf)
+
+
+def completed_indexes(path):
+  """Indexes already written to an output file, for resuming.
+
+  A partial last line (interrupted write) is truncated away.
+  """
+  done = set()
+  if not os.path.exists(path):
+    return done
+  with open(path, 'rb+') as f:
+    valid = 0
+    for line in f:
+      if not line.endswith(b'\n'):
+        break
+      try:
+        done.add(json.loads(line)['index'])
+      except (ValueError, KeyError, TypeError):
+        break
+      valid += len(line)
+    f.truncate(valid)
+  return done
+
+
+def finish(result):
+  """Final value of a model result: generators are consumed to their last chunk."""
+  if inspect.isgenerator(result):
+    last = None
+    for last in result:
+      pass
+    result = last
+  return result
+
+
+def line(index, result=None, error=None):
+  """One output line: {"index", "result"} or {"index", "error"}."""
+  if error is not None:
+    return json.dumps({'index': index, 'error': error}) + '\n'
+  return json.dumps({'index': index, 'result': _serialize_result(result)}, default=str) + '\n'
+
+
+def error_text(e):
+  return '{}: {}'.format(type(e).__name__, e)
+
+
+def imap(call, items, executor, window, ordered=True):
+  """Submit call(record) for (index, record) items, at most `window` in flight.
+
+  Yields (index, future) for finished calls, in input order or, with
+  ordered=False, in completion order. Input is consumed lazily.
+  """
+  pending = collections.deque() if ordered else set()
+  items = iter(items)
+  exhausted = False
+  while True:
+    while not exhausted and len(pending) < window:
+      try:
+        index, record = next(items)
+      except StopIteration:
+        exhausted = True
+        break
+      item = (index, executor.submit(call, record))
+      if ordered:
+        pending.append(item)
+      else:
+        pending.add(item)
+    if not pending:
+      return
+    if ordered:
+      index, future = pending.popleft()
+      yield index, future
+    else:
+      finished, _ = wait([f for _, f in pending], return_when=FIRST_COMPLETED)
+      for item in [p for p in pending if p[1] in finished]:
+        pending.discard(item)
+        yield item
+
+
+class _Progress:
+  def __init__(self, stream, interval=1.0):
+    self.stream = stream
+    self.interval = interval
+    self.start = time.perf_counter()
+    self.last = 0
+    self.done = 0
+    self.errors = 0
+
+  def update(self, error):
+    self.done += 1
+    self.errors += error
+    now = time.perf_counter()
+    if self.stream and now - self.last >= self.interval:
+      self.last = now
+      self.stream.write('\r{} done, {} errors, {:.1f}/s '.format(
+        self.done, self.errors, self.done / (now - self.start)))
+      self.stream.flush()
+
+  def summary(self, skipped):
+    elapsed = time.perf_counter() - self.start
+    return {
+      'done': self.done,
+      'errors': self.errors,
+      'skipped': skipped,
+      'seconds': round(elapsed, 3),
+      'per_second': round(self.done / elapsed, 2) if elapsed else 0.0,
+    }
+
+
+def run_batch(func, records, out, workers=None, pool='thread', ordered=True,
+              skip=(), progress=None, window=None):
+  """Run func over records, writing result lines to `out` (a text stream).
+
+  workers: pool size (default: CPU count)
+  pool: 'thread', or 'process' (via jsee.executor.ProcessRunner)
+  ordered: write in input order; False writes as calls complete
+  skip: input indexes to skip (already done, see completed_indexes)
+  progress: stream for a progress line (e.g. sys.stderr)
+  window: calls in flight at most (default: 4 per worker)
+
+  Returns a summary dict (done, errors, skipped, seconds, per_second).
+  """
+  workers = workers or os.cpu_count() or 1
+  window = window or workers * 4
+  runner = None
+  run = lambda data: finish(func(**data))
+  if pool == 'process' and not inspect.isgeneratorfunction(inspect.unwrap(func)):
+    # Generators stream from the calling process, so they stay on threads
+    from .executor import ProcessRunner
+    name = getattr(func, '__name__', 'model')
+    runner = ProcessRunner({name: func}, workers)
+    run = lambda data: runner.call(name, data)
+  elif pool not in ('thread', 'process'):
+    raise ValueError('pool must be thread or process')
+
+  def call(record):
+    # Unreadable input lines arrive as their exception
+    if isinstance(record, Exception):
+      raise record
+    return run(record)
+
+  tracker = _Progress(progress)
+  skipped = [0]
+
+  def todo():
+    for index, record in enumerate(records):
+      if index in skip:
+        skipped[0] += 1
+      else:
+        yield index, record
+
+  # Threads also drive the process pool: each waits on one worker call
+  executor = ThreadPoolExecutor(workers if runner is None else workers * 2)
+  try:
+    for index, future in imap(call, todo(), executor, window, ordered):
+      try:
+        out.write(line(index, future.result()))
+        tracker.update(0)
+      except Exception as e:
+        out.write(line(index, error=error_text(e)))
+        tracker.update(1)
+      out.flush()
+  finally:
+    executor.shutdown(wait=True)
+    if runner is not None:
+      runner.shutdown()
+    if progress:
+      progress.write('\r')
+  return tracker.summary(skipped[0])
@@ -0,0 +1,239 @@
+"""In-process benchmark of a model with schema-driven random inputs.
+
+Used by `jsee bench example.py func`. Inputs are drawn from the schema
+that generate_schema() builds, so they are values the GUI could send:
+sliders respect min/max/step, selects pick from their options, ranges are
+ordered pairs, and multi-selects are subsets of their options.
+"""
+
+import datetime
+import json
+import random
+import threading
+import time
+import tracemalloc
+from concurrent.futures import ThreadPoolExecutor
+
+from .batch import finish
+from .jsee import _serialize_result
+
+
+_WORDS = ['alpha', 'beta', 'gamma', 'delta', 'model', 'input', 'value', 'data', 'test', 'jsee']
+
+
+def _number(inp, rng, integer):
+  lo = inp.get('min')
+  hi = inp.get('max')
+  default = inp.get('default')
+  if lo is None or hi is None:
+    # No bounds: stay within an order of magnitude of the default
+    center = default if isinstance(default, (int, float)) and not isinstance(default, bool) else 0
+    spread = max(abs(center) * 10, 100)
+    lo = center - spread if lo is None else lo
+    hi = center + spread if hi is None else hi
+  step = inp.get('step')
+  if step:
+    value = lo + step * rng.randint(0, int((hi - lo) / step + 1e-9))
+    return int(round(value)) if integer else round(value, 10)
+  if integer:
+    return rng.randint(int(lo), int(hi))
+  return rng.uniform(lo, hi)
+
+
+def _text(inp, rng):
+  default = inp.get('default')
+  words = max(1, len(default.split())) if isinstance(default, str) and default else rng.randint(1, 8)
+  return ' '.join(rng.choice(_WORDS) for _ in range(words))
+
+
+def random_value(inp, rng):
+  """Random value for one JSEE input, or its default when it can't be generated."""
+  t = inp.get('type', 'string')
+  options = inp.get('options')
+  if inp.get('disabled') and 'default' in inp:
+    return inp['default']
+  if t in ('select', 'categorical', 'radio') and options:
+    return rng.choice(options)
+  if t == 'multi-select':
+    return [o for o in (options or []) if rng.random() < 0.5]
+  if t == 'range':
+    sample = dict(inp, step=inp.get('step'))
+    return sorted([_number(sample, rng, False), _number(sample, rng, False)])
+  if t == 'slider':
+    integer = all(isinstance(inp.get(k, 0), int) for k in ('min', 'max', 'step'))
+    return _number(inp, rng, integer)
+  if t == 'int':
+    return _number(inp, rng, True)
+  if t in ('float', 'number'):
+    return _number(inp, rng, False)
+  if t in ('checkbox', 'toggle', 'bool'):
+    return rng.random() < 0.5
+  if t == 'color':
+    return '#{:06x}'.format(rng.randrange(0x1000000))
+  if t == 'date':
+    return (datetime.date(2000, 1, 1) + datetime.timedelta(days=rng.randrange(365 * 30))).isoformat()
+  if t in ('string', 'text'):
+    return _text(inp, rng)
+  if 'default' in inp:
+    return inp['default']
+  raise ValueError('Cannot generate a value for input {} of type {}; pass --{}=VALUE'.format(
+    inp.get('name'), t, inp.get('name')))
+
+
+def random_inputs(inputs, rng=None, fixed=None):
+  """Random inputs for a schema's input list; `fixed` values are kept as is."""
+  rng = rng or random.Random()
+  fixed = fixed or {}
+  data = {}
+  for inp in inputs or []:
+    name = inp.get('name')
+    if not name:
+      continue
+    data[name] = fixed[name] if name in fixed else random_value(inp, rng)
+  return data
+
+
+def _call(func, data):
+  """Call the model; generators are consumed, returning the last chunk."""
+  return finish(func(**data))
+
+
+def _output_size(result):
+  return len(json.dumps(_serialize_result(result), default=str).encode('utf-8'))
+
+
+def percentile(sorted_values, p):
+  """Nearest-rank percentile of an ascending list."""
+  if not sorted_values:
+    return 0.0
+  k = max(0, min(len(sorted_values) - 1, int(round(p / 100.0 * len(sorted_values) + 0.5)) - 1))
+  return sorted_values[k]
+
+
+def run_benchmark(func, schema, iterations=100, workers=1, seed=None, fixed=None,
+                  warmup=3, memory_calls=10):
+  """Call func with random inputs and measure it.
+
+  Returns a dict with latencies (seconds, ascending), throughput, errors,
+  peak traced memory over `memory_calls` sequential calls, and the sizes
+  of the serialized outputs.
+  """
+  rng = random.Random(seed)
+  inputs = schema.get('inputs')
+  samples = [random_inputs(inputs, rng, fixed) for _ in range(iterations)]
+  for data in samples[:warmup]:
+    try:
+      _call(func, data)
+    except Exception:
+      pass
+
+  latencies = []
+  sizes = []
+  errors = []
+  lock = threading.Lock()
+
+  def one(data):
+    t0 = time.perf_counter()
+    try:
+      result = _call(func, data)
+    except Exception as e:
+      with lock:
+        errors.append('{}: {}'.format(type(e).__name__, e))
+      return
+    elapsed = time.perf_counter() - t0
+    size = _output_size(result)
+    with lock:
+      latencies.append(elapsed)
+      sizes.append(size)
+
+  start = time.perf_counter()
+  if workers > 1:
+    with ThreadPoolExecutor(workers) as pool:
+      list(pool.map(one, samples))
+  else:
+    for data in samples:
+      one(data)
+  wall = time.perf_counter() - start
+
+  # Peak memory in a separate pass: tracing slows calls down
+  peak = None
+  if memory_calls:
+    tracemalloc.start()
+    try:
+      for data in samples[:memory_calls]:
+        tracemalloc.reset_peak()
+        try:
+          _call(func, data)
+        except Exception:
+          continue
+        peak = max(peak or 0, tracemalloc.get_traced_memory()[1])
+    finally:
+      tracemalloc.stop()
+
+  latencies.sort()
+  return {
+    'iterations': iterations,
+    'workers': workers,
+    'wall': wall,
+    'throughput': len(latencies) / wall if wall else 0.0,
+    'latencies': latencies,
+    'errors': errors,
+    'peak_memory': peak,
+    'output_sizes': sizes,
+  }
+
+
+def summary(stats):
+  """JSON-friendly summary of run_benchmark() results (times in ms)."""
+  lat = stats['latencies']
+  sizes = stats['output_sizes']
+  ms = lambda s: round(s * 1000, 4)
+  return {
+    'iterations': stats['iterations'],
+    'workers': stats['workers'],
+    'ok': len(lat),
+    'errors': len(stats['errors']),
+    'first_error': stats['errors'][0] if stats['errors'] else None,
+    'wall_s': round(stats['wall'], 4),
+    'throughput': round(stats['throughput'], 2),
+    'latency_ms': {
+      'min': ms(lat[0]) if lat else None,
+      'mean': ms(sum(lat) / len(lat)) if lat else None,
+      'p50': ms(percentile(lat, 50)),
+      'p90': ms(percentile(lat, 90)),
+      'p99': ms(percentile(lat, 99)),
+      'max': ms(lat[-1]) if lat else None,
+    },
+    'peak_memory_bytes': stats['peak_memory'],
+    'output_bytes': {
+      'mean': round(sum(sizes) / len(sizes)) if sizes else None,
+      'max': max(sizes) if sizes else None,
+    },
+  }
+
+
+def _bytes(n):
+  if n is None:
+    return '-'
+  for unit in ('B', 'KB', 'MB', 'GB'):
+    if n < 1024 or unit == 'GB':
+      return '{:.1f} {}'.format(n, unit) if unit != 'B' else '{} B'.format(n)
+    n /= 1024.0
+
+
+def format_report(name, s):
+  """Human-readable report of a summary()."""
+  lat = s['latency_ms']
+  lines = [
+    'jsee bench {}: {} calls, {} worker(s), {:.2f} s'.format(
+      name, s['iterations'], s['workers'], s['wall_s']),
+    '  latency ms   min {min}  p50 {p50}  p90 {p90}  p99 {p99}  max {max}  mean {mean}'.format(
+      **{k: '-' if v is None else '{:.3f}'.format(v) for k, v in lat.items()}),
+    '  throughput   {:.1f} calls/s'.format(s['throughput']),
+    '  peak memory  {}'.format(_bytes(s['peak_memory_bytes'])),
+    '  output size  mean {}  max {}'.format(
+      _bytes(s['output_bytes']['mean']), _bytes(s['output_bytes']['max'])),
+  ]
+  if s['errors']:
+    lines.append('  errors       {} (first: {})'.format(s['errors'], s['first_error']))
+  return '\n'.join(lines)
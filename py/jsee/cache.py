@@ -0,0 +1,191 @@
+"""Persistent cache of model results, shared by processes and restarts.
+
+serve(..., cache='results.db') (CLI: --cache results.db) keeps the JSON
+results of deterministic model calls in a SQLite database. Every process
+of a server (prefork workers, gunicorn workers running create_app,
+restarts after a deploy) reads and writes the same file, so an expensive
+result is computed once.
+
+An entry is keyed by the model name, the inputs (canonical JSON: sorted
+keys, bytes by their SHA-256) and the SHA-256 of the model's source
+file, so editing the .py invalidates its entries. Streamed (generator)
+results and inputs that aren't JSON are not cached. When the database
+grows over max_bytes, the least recently used entries are deleted.
+
+Only models marked deterministic (serve(..., deterministic=True), or
+"deterministic": true on a schema model) are cached, because their result
+depends on nothing besides the inputs. "cache": false on such a model
+keeps its GET replay but skips this cache.
+"""
+
+import hashlib
+import inspect
+import json
+import os
+import sqlite3
+import threading
+import time
+
+
+DEFAULT_MAX_BYTES = 1024 ** 3
+# Fraction of max_bytes kept after an eviction, so it doesn't run on every write
+LOW_WATER = 0.9
+# The total size is checked after each process writes this fraction of max_bytes
+CHECK_FRACTION = 0.01
+# Recorded last-use times are updated at most this often (seconds)
+TOUCH_INTERVAL = 60
+
+
+def _canonical_default(value):
+  if isinstance(value, (bytes, bytearray)):
+    return {'$sha256': hashlib.sha256(value).hexdigest()}
+  raise TypeError('Not cacheable: {}'.format(type(value).__name__))
+
+
+def canonical(data):
+  """Canonical JSON of model inputs (TypeError when not cacheable)."""
+  return json.dumps(data, sort_keys=True, separators=(',', ':'), ensure_ascii=False,
+                    default=_canonical_default)
+
+
+def source_hash(func):
+  """SHA-256 of the file a model is defined in ('' when unknown)."""
+  try:
+    path = inspect.getsourcefile(inspect.unwrap(func))
+  except TypeError:
+    path = None
+  if not path or not os.path.isfile(path):
+    return ''
+  with open(path, 'rb') as f:
+    return hashlib.sha256(f.read()).hexdigest()
+
+
+class CallKeys:
+  """Keys of model calls: model name, canonical inputs and source hash.
+
+  Used for result cache entries and for the ETags of GET /<model>.
+  """
+
+  def __init__(self):
+    # model name → (func, source hash)
+    self._sources = {}
+
+  def __call__(self, model, func, data):
+    """Key of a call (hex SHA-256), or None when the inputs aren't cacheable."""
+    try:
+      inputs = canonical(data)
+    except (TypeError, ValueError):
+      return None
+    known = self._sources.get(model)
+    if known is None or known[0] is not func:
+      # Lazily loaded models may be imported again from an edited file
+      known = self._sources[model] = (func, source_hash(func))
+    return hashlib.sha256('\0'.join((model, known[1], inputs)).encode('utf-8')).hexdigest()
+
+
+class ResultCache:
+  """SQLite-backed result cache.
+
+  path: database file (created if missing)
+  max_bytes: total size of cached results before the least recently
+    used are evicted
+  """
+
+  def __init__(self, path, max_bytes=DEFAULT_MAX_BYTES):
+    self.path = path
+    self.max_bytes = max_bytes
+    self._lock = threading.Lock()
+    self._conn = None
+    self._pid = None
+    # Bytes written since the total size was last checked
+    self._unchecked = 0
+    self.keys = CallKeys()
+    self._connect()
+
+  def _connect(self):
+    """Connection of this process (a forked child opens its own)."""
+    if self._pid == os.getpid():
+      return self._conn
+    conn = sqlite3.connect(self.path, timeout=30, check_same_thread=False, isolation_level=None)
+    # Readers don't block the writer, or each other, across processes
+    conn.execute('PRAGMA journal_mode=WAL')
+    conn.execute('PRAGMA synchronous=NORMAL')
+    conn.execute(
+      'CREATE TABLE IF NOT EXISTS results (key TEXT PRIMARY KEY, model TEXT, value BLOB, '
+      'size INTEGER, created REAL, used REAL)')
+    conn.execute('CREATE INDEX IF NOT EXISTS results_used ON results (used)')
+    self._conn, self._pid = conn, os.getpid()
+    return conn
+
+  def key(self, model, func, data):
+    """Cache key of a call, or None when the inputs aren't cacheable."""
+    return self.keys(model, func, data)
+
+  def get(self, key):
+    """Cached result (deserialized), or None."""
+    with self._lock:
+      conn = self._connect()
+      row = conn.execute('SELECT value, used FROM results WHERE key = ?', (key,)).fetchone()
+      if row is None:
+        return None
+      now = time.time()
+      if now - row[1] > TOUCH_INTERVAL:
+        conn.execute('UPDATE results SET used = ? WHERE key = ?', (now, key))
+    return json.loads(row[0])
+
+  def put(self, key, model, result):
+    """Store a JSON-serializable result; returns False if it isn't."""
+    try:
+      value = json.dumps(result, separators=(',', ':')).encode('utf-8')
+    except (TypeError, ValueError):
+      return False
+    if len(value) > self.max_bytes:
+      return False
+    now = time.time()
+    with self._lock:
+      conn = self._connect()
+      conn.execute('INSERT OR REPLACE INTO results VALUES (?, ?, ?, ?, ?, ?)',
+                   (key, model, value, len(value), now, now))
+      self._unchecked += len(value)
+      if self._unchecked >= self.max_bytes * CHECK_FRACTION:
+        self._unchecked = 0
+        self._evict(conn)
+    return True
+
+  def _evict(self, conn):
+    total = conn.execute('SELECT COALESCE(SUM(size), 0) FROM results').fetchone()[0]
+    if total <= self.max_bytes:
+      return
+    # One writer at a time; another process may have evicted meanwhile
+    conn.execute('BEGIN IMMEDIATE')
+    try:
+      total = conn.execute('SELECT COALESCE(SUM(size), 0) FROM results').fetchone()[0]
+      target = self.max_bytes * LOW_WATER
+      freed = 0
+      doomed = []
+      for key, size in conn.execute('SELECT key, size FROM results ORDER BY used'):
+        if total - freed <= target:
+          break
+        doomed.append((key,))
+        freed += size
+      conn.executemany('DELETE FROM results WHERE key = ?', doomed)
+      conn.execute('COMMIT')
+    except BaseException:
+      conn.execute('ROLLBACK')
+      raise
+
+  def stats(self):
+    """{entries, bytes} in the cache."""
+    with self._lock:
+      entries, size = self._connect().execute(
+        'SELECT COUNT(*), COALESCE(SUM(size), 0) FROM results').fetchone()
+    return {'entries': entries, 'bytes': size}
+
+  def clear(self, model=None):
+    """Delete all entries, or those of one model."""
+    with self._lock:
+      conn = self._connect()
+      if model is None:
+        conn.execute('DELETE FROM results')
+      else:
+        conn.execute('DELETE FROM results WHERE model = ?', (model,))
@@ -0,0 +1,245 @@
+"""Run model calls in worker processes with shared-memory buffer handoff.
+
+Pickling large inputs (uploaded files) or outputs (images, NumPy arrays)
+through the pool's pipes copies them several times. Buffers above a size
+threshold are instead copied once into `multiprocessing.shared_memory`
+segments and only a small SharedRef descriptor crosses the process
+boundary. Segments are reference counted by the parent and unlinked as
+soon as the call that uses them finishes.
+"""
+
+import atexit
+import inspect
+import itertools
+import multiprocessing
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from multiprocessing import resource_tracker, shared_memory
+
+
+DEFAULT_THRESHOLD = 1024 * 1024
+
+# Functions registered before the pool forks, looked up by key in workers
+_WORKER_FUNCS = {}
+_tokens = itertools.count()
+
+
+class SharedRef:
+  """Picklable descriptor of a buffer stored in a shared memory segment."""
+
+  __slots__ = ('name', 'size', 'kind', 'dtype', 'shape')
+
+  def __init__(self, name, size, kind='bytes', dtype=None, shape=None):
+    self.name = name
+    self.size = size
+    self.kind = kind
+    self.dtype = dtype
+    self.shape = shape
+
+  def __getstate__(self):
+    return (self.name, self.size, self.kind, self.dtype, self.shape)
+
+  def __setstate__(self, state):
+    self.name, self.size, self.kind, self.dtype, self.shape = state
+
+
+def _is_ndarray(value):
+  return type(value).__module__ == 'numpy' and hasattr(value, '__array_interface__')
+
+
+def _to_segment(buf):
+  """Copy a bytes-like buffer into a new segment. Returns the open segment."""
+  size = len(buf)
+  shm = shared_memory.SharedMemory(create=True, size=max(size, 1))
+  shm.buf[:size] = buf
+  return shm
+
+
+def pack(value, threshold=DEFAULT_THRESHOLD, segments=None):
+  """Replace large buffers in a (nested) value with SharedRefs.
+
+  Created segments are appended to `segments`; the caller owns them.
+  """
+  if segments is None:
+    segments = []
+  if isinstance(value, dict):
+    return {k: pack(v, threshold, segments) for k, v in value.items()}
+  if isinstance(value, list):
+    return [pack(v, threshold, segments) for v in value]
+  if isinstance(value, tuple):
+    return tuple(pack(v, threshold, segments) for v in value)
+  if isinstance(value, (bytes, bytearray, memoryview)) and len(value) >= threshold:
+    kind = 'bytearray' if isinstance(value, bytearray) else 'bytes'
+    shm = _to_segment(memoryview(value).cast('B'))
+    segments.append(shm)
+    return SharedRef(shm.name, len(value), kind)
+  if _is_ndarray(value) and value.nbytes >= threshold and not value.dtype.hasobject:
+    arr = value if value.flags['C_CONTIGUOUS'] else value.copy(order='C')
+    shm = _to_segment(memoryview(arr).cast('B'))
+    segments.append(shm)
+    return SharedRef(shm.name, arr.nbytes, 'ndarray', arr.dtype.str, arr.shape)
+  return value
+
+
+def unpack(value, segments=None):
+  """Materialize SharedRefs back into bytes / bytearray / ndarray.
+
+  Attached segments are appended to `segments` so the caller can close
+  (and, if it owns them, unlink) them.
+  """
+  if segments is None:
+    segments = []
+  if isinstance(value, dict):
+    return {k: unpack(v, segments) for k, v in value.items()}
+  if isinstance(value, list):
+    return [unpack(v, segments) for v in value]
+  if isinstance(value, tuple):
+    return tuple(unpack(v, segments) for v in value)
+  if isinstance(value, SharedRef):
+    shm = shared_memory.SharedMemory(name=value.name)
+    segments.append(shm)
+    if value.kind == 'ndarray':
+      import numpy
+      return numpy.ndarray(value.shape, value.dtype, buffer=shm.buf).copy()
+    data = bytes(shm.buf[:value.size])
+    return bytearray(data) if value.kind == 'bytearray' else data
+  return value
+
+
+class SharedBuffers:
+  """Registry of segments owned by this process, alive while a call runs."""
+
+  def __init__(self):
+    self._lock = threading.Lock()
+    self._segments = {}
+
+  def add(self, shm):
+    with self._lock:
+      self._segments[shm.name] = shm
+
+  def release(self, name):
+    with self._lock:
+      shm = self._segments.pop(name)
+    _destroy(shm)
+
+  def __len__(self):
+    return len(self._segments)
+
+  def close(self):
+    """Unlink every segment still registered (shutdown or leak cleanup)."""
+    with self._lock:
+      segments = list(self._segments.values())
+      self._segments.clear()
+    for shm in segments:
+      _destroy(shm)
+
+
+def _destroy(shm):
+  shm.close()
+  try:
+    shm.unlink()
+  except FileNotFoundError:
+    pass
+
+
+def _worker_call(key, func, packed, threshold):
+  """Pool entry point: unpack inputs, run the model, pack outputs."""
+  if func is None:
+    func = _WORKER_FUNCS[key]
+  segments = []
+  try:
+    data = unpack(packed, segments)
+  finally:
+    for shm in segments:
+      shm.close()
+  result = func(**data)
+  if inspect.isgenerator(result):
+    raise TypeError('Generator models cannot run in worker processes')
+  out_segments = []
+  packed_result = pack(result, threshold, out_segments)
+  # Ownership passes to the parent, which unlinks after unpacking
+  for shm in out_segments:
+    shm.close()
+  return packed_result
+
+
+class ProcessRunner:
+  """Process pool for model calls with shared-memory handoff.
+
+  Uses the fork start method where available, so registered functions
+  (including closures and functions loaded from files) are inherited by
+  the workers instead of pickled, and the server script is not re-run.
+  """
+
+  def __init__(self, funcs, processes, threshold=DEFAULT_THRESHOLD):
+    self.processes = processes
+    self.threshold = threshold
+    self.buffers = SharedBuffers()
+    self._token = next(_tokens)
+    methods = multiprocessing.get_all_start_methods()
+    self._fork = 'fork' in methods
+    self._ctx = multiprocessing.get_context('fork' if self._fork else None)
+    for name, func in funcs.items():
+      _WORKER_FUNCS[(self._token, name)] = func
+    self._funcs = funcs
+    self._pool = None
+    self._pool_lock = threading.Lock()
+    # Share one tracker with the workers so returned segments are not
+    # reclaimed when the worker that created them exits
+    if self._fork:
+      resource_tracker.ensure_running()
+    self._start()
+    atexit.register(self.shutdown)
+
+  def _start(self):
+    self._pool = ProcessPoolExecutor(self.processes, mp_context=self._ctx)
+    # Start every worker now, before server threads exist
+    list(self._pool.map(_noop, range(self.processes)))
+
+  def accepts(self, func):
+    """Generator models stream from the server process."""
+    func = inspect.unwrap(func)
+    return not (inspect.isgeneratorfunction(func) or inspect.isasyncgenfunction(func))
+
+  def call(self, name, data):
+    """Run funcs[name](**data) in a worker and return its result."""
+    segments = []
+    packed = pack(data, self.threshold, segments)
+    for shm in segments:
+      self.buffers.add(shm)
+    func = None if self._fork else self._funcs[name]
+    pool = self._pool
+    try:
+      try:
+        packed_result = pool.submit(
+          _worker_call, (self._token, name), func, packed, self.threshold).result()
+      except BrokenProcessPool:
+        # A worker died (e.g. OOM); replace the pool so later calls work.
+        # Concurrent calls see the same broken pool: the first replaces it
+        with self._pool_lock:
+          if self._pool is pool:
+            pool.shutdown(wait=False)
+            self._start()
+        raise RuntimeError('Worker process died while running ' + name)
+    finally:
+      for shm in segments:
+        self.buffers.release(shm.name)
+    out_segments = []
+    try:
+      return unpack(packed_result, out_segments)
+    finally:
+      for shm in out_segments:
+        _destroy(shm)
+
+  def shutdown(self):
+    if self._pool:
+      self._pool.shutdown(wait=False)
+      self._pool = None
+    self.buffers.close()
+    for name in self._funcs:
+      _WORKER_FUNCS.pop((self._token, name), None)
+
+
+def _noop(_):
+  return None
@@ -0,0 +1,132 @@
+"""Idempotency keys for model requests.
+
+A client that may retry a POST sends an `Idempotency-Key` header (any
+unique string, e.g. a UUID). The first request with a key runs the
+model. A retry while it runs waits for it and gets the same response.
+A retry after it finished gets the stored response, with
+`Idempotent-Replayed: true`, for `ttl` seconds. Reusing a key for a
+different model or body is rejected with 422.
+
+Stored responses are kept in memory, bounded by `max_bytes` (oldest
+dropped first), per server process. Streamed (SSE) responses and server
+errors (5xx) are not stored: a retry runs the model again.
+"""
+
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+
+
+HEADER = 'idempotency-key'
+MAX_KEY_LENGTH = 255
+
+
+class KeyReused(Exception):
+  """Raised when a key is sent again with a different request."""
+
+
+class _Entry:
+  __slots__ = ('fingerprint', 'done', 'response', 'size', 'expires')
+
+  def __init__(self, fingerprint):
+    self.fingerprint = fingerprint
+    self.done = threading.Event()
+    self.response = None
+    self.size = 0
+    self.expires = None
+
+
+class IdempotencyStore:
+  """In-flight and completed responses by idempotency key.
+
+  ttl: seconds a completed response is replayed
+  max_bytes: memory for stored responses (bodies and headers)
+  wait: seconds a retry waits for the in-flight request before giving up
+  """
+
+  def __init__(self, ttl=24 * 3600, max_bytes=64 * 1024 * 1024, wait=300):
+    self.ttl = ttl
+    self.max_bytes = max_bytes
+    self.wait = wait
+    self._lock = threading.Lock()
+    # key → _Entry; an entry moves to the end when it completes
+    self._entries = OrderedDict()
+    self._bytes = 0
+
+  def begin(self, key, fingerprint):
+    """Stored response for key, or None if the caller should run the request.
+
+    A None caller must then call complete() or abandon(). Raises KeyReused
+    for a different fingerprint and TimeoutError when the in-flight
+    request takes longer than `wait`.
+    """
+    deadline = time.monotonic() + self.wait
+    while True:
+      with self._lock:
+        self._purge()
+        entry = self._entries.get(key)
+        if entry is None:
+          self._entries[key] = _Entry(fingerprint)
+          return None
+        if entry.fingerprint != fingerprint:
+          raise KeyReused('Idempotency-Key was used for a different request')
+        if entry.response is not None:
+          return entry.response
+      # In flight: wait, then replay it (or run it, if it was abandoned)
+      if not entry.done.wait(max(deadline - time.monotonic(), 0)):
+        raise TimeoutError('A request with this Idempotency-Key is still running')
+
+  def complete(self, key, response):
+    """Store the response (status, headers, bytes body) of a begun request."""
+    status, headers, body = response
+    size = len(body) + sum(len(k) + len(v) for k, v in headers) + len(key)
+    with self._lock:
+      entry = self._entries.get(key)
+      if entry is None:
+        return
+      if size > self.max_bytes:
+        # Too large to keep; waiting retries run the request themselves
+        del self._entries[key]
+      else:
+        entry.response = response
+        entry.size = size
+        entry.expires = time.monotonic() + self.ttl
+        self._bytes += size
+        self._entries.move_to_end(key)
+        self._evict()
+    entry.done.set()
+
+  def abandon(self, key):
+    """Forget a begun request without storing its response."""
+    with self._lock:
+      entry = self._entries.pop(key, None)
+    if entry is not None:
+      entry.done.set()
+
+  def _completed(self):
+    return (k for k, e in self._entries.items() if e.response is not None)
+
+  def _purge(self):
+    now = time.monotonic()
+    expired = []
+    # Completed entries are in expiry order
+    for k in self._completed():
+      if self._entries[k].expires > now:
+        break
+      expired.append(k)
+    for k in expired:
+      self._bytes -= self._entries.pop(k).size
+
+  def _evict(self):
+    while self._bytes > self.max_bytes:
+      oldest = next(self._completed())
+      self._bytes -= self._entries.pop(oldest).size
+
+  def __len__(self):
+    return len(self._entries)
+
+
+def fingerprint(model, body):
+  """Identity of a request, to detect a key reused for another one."""
+  return hashlib.sha256(model.encode('utf-8') + b'\0' + body).hexdigest()
@@ -0,0 +1,413 @@
+"""Background jobs for long-running model calls.
+
+A job is submitted with a model name and inputs and gets an ID right
+away; worker threads run it while clients poll its status or subscribe
+to progress over SSE. Jobs are bounded in number and finished jobs expire
+after a TTL. With a SQLite database path, jobs are written through to
+disk so queued (and interrupted) jobs are run again after a restart and
+results stay available until they expire.
+
+Jobs can also be run by remote workers (`jsee worker`, see jsee.worker):
+a worker claims a job with a lease, extends the lease with heartbeats
+while it runs, and reports the result. Jobs whose lease runs out (the
+worker died or lost its connection) are queued again, up to
+`max_attempts` times.
+"""
+
+import inspect
+import json
+import queue
+import sqlite3
+import threading
+import time
+import uuid
+
+from .streaming import OutputState
+
+
+FINISHED = ('done', 'error', 'cancelled')
+
+
+class QueueFull(Exception):
+  """Raised when the job queue has no room for another job."""
+
+
+class LeaseLost(Exception):
+  """Raised when a worker reports on a job it no longer holds."""
+
+
+class JobQueue:
+  """Bounded job queue with a pool of worker threads.
+
+  db: SQLite path for a persistent queue (None keeps jobs in memory)
+  workers: number of worker threads running jobs
+  max_jobs: jobs kept at once (queued, running and unexpired results)
+  ttl: seconds a finished job is kept
+  lease: seconds a remote worker holds a claimed job without a heartbeat
+  max_attempts: claims of a job before it fails (retries of lost workers)
+  """
+
+  def __init__(self, db=None, workers=2, max_jobs=1000, ttl=3600, lease=30, max_attempts=3):
+    self.db = db
+    self.workers = workers
+    self.max_jobs = max_jobs
+    self.ttl = ttl
+    self.lease = lease
+    self.max_attempts = max_attempts
+    self._jobs = {}
+    self._queue = queue.Queue()
+    self._cond = threading.Condition()
+    self._threads = []
+    self._conn = None
+    if db:
+      self._conn = sqlite3.connect(db, check_same_thread=False)
+      self._conn.execute(
+        'CREATE TABLE IF NOT EXISTS jobs (id TEXT PRIMARY KEY, model TEXT, inputs TEXT, '
+        'status TEXT, result TEXT, error TEXT, created REAL, started REAL, finished REAL)')
+      self._conn.commit()
+      self._restore()
+
+  # -- persistence ------------------------------------------------------
+
+  def _save(self, job, inputs=False):
+    if not self._conn:
+      return
+    result = json.dumps(job['result']) if job.get('result') is not None else None
+    if inputs:
+      self._conn.execute(
+        'INSERT OR REPLACE INTO jobs VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)',
+        (job['id'], job['model'], json.dumps(job['inputs']), job['status'], result,
+         job['error'], job['created'], job['started'], job['finished']))
+    else:
+      self._conn.execute(
+        'UPDATE jobs SET status = ?, result = ?, error = ?, started = ?, finished = ? WHERE id = ?',
+        (job['status'], result, job['error'], job['started'], job['finished'], job['id']))
+    self._conn.commit()
+
+  def _restore(self):
+    """Load unexpired jobs; queued and interrupted running jobs run again."""
+    cutoff = time.time() - self.ttl
+    self._conn.execute('DELETE FROM jobs WHERE finished IS NOT NULL AND finished < ?', (cutoff,))
+    self._conn.commit()
+    rows = self._conn.execute(
+      'SELECT id, model, inputs, status, result, error, created, started, finished '
+      'FROM jobs ORDER BY created').fetchall()
+    for id_, model, inputs, status, result, error, created, started, finished in rows:
+      job = self._new(id_, model, json.loads(inputs), created)
+      if status in FINISHED:
+        job.update(status=status, error=error, started=started, finished=finished,
+                   result=json.loads(result) if result else None, inputs=None)
+      else:
+        self._enqueue(id_)
+      self._jobs[id_] = job
+
+  # -- lifecycle --------------------------------------------------------
+
+  def start(self, run, serialize):
+    """Start worker threads. run(model, inputs) returns the model result."""
+    self._run = run
+    self._serialize = serialize
+    for _ in range(self.workers):
+      t = threading.Thread(target=self._work, daemon=True)
+      t.start()
+      self._threads.append(t)
+
+  def _enqueue(self, job_id):
+    """Hand a queued job to the local worker threads, if there are any;
+    remote workers find it in claim()."""
+    if self.workers:
+      self._queue.put(job_id)
+
+  def _new(self, job_id, model, inputs, created):
+    return {
+      'id': job_id, 'model': model, 'inputs': inputs, 'status': 'queued',
+      'created': created, 'started': None, 'finished': None,
+      'result': None, 'error': None, 'state': None, 'progress': None,
+      'version': 0, 'cancelled': False,
+      'worker': None, 'token': None, 'lease_until': None, 'attempts': 0,
+    }
+
+  def _purge(self):
+    """Drop expired jobs, then the oldest finished ones if still full.
+
+    Also requeues jobs of remote workers whose lease ran out.
+    """
+    now = time.time()
+    for job in self._jobs.values():
+      if job['status'] == 'running' and job['lease_until'] and job['lease_until'] < now:
+        self._lost(job)
+    expired = [j['id'] for j in self._jobs.values()
+               if j['finished'] and now - j['finished'] > self.ttl]
+    finished = sorted((j for j in self._jobs.values() if j['finished'] and j['id'] not in expired),
+                      key=lambda j: j['finished'])
+    while len(self._jobs) - len(expired) >= self.max_jobs and finished:
+      expired.append(finished.pop(0)['id'])
+    for job_id in expired:
+      del self._jobs[job_id]
+    if expired and self._conn:
+      self._conn.executemany('DELETE FROM jobs WHERE id = ?', [(i,) for i in expired])
+      self._conn.commit()
+
+  def submit(self, model, inputs):
+    """Queue a job. Raises QueueFull when max_jobs are queued or running."""
+    if self._conn:
+      try:
+        json.dumps(inputs)
+      except (TypeError, ValueError):
+        raise ValueError('Inputs of persistent jobs must be JSON (use /api/uploads for files)')
+    with self._cond:
+      self._purge()
+      if len(self._jobs) >= self.max_jobs:
+        raise QueueFull('Too many jobs ({})'.format(self.max_jobs))
+      job = self._new(uuid.uuid4().hex, model, inputs, time.time())
+      self._jobs[job['id']] = job
+      self._save(job, inputs=True)
+      # Wake remote workers waiting in claim()
+      self._cond.notify_all()
+    self._enqueue(job['id'])
+    return self._info(job)
+
+  def _work(self):
+    while True:
+      job_id = self._queue.get()
+      with self._cond:
+        job = self._jobs.get(job_id)
+        if job is None or job['status'] != 'queued':
+          continue
+        job['status'] = 'running'
+        job['started'] = time.time()
+        job['version'] += 1
+        inputs = job['inputs']
+        self._save(job)
+        self._cond.notify_all()
+      self._execute(job, inputs)
+
+  def _lost(self, job):
+    """A remote worker stopped heartbeating: retry the job or give up."""
+    job.update(worker=None, token=None, lease_until=None, progress=None)
+    job['version'] += 1
+    if job['cancelled']:
+      self._finish(job, None, 'cancelled', None)
+    elif job['attempts'] >= self.max_attempts:
+      self._finish(job, None, 'error', 'Worker lost ({} attempts)'.format(job['attempts']))
+    else:
+      job.update(status='queued', started=None)
+      self._save(job)
+      self._enqueue(job['id'])
+      self._cond.notify_all()
+
+  def _finish(self, job, output, status, error):
+    """Record the outcome of a job. Called with the lock held."""
+    if job['cancelled']:
+      status, output = 'cancelled', None
+    job.update(status=status, result=output, error=error, finished=time.time(),
+               inputs=None, state=None, progress=None, token=None, lease_until=None)
+    job['version'] += 1
+    self._save(job)
+    self._cond.notify_all()
+
+  def _execute(self, job, inputs):
+    try:
+      result = self._run(job['model'], inputs)
+      if inspect.isgenerator(result):
+        # Progress: the outputs as a streaming client would see them
+        state = OutputState(self._serialize, track=False)
+        with self._cond:
+          job['state'] = state
+        for chunk in result:
+          with self._cond:
+            if job['cancelled']:
+              result.close()
+              break
+            state.apply(chunk)
+            job['version'] += 1
+            self._cond.notify_all()
+        output = state.current
+      else:
+        output = self._serialize(result)
+      status, error = 'done', None
+    except Exception as e:
+      output, status, error = None, 'error', str(e)
+    with self._cond:
+      self._finish(job, output, status, error)
+
+  # -- remote workers ---------------------------------------------------
+
+  def claim(self, models=None, worker=None, wait=0):
+    """Lease the oldest queued job of one of `models` (all if None).
+
+    Waits up to `wait` seconds for a job. Returns {id, model, inputs,
+    token, lease} or None; the token authenticates heartbeat() and
+    complete() calls for this attempt.
+    """
+    deadline = time.time() + wait
+    with self._cond:
+      while True:
+        self._purge()
+        for job in self._jobs.values():
+          if job['status'] == 'queued' and not job['cancelled'] \
+              and (models is None or job['model'] in models):
+            break
+        else:
+          job = None
+        if job is not None:
+          break
+        remaining = deadline - time.time()
+        if remaining <= 0:
+          return None
+        self._cond.wait(min(remaining, self.lease))
+      job.update(status='running', started=time.time(), worker=worker,
+                 token=uuid.uuid4().hex, lease_until=time.time() + self.lease)
+      job['attempts'] += 1
+      job['version'] += 1
+      self._save(job)
+      self._cond.notify_all()
+      return {'id': job['id'], 'model': job['model'], 'inputs': job['inputs'],
+              'token': job['token'], 'lease': self.lease}
+
+  def _leased(self, job_id, token):
+    job = self._get(job_id)
+    if job['status'] != 'running' or not token or job['token'] != token:
+      raise LeaseLost('Lease lost: {}'.format(job_id))
+    return job
+
+  def heartbeat(self, job_id, token, progress=None):
+    """Extend the lease of a claimed job, optionally with its progress
+    (the outputs streamed so far). Raises LeaseLost when the job was
+    cancelled or given to another worker; the worker should stop."""
+    with self._cond:
+      job = self._leased(job_id, token)
+      if job['cancelled']:
+        raise LeaseLost('Job cancelled: {}'.format(job_id))
+      job['lease_until'] = time.time() + self.lease
+      if progress is not None:
+        job['progress'] = progress
+        job['version'] += 1
+        self._cond.notify_all()
+      return {'id': job_id, 'lease': self.lease}
+
+  def complete(self, job_id, token, result=None, error=None):
+    """Report the serialized result (or error message) of a claimed job."""
+    with self._cond:
+      job = self._leased(job_id, token)
+      if error is not None:
+        self._finish(job, None, 'error', str(error))
+      else:
+        self._finish(job, result, 'done', None)
+      return self._info(job, result=False)
+
+  # -- queries ----------------------------------------------------------
+
+  def _info(self, job, result=True):
+    info = {k: job[k] for k in ('id', 'model', 'status', 'created', 'started', 'finished')}
+    if job['worker']:
+      info['worker'] = job['worker']
+    if job['attempts'] > 1:
+      info['attempts'] = job['attempts']
+    if job['error']:
+      info['error'] = job['error']
+    if result and job['status'] == 'done':
+      info['result'] = job['result']
+    elif result and _progress(job) is not None:
+      info['progress'] = _progress(job)
+    return info
+
+  def _get(self, job_id):
+    job = self._jobs.get(job_id)
+    if job is None:
+      raise KeyError('Unknown job: {}'.format(job_id))
+    return job
+
+  def get(self, job_id):
+    """Job status, with `progress` while running and `result` when done."""
+    with self._cond:
+      self._purge()
+      return json.loads(json.dumps(self._info(self._get(job_id))))
+
+  def list(self):
+    with self._cond:
+      self._purge()
+      return [self._info(j, result=False) for j in self._jobs.values()]
+
+  def cancel(self, job_id):
+    """Cancel a queued or running job, or forget a finished one.
+
+    Running generator jobs stop at the next chunk; plain calls finish but
+    their result is discarded. Remote workers are told at their next
+    heartbeat.
+    """
+    with self._cond:
+      job = self._get(job_id)
+      if job['status'] in FINISHED:
+        del self._jobs[job_id]
+        if self._conn:
+          self._conn.execute('DELETE FROM jobs WHERE id = ?', (job_id,))
+          self._conn.commit()
+        return {'id': job_id, 'status': 'deleted'}
+      job['cancelled'] = True
+      if job['status'] == 'queued':
+        self._finish(job, None, 'cancelled', None)
+      self._cond.notify_all()
+      return self._info(job, result=False)
+
+  def counts(self):
+    """Number of jobs by status."""
+    with self._cond:
+      counts = dict.fromkeys(('queued', 'running') + FINISHED, 0)
+      for job in self._jobs.values():
+        counts[job['status']] += 1
+      return counts
+
+  def __len__(self):
+    return len(self._jobs)
+
+  def events(self, job_id, heartbeat=15):
+    """SSE frames for a job: `status` on state changes, `progress` with the
+    current outputs, then `result` or `error`, ending with [DONE]."""
+    with self._cond:
+      self._get(job_id)
+    return self._events(job_id, heartbeat)
+
+  def _events(self, job_id, heartbeat):
+    version = -1
+    status = None
+    finished = False
+    while not finished:
+      # Frames are built under the lock and written outside it
+      frames = []
+      with self._cond:
+        job = self._jobs.get(job_id)
+        if job is not None and job['version'] == version:
+          self._cond.wait(heartbeat)
+          job = self._jobs.get(job_id)
+        if job is None:
+          frames.append(_event('error', {'error': 'Job expired'}))
+          finished = True
+        elif job['version'] == version:
+          frames.append(b': keepalive\n\n')
+        else:
+          version = job['version']
+          if job['status'] != status:
+            status = job['status']
+            frames.append(_event('status', self._info(job, result=False)))
+          if job['status'] == 'running' and _progress(job) is not None:
+            frames.append(_event('progress', _progress(job)))
+          if job['status'] == 'done':
+            frames.append(_event('result', job['result']))
+          elif job['status'] in FINISHED and job['error']:
+            frames.append(_event('error', {'error': job['error']}))
+          finished = job['status'] in FINISHED
+      for frame in frames:
+        yield frame
+    yield b'data: [DONE]\n\n'
+
+
+def _progress(job):
+  """Outputs streamed so far, by a local generator or a remote worker."""
+  if job['state'] is not None:
+    return job['state'].current
+  return job['progress']
+
+
+def _event(name, data):
+  return 'event: {}\ndata: {}\n\n'.format(name, json.dumps(data)).encode('utf-8')
@@ -1,22 +1,29 @@
 #!/usr/bin/env python3
 
-import base64
-import datetime
+import atexit
 import enum
+import functools
 import inspect
 import io
 import json
 import os
+import sys
+import threading
+import time
 import typing
-import importlib
 from inspect import signature, _empty
-from http.server import HTTPServer, BaseHTTPRequestHandler
-import urllib.parse
 
 from .types import (
   Slider, Text, Radio, Select, MultiSelect, Range, Color,
   Markdown, Html, Code, Image, Table, Svg, File, OUTPUT_TYPE_MAP,
 )
+from .lifecycle import Lifecycle, is_model_class
+from .models import ModelRegistry, load_model, schema_models
+from .streaming import sse_stream
+
+# Imported on first use, to keep `import jsee` and server start fast:
+# base64, datetime, http, urllib.parse, concurrent.futures and the
+# optional server features (.jobs, .metrics, .profiling, .sessions, .uploads)
 
 
 FULL_BUNDLE_TYPES = {'chart', '3d', 'map'}
@@ -67,6 +74,7 @@ TEMPLATE = """<!DOCTYPE html>
 <body>
   <div id="jsee-serve-bar" style="background:#f8f8f8;border-bottom:1px solid #e0e0e0;padding:6px 15px;font-size:13px;color:#828282;display:flex;align-items:center;gap:16px">
     <span style="font-family:monospace">{address}</span>
+    <span id="jsee-timing" style="font-family:monospace;color:#aaa" title="Server time of the last call"></span>
     <span style="flex:1"></span>
     <label style="color:#aaa;cursor:not-allowed" title="Server execution only"><input type="checkbox" disabled style="margin-right:4px">Browser</label>
     <button id="save-html-btn" style="background:none;border:1px solid #ddd;border-radius:3px;padding:3px 10px;font-size:12px;color:#555;cursor:pointer" title="Save as self-contained HTML file">Save HTML</button>
@@ -85,6 +93,18 @@ TEMPLATE = """<!DOCTYPE html>
     if (saveBtn) {{
       saveBtn.addEventListener('click', function () {{ env.download("{name}") }})
     }}
+    // Show the Server-Timing breakdown of the last model call
+    var timingEl = document.getElementById('jsee-timing')
+    if (timingEl && window.PerformanceObserver) {{
+      new PerformanceObserver(function (list) {{
+        list.getEntries().forEach(function (e) {{
+          if (!e.serverTiming || !e.serverTiming.length) return
+          timingEl.textContent = e.serverTiming.map(function (t) {{
+            return t.name + ' ' + t.duration.toFixed(1) + 'ms'
+          }}).join(' · ') + ' · total ' + e.duration.toFixed(1) + 'ms'
+        }})
+      }}).observe({{ type: 'resource', buffered: true }})
+    }}
   </script>
 </body>
 </html>"""
@@ -150,7 +170,8 @@ def _type_hint_to_jsee(hint):
     return 'float', {}
   if hint == bool:
     return 'checkbox', {}
-  if hint == datetime.date:
+  # datetime.date, without importing datetime
+  if getattr(hint, '__module__', None) == 'datetime' and hint.__name__ == 'date':
     return 'date', {}
   return 'string', {}
 
@@ -225,11 +246,17 @@ def generate_schema(target, host='0.0.0.0', port=5050, **kwargs):
       {'data': 'table', 'chart': jsee.Image()} or
       [{'name': 'result', 'type': 'markdown'}]
     chat: bool — chat mode (text input + chat output, history injected by runtime)
+    deterministic: bool — same inputs, same result: also serve the model
+      at GET /<model>?name=value with ETag and Cache-Control headers
   """
-  hints = typing.get_type_hints(target, include_extras=True)
-  sig = signature(target)
+  # Model classes (see jsee.lifecycle) are described by their __call__
+  func = target.__call__ if is_model_class(target) else target
+  hints = typing.get_type_hints(func, include_extras=True)
+  params = list(signature(func).parameters.items())
+  if func is not target:
+    params = params[1:]
   inputs = []
-  for name, param in sig.parameters.items():
+  for name, param in params:
     jsee_type = 'string'
     extra = {}
     if name in hints:
@@ -298,6 +325,8 @@ def generate_schema(target, host='0.0.0.0', port=5050, **kwargs):
     schema['reactive'] = True
   if kwargs.get('stream'):
     schema['model']['stream'] = True
+  if kwargs.get('deterministic'):
+    schema['model']['deterministic'] = True
   return schema
 
 
@@ -348,8 +377,38 @@ def jsee_inputs_to_json_schema(inputs):
   return {'type': 'object', 'properties': properties, 'required': required}
 
 
-def generate_openapi_spec(schema):
-  """Generate OpenAPI 3.1 spec from JSEE schema."""
+_JOB_SCHEMA = {
+  'type': 'object',
+  'properties': {
+    'id': {'type': 'string'},
+    'model': {'type': 'string'},
+    'status': {'type': 'string', 'enum': ['queued', 'running', 'done', 'error', 'cancelled']},
+    'created': {'type': 'number'},
+    'started': {'type': ['number', 'null']},
+    'finished': {'type': ['number', 'null']},
+    'progress': {'type': 'object'},
+    'result': {'type': 'object'},
+    'error': {'type': 'string'},
+  },
+}
+
+
+_BATCH_ITEM_SCHEMA = {
+  'type': 'object',
+  'properties': {
+    'index': {'type': 'integer'},
+    'result': {'type': 'object'},
+    'error': {'type': 'string'},
+  },
+  'required': ['index'],
+}
+
+
+def generate_openapi_spec(schema, jobs=False):
+  """Generate OpenAPI 3.1 spec from JSEE schema.
+
+  jobs: also describe the background job endpoints (server option `jobs`)
+  """
   models = schema.get('model', [])
   if isinstance(models, dict):
     models = [models]
@@ -373,6 +432,143 @@ def generate_openapi_spec(schema):
         }
       }
     }
+    if m.get('deterministic'):
+      paths['/' + name]['get'] = {
+        'summary': 'Run {} (cacheable)'.format(name),
+        'description': 'Inputs as query parameters, array inputs repeated. A query not in '
+                       'canonical order (sorted by name) is redirected to the canonical URL.',
+        'operationId': name + '_get',
+        'parameters': [{
+          'name': pname,
+          'in': 'query',
+          'required': pname in input_schema['required'],
+          'schema': prop,
+          'explode': True,
+        } for pname, prop in input_schema['properties'].items()],
+        'responses': {
+          '200': {
+            'description': 'Model output',
+            'headers': {
+              'ETag': {'schema': {'type': 'string'}, 'description': 'Strong ETag of the inputs and model'},
+              'Cache-Control': {'schema': {'type': 'string'}},
+            },
+            'content': {'application/json': {'schema': {'type': 'object'}}}
+          },
+          '301': {'description': 'Redirect to the canonical query'},
+          '304': {'description': 'Not modified (If-None-Match)'},
+          '400': {'description': 'Invalid query parameter'},
+        }
+      }
+    paths['/{}/batch'.format(name)] = {
+      'post': {
+        'summary': 'Run {} on many inputs'.format(name),
+        'description': 'Items run concurrently. Results stream back as NDJSON in input '
+                       'order, one {"index", "result"} or {"index", "error"} object per line.',
+        'operationId': name + '_batch',
+        'requestBody': {
+          'required': True,
+          'content': {
+            'application/json': {'schema': {'type': 'array', 'items': input_schema}},
+            'application/x-ndjson': {'schema': input_schema},
+          }
+        },
+        'responses': {
+          '200': {
+            'description': 'One result or error per input, in order',
+            'content': {'application/x-ndjson': {'schema': _BATCH_ITEM_SCHEMA}}
+          },
+          '400': {'description': 'Body is not a JSON array'}
+        }
+      }
+    }
+    if jobs:
+      paths['/{}/jobs'.format(name)] = {
+        'post': {
+          'summary': 'Submit a background job running ' + name,
+          'operationId': name + '_job',
+          'requestBody': {
+            'required': True,
+            'content': {'application/json': {'schema': input_schema}}
+          },
+          'responses': {
+            '202': {
+              'description': 'Job accepted; poll the Location URL',
+              'content': {'application/json': {'schema': _JOB_SCHEMA}}
+            },
+            '503': {'description': 'Job queue is full'}
+          }
+        }
+      }
+  if schema.get('pipeline') and len(models) > 1:
+    paths['/api/pipeline'] = {
+      'post': {
+        'summary': 'Run the pipeline: ' + ' → '.join(m.get('name', 'model') for m in models),
+        'description': 'Each model gets the inputs merged with the outputs of the models '
+                       'before it. Stage results are cached by the inputs each stage reads.',
+        'operationId': 'pipeline',
+        'requestBody': {
+          'required': True,
+          'content': {'application/json': {'schema': input_schema}}
+        },
+        'responses': {
+          '200': {
+            'description': 'Inputs merged with the outputs of all stages',
+            'headers': {'X-JSEE-Pipeline': {
+              'schema': {'type': 'string'},
+              'description': 'Stages run, as name;hit or name;miss (cached or not)'}},
+            'content': {'application/json': {'schema': {'type': 'object'}}}
+          }
+        }
+      }
+    }
+  if len(models) > 1:
+    paths['/api/fanout'] = {
+      'post': {
+        'summary': 'Run several models concurrently on the same inputs',
+        'description': 'Streams server-sent events as models finish: `result` {"model", "result", '
+                       '"ms"} or `error` {"model", "error"} per model, then `done`.',
+        'operationId': 'fanout',
+        'parameters': [{
+          'name': 'models', 'in': 'query', 'required': False,
+          'schema': {'type': 'string'}, 'description': 'Comma-separated model names (default: all)',
+        }],
+        'requestBody': {
+          'required': True,
+          'content': {'application/json': {'schema': input_schema}}
+        },
+        'responses': {
+          '200': {'description': 'SSE stream', 'content': {'text/event-stream': {}}},
+          '404': {'description': 'Unknown model'}
+        }
+      }
+    }
+  if jobs:
+    job_id = [{'name': 'id', 'in': 'path', 'required': True, 'schema': {'type': 'string'}}]
+    paths['/api/jobs/{id}'] = {
+      'get': {
+        'summary': 'Job status, progress and result',
+        'operationId': 'get_job',
+        'parameters': job_id,
+        'responses': {
+          '200': {'description': 'Job', 'content': {'application/json': {'schema': _JOB_SCHEMA}}},
+          '404': {'description': 'Unknown or expired job'}
+        }
+      },
+      'delete': {
+        'summary': 'Cancel a job, or delete a finished one',
+        'operationId': 'cancel_job',
+        'parameters': job_id,
+        'responses': {'200': {'description': 'Job'}, '404': {'description': 'Unknown job'}}
+      }
+    }
+    paths['/api/jobs/{id}/events'] = {
+      'get': {
+        'summary': 'Job status, progress and result as server-sent events',
+        'operationId': 'job_events',
+        'parameters': job_id,
+        'responses': {'200': {'description': 'SSE stream', 'content': {'text/event-stream': {}}}}
+      }
+    }
   title = schema.get('title') \
     or (schema.get('page', {}) or {}).get('title') \
     or (models[0].get('name') if models else None) \
@@ -384,32 +580,42 @@ def generate_openapi_spec(schema):
   }
 
 
-def _load_model_func(schema, cwd='.'):
-  """Load Python model function from schema. Returns (func, model_name)."""
-  models = schema.get('model', [])
-  if isinstance(models, dict):
-    models = [models]
-  funcs = {}
-  for m in models:
-    url = m.get('url', '')
-    name = m.get('name', 'model')
-    # Load from .py file
-    if url.endswith('.py'):
-      filepath = os.path.join(cwd, url)
-      spec = importlib.util.spec_from_file_location(name, filepath)
-      mod = importlib.util.module_from_spec(spec)
-      spec.loader.exec_module(mod)
-      func = getattr(mod, name, None)
-      if func is None:
-        # Try first callable in module
-        for attr_name in dir(mod):
-          attr = getattr(mod, attr_name)
-          if callable(attr) and not attr_name.startswith('_'):
-            func = attr
-            break
-      if func:
-        funcs[name] = func
-  return funcs
+def _model_callable(func, schema, kwargs):
+  """Wrap a model class in a Lifecycle; functions are returned as is."""
+  if not is_model_class(func):
+    return func
+  examples = schema.get('examples') if kwargs.get('warmup') is not False else None
+  return Lifecycle(func, pool=kwargs.get('pool'), examples=examples)
+
+
+def _load_model_func(schema, cwd='.', kwargs=None):
+  """Load the Python model functions of a schema. Returns {name: func}."""
+  return {
+    name: _model_callable(load_model(name, path), schema, kwargs or {})
+    for name, path in schema_models(schema, cwd).items()
+  }
+
+
+def _schema_funcs(schema, cwd, kwargs):
+  """Model functions of a schema: loaded now, or a ModelRegistry loading on demand."""
+  lazy = any(kwargs.get(k) for k in ('lazy', 'warm', 'max_models', 'model_ttl', 'model_memory'))
+  if not lazy:
+    return _load_model_func(schema, cwd, kwargs)
+  if kwargs.get('processes'):
+    raise ValueError('Lazy model loading cannot be combined with processes: '
+                     'worker processes inherit the models loaded at startup')
+
+  def loader(name, path):
+    func = _model_callable(load_model(name, path), schema, kwargs)
+    return func.start() if isinstance(func, Lifecycle) else func
+
+  return ModelRegistry(
+    schema_models(schema, cwd),
+    max_models=kwargs.get('max_models'),
+    ttl=kwargs.get('model_ttl'),
+    memory=kwargs.get('model_memory'),
+    loader=loader,
+  )
 
 
 def _parse_multipart(content_type, body):
@@ -453,9 +659,11 @@ def _to_table_format(data):
 def _serialize_value(value):
   """Serialize a single value (may be nested inside a dict result)."""
   if isinstance(value, (bytes, bytearray)):
+    import base64
     b64 = base64.b64encode(value).decode('ascii')
     return 'data:image/png;base64,' + b64
   if hasattr(value, 'save') and hasattr(value, 'mode'):
+    import base64
     buf = io.BytesIO()
     fmt = 'PNG' if value.mode == 'RGBA' else 'JPEG'
     value.save(buf, format=fmt)
@@ -485,34 +693,75 @@ def _serialize_result(result):
   return {'result': result}
 
 
-def serve(target, host='0.0.0.0', port=5050, **kwargs):
-  """Start a server with GUI + JSON API.
+MIME_TYPES = {
+  '.html': 'text/html; charset=utf-8',
+  '.js': 'application/javascript; charset=utf-8',
+  '.css': 'text/css; charset=utf-8',
+  '.json': 'application/json; charset=utf-8',
+}
 
-  target can be:
-    - A Python function (schema auto-generated from type hints)
-    - A dict (pre-built JSEE schema)
-    - A string path to schema.json
 
-  Keyword args (passed to generate_schema when target is callable):
-    title, description, examples, reactive, chat
+def _json_response(data, status=200):
+  """Build a (status, headers, body) JSON response."""
+  body = json.dumps(data).encode('utf-8')
+  return status, [
+    ('Content-Type', 'application/json; charset=utf-8'),
+    ('Content-Length', str(len(body))),
+    ('Access-Control-Allow-Origin', '*'),
+  ], body
+
+
+def _error_response(msg, status=400):
+  return _json_response({'error': msg}, status)
+
+
+def _error_message(e):
+  """Message of an exception without KeyError's repr quoting."""
+  return str(e.args[0]) if isinstance(e, KeyError) and e.args else str(e)
+
+
+def _server_timing(timing):
+  """Server-Timing header value from phase durations in ns."""
+  return ', '.join('{};dur={:.3f}'.format(phase, ns / 1e6) for phase, ns in timing.items())
+
+
+# Response headers browser scripts on other origins may read
+EXPOSE_HEADERS = 'Server-Timing, X-JSEE-Cache, ETag, Idempotent-Replayed, X-JSEE-Pipeline'
+
+
+def _timing_headers(timing):
+  return [
+    ('Server-Timing', _server_timing(timing)),
+    ('Timing-Allow-Origin', '*'),
+    ('Access-Control-Expose-Headers', EXPOSE_HEADERS),
+  ]
+
+
+def _resolve_target(target, host, port, kwargs, schema=None):
+  """Resolve a serve()/create_app() target. Returns (schema, funcs, schema_cwd).
+
+  schema: prebuilt schema (see jsee.artifact), skips reading or generating it
   """
   funcs = {}
   schema_cwd = '.'
-
   if isinstance(target, str):
     # Path to schema.json
     schema_cwd = os.path.dirname(os.path.abspath(target))
-    with open(target, 'r') as f:
-      schema = json.load(f)
-    funcs = _load_model_func(schema, schema_cwd)
+    if schema is None:
+      with open(target, 'r') as f:
+        schema = json.load(f)
+    funcs = _schema_funcs(schema, schema_cwd, kwargs)
   elif isinstance(target, dict):
-    schema = target
-    funcs = _load_model_func(schema, schema_cwd)
+    schema = schema or target
+    funcs = _schema_funcs(schema, schema_cwd, kwargs)
   elif callable(target):
-    schema = generate_schema(target, host, port, **kwargs)
+    if schema is None:
+      schema = generate_schema(target, host, port, **kwargs)
+    target = _model_callable(target, schema, kwargs)
     if kwargs.get('chat'):
       # Wrap function to return {chat: result} for string returns
       original_fn = target
+      @functools.wraps(original_fn)
       def _chat_wrapper(**data):
         result = original_fn(**data)
         if isinstance(result, str):
@@ -523,165 +772,1275 @@ def serve(target, host='0.0.0.0', port=5050, **kwargs):
       funcs[target.__name__] = target
   else:
     raise ValueError('target must be a function, dict, or path to schema.json')
+  return schema, funcs, schema_cwd
 
-  # Normalize model to list for internal iteration, keep original for client
-  models = schema.get('model', {})
-  if isinstance(models, dict):
-    models = [models]
-  elif not models:
-    models = []
-
-  # Update model URLs to point to local server endpoints
-  for m in models:
-    name = m.get('name', 'model')
-    m['type'] = 'post'
-    m['url'] = '/{}'.format(name)
-    m['worker'] = False
-
-  runtime_path = _find_runtime(schema)
-  runtime_code = None
-  if runtime_path:
-    with open(runtime_path, 'r') as f:
-      runtime_code = f.read()
 
-  # Build HTML
+def _render_page(schema, models, address):
+  """The GUI page for a schema, as bytes."""
   model_name = models[0].get('title') or models[0].get('name', 'JSEE') if models else 'JSEE'
-  display_host = 'localhost' if host == '0.0.0.0' else host
-  html = TEMPLATE.format(
+  return TEMPLATE.format(
     name=model_name,
     schema_json=json.dumps(schema),
-    address='{}:{}'.format(display_host, port)
-  )
-  html_bytes = html.encode('utf-8')
-
-  mime_types = {
-    '.html': 'text/html; charset=utf-8',
-    '.js': 'application/javascript; charset=utf-8',
-    '.css': 'text/css; charset=utf-8',
-    '.json': 'application/json; charset=utf-8',
-  }
+    address=address,
+  ).encode('utf-8')
 
-  class Handler(BaseHTTPRequestHandler):
-    def log_message(self, format, *args):
-      pass
 
-    def _send_json(self, data, status=200):
-      body = json.dumps(data).encode('utf-8')
-      self.send_response(status)
-      self.send_header('Content-Type', 'application/json; charset=utf-8')
-      self.send_header('Access-Control-Allow-Origin', '*')
-      self.send_header('Content-Length', str(len(body)))
-      self.end_headers()
-      self.wfile.write(body)
-
-    def _send_error(self, msg, status=400):
-      self._send_json({'error': msg}, status)
-
-    def do_OPTIONS(self):
-      self.send_response(204)
-      self.send_header('Access-Control-Allow-Origin', '*')
-      self.send_header('Access-Control-Allow-Methods', 'GET, POST, OPTIONS')
-      self.send_header('Access-Control-Allow-Headers', 'Content-Type')
-      self.end_headers()
-
-    def do_GET(self):
-      parsed = urllib.parse.urlparse(self.path)
-      pathname = parsed.path.rstrip('/')
-
-      if pathname == '' or pathname == '/':
-        self.send_response(200)
-        self.send_header('Content-Type', 'text/html; charset=utf-8')
-        self.send_header('Content-Length', str(len(html_bytes)))
-        self.end_headers()
-        self.wfile.write(html_bytes)
-        return
+_ARRAY_INPUTS = ('range', 'multi-select')
+_TRUE = ('true', '1', 'yes', 'on')
+_FALSE = ('false', '0', 'no', 'off', '')
 
-      if pathname == '/api':
-        api_models = [{'name': m['name'], 'endpoint': m['url'], 'method': 'POST'} for m in models]
-        return self._send_json({'schema': schema, 'models': api_models})
 
-      if pathname == '/api/openapi.json':
-        return self._send_json(generate_openapi_spec(schema))
+def _query_inputs(pairs, inputs):
+  """Model inputs from GET query (name, value) pairs, typed by the schema.
 
-      if pathname == '/static/jsee.js' and runtime_code:
-        body = runtime_code.encode('utf-8')
-        self.send_response(200)
-        self.send_header('Content-Type', 'application/javascript; charset=utf-8')
-        self.send_header('Content-Length', str(len(body)))
-        self.end_headers()
-        self.wfile.write(body)
-        return
+  Array inputs take repeated parameters (?tags=a&tags=b) or a JSON array;
+  parameters not in the schema are passed as strings.
+  """
+  types = {inp.get('name'): inp.get('type', 'string') for inp in inputs or []}
+  values = {}
+  for name, raw in pairs:
+    values.setdefault(name, []).append(raw)
+  data = {}
+  for name, raws in values.items():
+    t = types.get(name, 'string')
+    if t in _ARRAY_INPUTS:
+      if len(raws) == 1 and raws[0].startswith('['):
+        data[name] = json.loads(raws[0])
+      else:
+        data[name] = [json.loads(r) for r in raws] if t == 'range' else raws
+      continue
+    if len(raws) > 1:
+      raise ValueError('{} given more than once'.format(name))
+    raw = raws[0]
+    if t == 'int':
+      data[name] = int(raw)
+    elif t in ('float', 'number', 'slider'):
+      value = json.loads(raw)
+      if not isinstance(value, (int, float)) or isinstance(value, bool):
+        raise ValueError('{} must be a number'.format(name))
+      data[name] = value
+    elif t in ('bool', 'checkbox', 'toggle'):
+      if raw.lower() not in _TRUE + _FALSE:
+        raise ValueError('{} must be true or false'.format(name))
+      data[name] = raw.lower() in _TRUE
+    else:
+      data[name] = raw
+  return data
 
-      # Serve static files from schema directory
-      rel = pathname.lstrip('/')
-      filepath = os.path.normpath(os.path.join(schema_cwd, rel))
-      if filepath.startswith(os.path.normpath(schema_cwd)) and os.path.isfile(filepath):
-        ext = os.path.splitext(filepath)[1].lower()
-        content_type = mime_types.get(ext, 'application/octet-stream')
-        with open(filepath, 'rb') as f:
-          body = f.read()
-        self.send_response(200)
-        self.send_header('Content-Type', content_type)
-        self.send_header('Content-Length', str(len(body)))
-        self.end_headers()
-        self.wfile.write(body)
-        return
 
-      self.send_error(404)
+class _Request:
+  """Transport-independent view of an HTTP request (http.server or WSGI)."""
+
+  def __init__(self, method, path, headers, rfile, content_length):
+    import urllib.parse
+    parsed = urllib.parse.urlparse(path)
+    self.method = method
+    self.path = parsed.path.rstrip('/') or '/'
+    self.query_string = parsed.query
+    self.query = urllib.parse.parse_qs(parsed.query)
+    self.headers = {k.lower(): v for k, v in headers.items()}
+    self.rfile = rfile
+    self.content_length = content_length
+    self._body = None
+    # Set for model calls: model name and phase durations (ns)
+    self.start = time.perf_counter_ns()
+    self.model = None
+    self.timing = {}
+
+  def lap(self, phase, since):
+    """Record the time since `since` as `phase`. Returns now."""
+    now = time.perf_counter_ns()
+    self.timing[phase] = self.timing.get(phase, 0) + now - since
+    return now
+
+  def read(self):
+    # Kept, so the body can be read before the handler reads it
+    if self._body is None:
+      self._body = self.rfile.read(self.content_length) if self.content_length else b''
+    return self._body
+
+
+class _App:
+  """Routing and model execution shared by serve() and create_app().
+
+  handle() maps a _Request to (status, headers, body), where body is
+  bytes or an iterable of bytes for streamed (SSE) responses.
+  """
 
-    def do_POST(self):
-      parsed = urllib.parse.urlparse(self.path)
-      pathname = parsed.path.rstrip('/')
-      model_name = pathname.lstrip('/')
+  def __init__(self, target, host='0.0.0.0', port=5050, **kwargs):
+    # Prebuilt schema, page and compressed runtime (see jsee.artifact)
+    artifact = None
+    if kwargs.get('build'):
+      from .artifact import load
+      artifact = load(kwargs['build'], target, kwargs)
+    self.schema, self.funcs, self.schema_cwd = _resolve_target(
+      target, host, port, kwargs, schema=artifact and artifact['schema.json'])
+
+    # Normalize model to list for internal iteration, keep original for client
+    models = self.schema.get('model', {})
+    if isinstance(models, dict):
+      models = [models]
+    elif not models:
+      models = []
+    # Update model URLs to point to local server endpoints
+    for m in models:
+      name = m.get('name', 'model')
+      m['type'] = 'post'
+      m['url'] = '/{}'.format(name)
+      m['worker'] = False
+      # The runtime sends X-JSEE-Stream only to servers that support it
+      m['streamDelta'] = True
+    self.models = models
+
+    uploads = kwargs.get('uploads')
+    self.uploads = None
+    if uploads:
+      from .uploads import DEFAULT_MAX_SIZE, UploadStore
+      self.uploads = UploadStore(uploads if isinstance(uploads, str) else None,
+                                 max_size=kwargs.get('upload_max_size') or DEFAULT_MAX_SIZE)
+
+    # Chat sessions: the server keeps the history, the client sends only
+    # the new message with a conversation ID (`_session` or X-JSEE-Session)
+    sessions = kwargs.get('sessions')
+    self.sessions = None
+    outputs = self.schema.get('outputs') or []
+    if sessions and any(o.get('type') == 'chat' for o in outputs):
+      from .sessions import SessionStore
+      if isinstance(sessions, SessionStore):
+        self.sessions = sessions
+      else:
+        self.sessions = SessionStore(sessions if isinstance(sessions, str) else None)
+      for m in models:
+        m['session'] = True
+
+    # SSE coalescing (None: one frame per yielded chunk)
+    self.sse_interval = kwargs.get('sse_interval')
+    self.sse_max_bytes = kwargs.get('sse_max_bytes', 64 * 1024)
+    self.sse_heartbeat = kwargs.get('sse_heartbeat')
+
+    self.warmup = kwargs.get('warmup')
+    # Lazy models: import in the background instead of on first request
+    self._warming = None
+    if kwargs.get('warm') and isinstance(self.funcs, ModelRegistry):
+      self._warming = self.funcs.warm()
+
+    self.runner = None
+    if kwargs.get('processes'):
+      from .executor import ProcessRunner
+      self.runner = ProcessRunner(self.funcs, kwargs['processes'])
+
+    # Threads running /<model>/batch items and /api/fanout models (each
+    # waits on a worker process when `processes` is set), started on first use
+    self.batch_workers = kwargs.get('batch_workers') \
+      or (kwargs['processes'] * 2 if kwargs.get('processes') else os.cpu_count() or 1)
+    self._batch_pool = None
+    self._batch_lock = threading.Lock()
+
+    # Persistent result cache (see jsee.cache) of deterministic models;
+    # "cache": false opts one out
+    cache = kwargs.get('cache')
+    self.cache = None
+    if cache:
+      from .cache import ResultCache, DEFAULT_MAX_BYTES
+      if isinstance(cache, ResultCache):
+        self.cache = cache
+      else:
+        self.cache = ResultCache(cache, kwargs.get('cache_size') or DEFAULT_MAX_BYTES)
+    self.uncached = {m.get('name', 'model') for m in models if m.get('cache') is False}
+    # GET /<model>?name=value for models marked deterministic
+    self.deterministic = {m.get('name', 'model') for m in models
+                          if m.get('deterministic') and m.get('name', 'model') in self.funcs}
+    self.cache_control = kwargs.get('cache_control') or 'public, max-age=3600'
+    self._call_keys = None
+
+    # Pipeline: run all models in one request at /api/pipeline (see jsee.pipeline)
+    if kwargs.get('pipeline'):
+      self.schema['pipeline'] = True
+    self.pipeline = None
+    self.page_schema = self.schema
+    if self.schema.get('pipeline') and len(models) > 1:
+      stages = [m.get('name', 'model') for m in models]
+      missing = [name for name in stages if name not in self.funcs]
+      if missing:
+        raise ValueError('Pipeline stages must be Python models: ' + ', '.join(missing))
+      from .pipeline import Pipeline
+      self.pipeline = Pipeline(stages, self.funcs, call=self._call,
+                               cache_size=kwargs.get('pipeline_cache', 128))
+      # The page calls the server pipeline instead of each model in turn
+      self.page_schema = dict(self.schema, model={
+        'name': 'pipeline',
+        'title': models[0].get('title') or models[0].get('name', 'pipeline'),
+        'type': 'post',
+        'url': '/api/pipeline',
+        'worker': False,
+      })
+
+    # Idempotency-Key: retries of a POST get the first request's response
+    idempotency = kwargs.get('idempotency')
+    self.idempotency = None
+    if idempotency:
+      from .idempotency import IdempotencyStore
+      if isinstance(idempotency, IdempotencyStore):
+        self.idempotency = idempotency
+      else:
+        self.idempotency = IdempotencyStore(
+          ttl=kwargs.get('idempotency_ttl') or 24 * 3600,
+          max_bytes=kwargs.get('idempotency_bytes') or 64 * 1024 * 1024,
+        )
+
+    # Background jobs: submit now, poll or subscribe for the result later
+    # Coordinator: remote workers claim the jobs over HTTP (see jsee.worker)
+    self.coordinator = bool(kwargs.get('coordinator'))
+    self.worker_token = kwargs.get('worker_token')
+    if self.coordinator and not self.worker_token:
+      raise ValueError('coordinator needs a worker_token for its workers to send')
+    jobs = kwargs.get('jobs') or self.coordinator
+    self.jobs = None
+    if jobs:
+      from .jobs import JobQueue
+      if isinstance(jobs, JobQueue):
+        self.jobs = jobs
+      else:
+        self.jobs = JobQueue(
+          jobs if isinstance(jobs, str) else None,
+          workers=kwargs.get('job_workers', 0 if self.coordinator else 2),
+          max_jobs=kwargs.get('max_jobs', 1000),
+          ttl=kwargs.get('job_ttl', 3600),
+        )
+      self.jobs.start(self._run_job, _serialize_result)
+
+    # Profiling: `_profile` per request, /api/profile sampling window
+    self.profiling = bool(kwargs.get('profiling'))
+    # thread ident → request, for sampling only threads serving requests
+    self._active = {}
+
+    self.metrics = None
+    if kwargs.get('metrics'):
+      from .metrics import server_metrics
+      self.metrics = server_metrics()
+      if self.jobs is not None:
+        self.metrics.collector(lambda: [
+          ('jsee_jobs', (('status', status),), n) for status, n in self.jobs.counts().items()])
+
+    address = '{}:{}'.format('localhost' if host == '0.0.0.0' else host, port)
+    self.runtime_bytes = None
+    self.runtime_gzip = None
+    self._openapi = None
+    if artifact:
+      self.runtime_gzip = artifact.get('jsee.js.gz')
+      if self.jobs is None:
+        self._openapi = artifact['openapi.json']
+      from .artifact import ADDRESS_MARK
+      self.html_bytes = artifact['index.html'].replace(ADDRESS_MARK.encode(), address.encode())
+    else:
+      runtime_path = _find_runtime(self.schema)
+      if runtime_path:
+        with open(runtime_path, 'rb') as f:
+          self.runtime_bytes = f.read()
+      self.html_bytes = _render_page(self.page_schema, models, address)
+
+  def _lifecycles(self):
+    if isinstance(self.funcs, ModelRegistry):
+      # Started when loaded, closed when unloaded
+      return []
+    found = []
+    for func in self.funcs.values():
+      func = func if isinstance(func, Lifecycle) else getattr(func, '__wrapped__', None)
+      if isinstance(func, Lifecycle):
+        found.append(func)
+    return found
+
+  def start(self):
+    """Set up model classes and warm them up with the schema examples.
+
+    With warmup=True plain function models are warmed up as well. Runs
+    before the server accepts requests, once per server process.
+    """
+    for lifecycle in self._lifecycles():
+      lifecycle.start()
+    if self.warmup and not isinstance(self.funcs, ModelRegistry):
+      for name, func in self.funcs.items():
+        if isinstance(getattr(func, '__wrapped__', func), Lifecycle):
+          continue
+        for data in self.schema.get('examples') or []:
+          try:
+            result = func(**data)
+            if inspect.isgenerator(result):
+              for _ in result:
+                pass
+          except Exception as e:
+            print('jsee: warmup of {} with {} failed: {}: {}'.format(
+              name, data, type(e).__name__, e), file=sys.stderr)
+
+  def close(self):
+    """Tear down model classes."""
+    for lifecycle in self._lifecycles():
+      lifecycle.close()
+    if isinstance(self.funcs, ModelRegistry):
+      for name in self.funcs.loaded():
+        self.funcs.unload(name)
+
+  def handle(self, req):
+    if self.profiling:
+      req.thread = threading.get_ident()
+      self._active[req.thread] = req
+    if self.metrics is not None:
+      self.metrics.add('jsee_requests_in_flight')
+      try:
+        return self._route(req)
+      except BaseException:
+        self.metrics.add('jsee_requests_in_flight', value=-1)
+        raise
+    return self._route(req)
+
+  def finish(self, req, status, sent, write_ns, streamed=False):
+    """Record a response once the transport has written it."""
+    if self.profiling:
+      self._active.pop(getattr(req, 'thread', None), None)
+    if self.metrics is None:
+      return
+    metrics = self.metrics
+    model = (('model', req.model or ''),)
+    metrics.add('jsee_requests_in_flight', value=-1)
+    metrics.add('jsee_requests_total', model + (('status', str(status)),))
+    metrics.add('jsee_request_bytes_total', model, req.content_length)
+    metrics.add('jsee_response_bytes_total', model, sent)
+    metrics.observe('jsee_request_duration_seconds', model,
+                    (time.perf_counter_ns() - req.start) / 1e9)
+    if req.model:
+      for phase, ns in list(req.timing.items()) + [('write', write_ns)]:
+        metrics.observe('jsee_request_phase_seconds', model + (('phase', phase),), ns / 1e9)
+    if streamed:
+      metrics.observe('jsee_stream_duration_seconds', model, write_ns / 1e9)
+
+  def _route(self, req):
+    if req.method == 'OPTIONS':
+      return 204, [
+        ('Access-Control-Allow-Origin', '*'),
+        ('Access-Control-Allow-Methods', 'GET, POST, PUT, DELETE, OPTIONS'),
+        ('Access-Control-Allow-Headers',
+         'Content-Type, Idempotency-Key, Prefer, X-Content-SHA256, X-JSEE-Session, X-JSEE-Stream'),
+      ], b''
+    if self.uploads and (req.path == '/api/uploads' or req.path.startswith('/api/uploads/')):
+      return self._handle_upload(req)
+    if self.jobs is not None and (req.path == '/api/jobs' or req.path.startswith('/api/jobs/')):
+      return self._handle_jobs(req)
+    if req.method == 'GET':
+      return self._handle_get(req)
+    if req.method == 'POST':
+      if self.idempotency is not None and 'idempotency-key' in req.headers:
+        return self._handle_idempotent(req)
+      return self._handle_post(req)
+    return 405, [('Content-Type', 'text/plain')], b'Method Not Allowed'
+
+  def _handle_get(self, req):
+    pathname = req.path
+    if pathname == '/':
+      return 200, [
+        ('Content-Type', 'text/html; charset=utf-8'),
+        ('Content-Length', str(len(self.html_bytes))),
+      ], self.html_bytes
+
+    if pathname == '/api':
+      api_models = [{'name': m['name'], 'endpoint': m['url'], 'method': 'POST'} for m in self.models]
+      loaded = set(self.funcs.loaded() if isinstance(self.funcs, ModelRegistry) else self.funcs)
+      for m in api_models:
+        if m['name'] in self.funcs:
+          m['loaded'] = m['name'] in loaded
+      api = {'schema': self.schema, 'models': api_models}
+      if self.uploads:
+        api['uploads'] = '/api/uploads'
+      if self.jobs is not None:
+        api['jobs'] = '/api/jobs'
+      if self.pipeline is not None:
+        api['pipeline'] = '/api/pipeline'
+      if len(self.models) > 1:
+        api['fanout'] = '/api/fanout'
+      return _json_response(api)
+
+    if pathname == '/api/openapi.json':
+      if self._openapi is None:
+        self._openapi = json.dumps(generate_openapi_spec(self.schema, jobs=self.jobs is not None)).encode('utf-8')
+      return 200, [
+        ('Content-Type', 'application/json; charset=utf-8'),
+        ('Content-Length', str(len(self._openapi))),
+        ('Access-Control-Allow-Origin', '*'),
+      ], self._openapi
 
-      if model_name not in funcs:
-        return self._send_error('Unknown model: ' + model_name, 404)
+    if pathname == '/api/profile' and self.profiling:
+      return self._sample(req)
 
-      content_length = int(self.headers.get('Content-Length', 0))
-      body = self.rfile.read(content_length) if content_length else b'{}'
-      content_type = self.headers.get('Content-Type', '')
+    if pathname == '/metrics' and self.metrics is not None:
+      body = self.metrics.render().encode('utf-8')
+      return 200, [
+        ('Content-Type', 'text/plain; version=0.0.4; charset=utf-8'),
+        ('Content-Length', str(len(body))),
+      ], body
 
-      try:
-        if 'multipart/form-data' in content_type:
-          data = _parse_multipart(content_type, body)
+    if pathname == '/static/jsee.js' and self.runtime_gzip:
+      if 'gzip' in req.headers.get('accept-encoding', ''):
+        return 200, [
+          ('Content-Type', 'application/javascript; charset=utf-8'),
+          ('Content-Encoding', 'gzip'),
+          ('Vary', 'Accept-Encoding'),
+          ('Content-Length', str(len(self.runtime_gzip))),
+        ], self.runtime_gzip
+      if self.runtime_bytes is None:
+        import gzip
+        self.runtime_bytes = gzip.decompress(self.runtime_gzip)
+
+    if pathname == '/static/jsee.js' and self.runtime_bytes:
+      return 200, [
+        ('Content-Type', 'application/javascript; charset=utf-8'),
+        ('Content-Length', str(len(self.runtime_bytes))),
+      ], self.runtime_bytes
+
+    if pathname.lstrip('/') in self.deterministic:
+      return self._handle_model_get(req, pathname.lstrip('/'))
+
+    # Serve static files from schema directory
+    rel = pathname.lstrip('/')
+    filepath = os.path.normpath(os.path.join(self.schema_cwd, rel))
+    if filepath.startswith(os.path.normpath(self.schema_cwd)) and os.path.isfile(filepath):
+      ext = os.path.splitext(filepath)[1].lower()
+      content_type = MIME_TYPES.get(ext, 'application/octet-stream')
+      with open(filepath, 'rb') as f:
+        body = f.read()
+      return 200, [
+        ('Content-Type', content_type),
+        ('Content-Length', str(len(body))),
+      ], body
+
+    return 404, [('Content-Type', 'text/plain')], b'Not Found'
+
+  def _handle_model_get(self, req, model_name):
+    """GET /<model>?name=value: cacheable calls of deterministic models.
+
+    A query that isn't in canonical order (sorted by name) is redirected
+    to the canonical URL, so caches keep one entry per input. The strong
+    ETag is derived from the inputs and the model source; a matching
+    If-None-Match is answered with 304 without running the model.
+    """
+    import urllib.parse
+    from .batch import finish
+    req.model = model_name
+    t = time.perf_counter_ns()
+    pairs = urllib.parse.parse_qsl(req.query_string, keep_blank_values=True)
+    query = urllib.parse.urlencode(sorted(pairs, key=lambda pair: pair[0]))
+    if query != req.query_string:
+      return 301, [
+        ('Location', '/{}?{}'.format(model_name, query) if query else '/' + model_name),
+        ('Cache-Control', self._cache_control(model_name)),
+        ('Access-Control-Allow-Origin', '*'),
+      ], b''
+    try:
+      data = _query_inputs(pairs, self.schema.get('inputs'))
+    except ValueError as e:
+      return _error_response('Invalid request: ' + str(e), 400)
+    if self._call_keys is None:
+      from .cache import CallKeys
+      self._call_keys = self.cache.keys if self.cache is not None else CallKeys()
+    cache_headers = [
+      ('ETag', '"{}"'.format(self._call_keys(model_name, self.funcs[model_name], data)[:32])),
+      ('Cache-Control', self._cache_control(model_name)),
+    ]
+    if req.headers.get('if-none-match') and cache_headers[0][1] in [
+        tag.strip() for tag in req.headers['if-none-match'].split(',')]:
+      return 304, cache_headers + [
+        ('Access-Control-Allow-Origin', '*'),
+        ('Access-Control-Expose-Headers', EXPOSE_HEADERS),
+      ], b''
+    t = req.lap('parse', t)
+    try:
+      key = self._cache_key(model_name, data)
+      output = self._cache_get(model_name, key)
+      if key:
+        cache_headers.append(('X-JSEE-Cache', 'miss' if output is None else 'hit'))
+      if output is None:
+        # Streamed models answer with their final chunk
+        output = _serialize_result(finish(self._call(model_name, data)))
+        if key:
+          self.cache.put(key, model_name, output)
+      t = req.lap('execute', t)
+      status, headers, body = _json_response(output)
+      req.lap('serialize', t)
+    except Exception as e:
+      return _error_response(str(e), 500)
+    return status, headers + cache_headers + _timing_headers(req.timing), body
+
+  def _cache_control(self, model_name):
+    model = next((m for m in self.models if m.get('name', 'model') == model_name), {})
+    return model.get('cache_control') or self.cache_control
+
+  def _read_inputs(self, req):
+    """Parse a JSON or multipart request body into model inputs."""
+    body = req.read() or b'{}'
+    content_type = req.headers.get('content-type', '')
+    if 'multipart/form-data' in content_type:
+      return _parse_multipart(content_type, body)
+    return json.loads(body)
+
+  def _sample(self, req):
+    """GET /api/profile?seconds=10&interval=0.005&threads=requests|all
+
+    Samples the stacks of threads serving requests (or of all threads)
+    for a window and returns them in collapsed (flamegraph) format.
+    """
+    try:
+      seconds = min(float(req.query.get('seconds', ['10'])[0]), 300)
+      interval = max(float(req.query.get('interval', ['0.005'])[0]), 0.0005)
+    except ValueError:
+      return _error_response('seconds and interval must be numbers', 400)
+    own = threading.get_ident()
+    threads = None
+    if req.query.get('threads', ['requests'])[0] != 'all':
+      threads = lambda: [ident for ident in list(self._active) if ident != own]
+    from .profiling import Sampler
+    body = Sampler(interval, threads).run_for(seconds).encode('utf-8')
+    return 200, [
+      ('Content-Type', 'text/plain; charset=utf-8'),
+      ('Content-Length', str(len(body))),
+      ('Access-Control-Allow-Origin', '*'),
+    ], body
+
+  def _handle_idempotent(self, req):
+    """POST with an Idempotency-Key: run once, replay to retries (see jsee.idempotency)."""
+    from .idempotency import MAX_KEY_LENGTH, KeyReused, fingerprint
+    key = req.headers['idempotency-key']
+    if req.path.endswith('/batch'):
+      # Streamed as it is read; nothing to replay
+      return self._handle_post(req)
+    if not key or len(key) > MAX_KEY_LENGTH:
+      return _error_response('Idempotency-Key must be 1 to {} characters'.format(MAX_KEY_LENGTH), 400)
+    try:
+      stored = self.idempotency.begin(key, fingerprint(req.path, req.read()))
+    except KeyReused as e:
+      return _error_response(str(e), 422)
+    except TimeoutError as e:
+      status, headers, body = _error_response(str(e), 409)
+      return status, headers + [('Retry-After', '5')], body
+    if stored is not None:
+      status, headers, body = stored
+      headers = headers + [('Idempotent-Replayed', 'true')]
+      if not any(name == 'Access-Control-Expose-Headers' for name, _ in headers):
+        headers.append(('Access-Control-Expose-Headers', EXPOSE_HEADERS))
+      return status, headers, body
+    try:
+      status, headers, body = self._handle_post(req)
+    except BaseException:
+      self.idempotency.abandon(key)
+      raise
+    if isinstance(body, bytes) and status < 500:
+      self.idempotency.complete(key, (status, headers, body))
+    else:
+      # Streams can't be replayed and server errors should be retried
+      self.idempotency.abandon(key)
+    return status, headers, body
+
+  def _handle_post(self, req):
+    if req.path == '/api/pipeline' and self.pipeline is not None:
+      return self._handle_pipeline(req)
+    if req.path == '/api/fanout':
+      return self._handle_fanout(req)
+    model_name = req.path.lstrip('/')
+    if model_name.endswith('/batch') and model_name[:-len('/batch')] in self.funcs:
+      return self._handle_batch(req, model_name[:-len('/batch')])
+    as_job = False
+    if self.jobs is not None:
+      if model_name.endswith('/jobs'):
+        model_name, as_job = model_name[:-len('/jobs')], True
+      elif 'respond-async' in req.headers.get('prefer', ''):
+        as_job = True
+    if model_name not in self.funcs:
+      return _error_response('Unknown model: ' + model_name, 404)
+
+    if as_job:
+      return self._submit_job(req, model_name)
+
+    req.model = model_name
+    t = time.perf_counter_ns()
+    want_timing = False
+    profile = None
+    try:
+      data = self._read_inputs(req)
+      if isinstance(data, dict):
+        want_timing = data.pop('_timing', False) in (True, 1, 'true', '1')
+        profile = data.pop('_profile', None)
+        if profile is not None:
+          if not self.profiling:
+            raise ValueError('Profiling is disabled (server option profiling)')
+          profile = 'pstats' if profile in (True, 'true', '1') else profile
+          from .profiling import FORMATS
+          if profile not in FORMATS:
+            raise ValueError('_profile must be one of: ' + ', '.join(FORMATS))
+      if self.uploads and isinstance(data, dict):
+        data = self.uploads.resolve(data)
+      session_id = None
+      if self.sessions is not None and isinstance(data, dict):
+        session_id = data.pop('_session', None) or req.headers.get('x-jsee-session')
+        if session_id:
+          if 'history' in data:
+            self.sessions.set(session_id, data['history'])
+          else:
+            data['history'] = self.sessions.get(session_id)
+    except (KeyError, ValueError) as e:
+      return _error_response('Invalid request: ' + _error_message(e), 400)
+    t = req.lap('parse', t)
+
+    try:
+      output = cache_key = None
+      if profile:
+        # In-process, so the profile shows the model rather than pool IPC
+        from .profiling import profile_call
+        run = lambda func, data: profile_call(func, data, profile)
+        if isinstance(self.funcs, ModelRegistry):
+          result, report = self.funcs.call(model_name, data, run)
         else:
-          data = json.loads(body)
-      except (json.JSONDecodeError, ValueError) as e:
-        return self._send_error('Invalid request: ' + str(e), 400)
+          result, report = run(self.funcs[model_name], data)
+        if inspect.isgenerator(result):
+          result.close()
+          return _error_response('Streamed responses cannot be profiled per request; '
+                                 'sample them with /api/profile', 400)
+      else:
+        # Chat sessions depend on the stored history, not only the inputs
+        cache_key = None if session_id else self._cache_key(model_name, data)
+        output = self._cache_get(model_name, cache_key)
+        if output is None:
+          result = self._call(model_name, data)
+      if session_id:
+        result = self._record_chat(session_id, data.get('message', ''), result)
+      t = req.lap('execute', t)
+      # Generator → SSE streaming response
+      if output is None and (inspect.isgenerator(result) or inspect.isasyncgen(result)):
+        # The model runs while the stream is written: only parsing is timed
+        return 200, [
+          ('Content-Type', 'text/event-stream; charset=utf-8'),
+          ('Cache-Control', 'no-cache'),
+          ('Access-Control-Allow-Origin', '*'),
+        ] + _timing_headers({'parse': req.timing['parse']}), sse_stream(
+          result, _serialize_result,
+          delta=req.headers.get('x-jsee-stream') == 'delta',
+          interval=self.sse_interval,
+          max_bytes=self.sse_max_bytes,
+          heartbeat=self.sse_heartbeat,
+        )
+      cache_headers = []
+      if cache_key:
+        cache_headers = [('X-JSEE-Cache', 'miss' if output is None else 'hit')]
+      if output is None:
+        output = _serialize_result(result)
+        if cache_key:
+          self.cache.put(cache_key, model_name, output)
+      if profile:
+        output['_profile'] = report
+      if want_timing:
+        t = req.lap('serialize', t)
+        output['_timing'] = {phase: round(ns / 1e6, 3) for phase, ns in req.timing.items()}
+      status, headers, body = _json_response(output)
+      req.lap('serialize', t)
+      return status, headers + cache_headers + _timing_headers(req.timing), body
+    except Exception as e:
+      return _error_response(str(e), 500)
+
+  def _handle_pipeline(self, req):
+    """POST /api/pipeline: run all model stages in one request.
+
+    The response has the declared outputs (without them, the outputs of
+    the stages) from the merged result. X-JSEE-Pipeline lists
+    the stages run, each with whether its result was cached (hit) or not.
+    """
+    from .batch import finish
+    req.model = 'pipeline'
+    t = time.perf_counter_ns()
+    try:
+      data = self._read_inputs(req)
+      if not isinstance(data, dict):
+        raise ValueError('Expected a JSON object')
+      if self.uploads:
+        data = self.uploads.resolve(data)
+    except (KeyError, ValueError) as e:
+      return _error_response('Invalid request: ' + _error_message(e), 400)
+    t = req.lap('parse', t)
+    try:
+      # Streamed stages pass on their final chunk
+      result, trace = self.pipeline.run(data, finish=finish)
+      if isinstance(result, dict):
+        # Declared outputs, or else what the stages added
+        names = {o.get('name') for o in self.schema.get('outputs') or []}
+        result = {k: v for k, v in result.items()
+                  if (k in names if names else k not in data or v is not data[k])}
+      t = req.lap('execute', t)
+      status, headers, body = _json_response(_serialize_result(result))
+      req.lap('serialize', t)
+    except Exception as e:
+      return _error_response(str(e), 500)
+    stages = ', '.join('{};{}'.format(name, state) for name, state in trace.items())
+    return status, headers + [('X-JSEE-Pipeline', stages)] + _timing_headers(req.timing), body
+
+  def _handle_batch(self, req, model_name):
+    """POST /<model>/batch: a JSON array or NDJSON of inputs.
+
+    Items run concurrently (at most 2 per batch worker in flight, so an
+    NDJSON body is read as results go out) and are streamed back as NDJSON
+    in input order, one line per item: {"index", "result"} or
+    {"index", "error"}. A failing item does not stop the batch.
+    """
+    from . import batch
+    req.model = model_name
+    t = time.perf_counter_ns()
+    content_type = req.headers.get('content-type', '')
+    if 'ndjson' in content_type or 'jsonl' in content_type:
+      items = batch.read_ndjson(req.rfile, req.content_length)
+    else:
+      try:
+        records = json.loads(req.read() or b'[]')
+        if not isinstance(records, list):
+          raise ValueError('Expected a JSON array of inputs')
+      except ValueError as e:
+        return _error_response('Invalid request: ' + str(e), 400)
+      items = enumerate(records)
+    req.lap('parse', t)
+
+    def call(data):
+      if isinstance(data, Exception):
+        raise data
+      if not isinstance(data, dict):
+        raise ValueError('Expected a JSON object')
+      if self.uploads:
+        data = self.uploads.resolve(data)
+      key = self._cache_key(model_name, data)
+      output = self._cache_get(model_name, key)
+      if output is not None:
+        return output
+      result = batch.finish(self._call(model_name, data))
+      if key:
+        self.cache.put(key, model_name, _serialize_result(result))
+      return result
+
+    def lines():
+      for index, future in batch.imap(call, items, self._pool(), self.batch_workers * 2):
+        try:
+          line = batch.line(index, future.result())
+        except Exception as e:
+          line = batch.line(index, error=batch.error_text(e))
+        yield line.encode('utf-8')
+
+    return 200, [
+      ('Content-Type', 'application/x-ndjson; charset=utf-8'),
+      ('Cache-Control', 'no-cache'),
+      ('Access-Control-Allow-Origin', '*'),
+    ] + _timing_headers(req.timing), lines()
+
+  def _pool(self):
+    """Thread pool for batch items and fan-out calls, started on first use."""
+    with self._batch_lock:
+      if self._batch_pool is None:
+        from concurrent.futures import ThreadPoolExecutor
+        self._batch_pool = ThreadPoolExecutor(self.batch_workers, thread_name_prefix='jsee-batch')
+    return self._batch_pool
+
+  def _handle_fanout(self, req):
+    """POST /api/fanout[?models=a,b]: run models concurrently on the same inputs.
+
+    Streams server-sent events as the models finish, fastest first:
+    `result` {"model", "result", "ms"} or `error` {"model", "error"} per
+    model, then `done` {"models", "errors"}. Each model gets the inputs
+    its function accepts.
+    """
+    from concurrent.futures import FIRST_COMPLETED, wait
+    from .batch import error_text, finish
+    from .pipeline import accepted
+    from .streaming import HEARTBEAT
+    names = [m.get('name', 'model') for m in self.models if m.get('name', 'model') in self.funcs]
+    if req.query.get('models'):
+      names = [n for n in ','.join(req.query['models']).split(',') if n]
+      unknown = [n for n in names if n not in self.funcs]
+      if unknown:
+        return _error_response('Unknown model: ' + ', '.join(unknown), 404)
+    req.model = 'fanout'
+    t = time.perf_counter_ns()
+    try:
+      data = self._read_inputs(req)
+      if not isinstance(data, dict):
+        raise ValueError('Expected a JSON object')
+      if self.uploads:
+        data = self.uploads.resolve(data)
+    except (KeyError, ValueError) as e:
+      return _error_response('Invalid request: ' + _error_message(e), 400)
+    req.lap('parse', t)
+
+    def run(name):
+      start = time.perf_counter()
+      keys, var_kw = accepted(self.funcs[name])
+      args = dict(data) if var_kw else {k: data[k] for k in keys if k in data}
+      key = self._cache_key(name, args)
+      output = self._cache_get(name, key)
+      if output is None:
+        output = _serialize_result(finish(self._call(name, args)))
+        if key:
+          self.cache.put(key, name, output)
+      return output, round((time.perf_counter() - start) * 1000, 3)
+
+    def event(name, payload):
+      return 'event: {}\ndata: {}\n\n'.format(name, json.dumps(payload)).encode('utf-8')
+
+    pool = self._pool()
+    futures = {pool.submit(run, name): name for name in names}
+
+    def events():
+      errors = 0
+      pending = set(futures)
+      try:
+        while pending:
+          done, pending = wait(pending, timeout=self.sse_heartbeat or None, return_when=FIRST_COMPLETED)
+          if not done:
+            yield HEARTBEAT
+          for future in done:
+            try:
+              output, ms = future.result()
+              yield event('result', {'model': futures[future], 'result': output, 'ms': ms})
+            except Exception as e:
+              errors += 1
+              yield event('error', {'model': futures[future], 'error': error_text(e)})
+        yield event('done', {'models': len(futures), 'errors': errors})
+      finally:
+        # Client gone: drop the models that haven't started
+        for future in pending:
+          future.cancel()
+
+    return 200, [
+      ('Content-Type', 'text/event-stream; charset=utf-8'),
+      ('Cache-Control', 'no-cache'),
+      ('Access-Control-Allow-Origin', '*'),
+    ] + _timing_headers(req.timing), events()
+
+  def _submit_job(self, req, model_name):
+    from .jobs import QueueFull
+    try:
+      data = self._read_inputs(req)
+      if not isinstance(data, dict):
+        raise ValueError('Expected a JSON object')
+      job = self.jobs.submit(model_name, data)
+    except (KeyError, ValueError) as e:
+      return _error_response('Invalid request: ' + _error_message(e), 400)
+    except QueueFull as e:
+      status, headers, body = _error_response(str(e), 503)
+      return status, headers + [('Retry-After', '5')], body
+    status, headers, body = _json_response(job, 202)
+    return status, headers + [('Location', '/api/jobs/' + job['id'])], body
+
+  def _run_job(self, model_name, data):
+    """Job worker entry point: inputs as submitted, uploads resolved late."""
+    if self.uploads:
+      data = self.uploads.resolve(data)
+    return self._call(model_name, data)
+
+  def _handle_jobs(self, req):
+    """Job routes:
+
+      GET    /api/jobs/<id>         status, progress and result
+      GET    /api/jobs/<id>/events  SSE: status, progress, result / error
+      DELETE /api/jobs/<id>         cancel, or delete a finished job
+
+    Jobs are submitted with POST /<model>/jobs, or POST /<model> with
+    `Prefer: respond-async`. Remote workers (jsee.worker) of a coordinator
+    use, sending the worker token as X-JSEE-Worker-Token:
+
+      POST   /api/jobs/claim            {worker?, models?, wait?} → job or 204
+      POST   /api/jobs/<id>/heartbeat   {token, progress?} (409: stop)
+      POST   /api/jobs/<id>/result      {token, result | error}
+    """
+    parts = req.path.split('/')[3:]
+    if req.method == 'POST' and self.coordinator:
+      return self._handle_worker(req, parts)
+    try:
+      if len(parts) == 1 and req.method == 'GET':
+        return _json_response(self.jobs.get(parts[0]))
+      if len(parts) == 1 and req.method == 'DELETE':
+        return _json_response(self.jobs.cancel(parts[0]))
+      if len(parts) == 2 and parts[1] == 'events' and req.method == 'GET':
+        return 200, [
+          ('Content-Type', 'text/event-stream; charset=utf-8'),
+          ('Cache-Control', 'no-cache'),
+          ('Access-Control-Allow-Origin', '*'),
+        ], self.jobs.events(parts[0], heartbeat=self.sse_heartbeat or 15)
+    except KeyError as e:
+      return _error_response(_error_message(e), 404)
+    return _error_response('Unsupported job request', 405)
+
+  def _handle_worker(self, req, parts):
+    import hmac
+    from .jobs import LeaseLost
+    token = req.headers.get('x-jsee-worker-token') or ''
+    if not hmac.compare_digest(token.encode('utf-8'), self.worker_token.encode('utf-8')):
+      return _error_response('Invalid worker token', 403)
+    try:
+      opts = json.loads(req.read() or b'{}')
+      if not isinstance(opts, dict):
+        raise ValueError('Expected a JSON object')
+      if parts == ['claim']:
+        job = self.jobs.claim(
+          opts.get('models'), worker=opts.get('worker'),
+          wait=min(float(opts.get('wait') or 0), 30))
+        if job is None:
+          return 204, [('Access-Control-Allow-Origin', '*')], b''
+        try:
+          return _json_response(job)
+        except (TypeError, ValueError):
+          self.jobs.complete(job['id'], job['token'], error='Inputs are not JSON; run this job locally')
+          return 204, [('Access-Control-Allow-Origin', '*')], b''
+      if len(parts) == 2 and parts[1] == 'heartbeat':
+        return _json_response(self.jobs.heartbeat(parts[0], opts.get('token'), opts.get('progress')))
+      if len(parts) == 2 and parts[1] == 'result':
+        return _json_response(self.jobs.complete(
+          parts[0], opts.get('token'), opts.get('result'), opts.get('error')))
+    except LeaseLost as e:
+      return _error_response(str(e), 409)
+    except KeyError as e:
+      return _error_response(_error_message(e), 404)
+    except ValueError as e:
+      return _error_response('Invalid request: ' + str(e), 400)
+    return _error_response('Unsupported job request', 405)
+
+  def _cache_key(self, model_name, data):
+    """Result cache key of a call, or None when it isn't cached."""
+    if (self.cache is None or model_name not in self.deterministic
+        or model_name in self.uncached or not isinstance(data, dict)):
+      return None
+    return self.cache.key(model_name, self.funcs[model_name], data)
+
+  def _cache_get(self, model_name, key):
+    if key is None:
+      return None
+    output = self.cache.get(key)
+    if self.metrics is not None:
+      self.metrics.add('jsee_cache_requests_total',
+                       (('model', model_name), ('result', 'miss' if output is None else 'hit')))
+    return output
+
+  def _call(self, model_name, data):
+    """Run a model in-process, or in a worker process when enabled."""
+    if isinstance(self.funcs, ModelRegistry):
+      # Lazily loaded models stay loaded while they run
+      return self.funcs.call(model_name, data, lambda func, data: self._run(model_name, func, data))
+    return self._run(model_name, self.funcs[model_name], data)
+
+  def _run(self, model_name, func, data):
+    if self.runner and self.runner.accepts(func):
+      return self.runner.call(model_name, data)
+    return func(**data)
+
+  def _record_chat(self, session_id, message, result):
+    """Append the user message and the model reply to the session.
+
+    For generators the reply is recorded when the stream ends: the outputs
+    accumulated from its chunks (Append and Patch included), or the last
+    chunk when that isn't a dict.
+    """
+    def record(reply):
+      if isinstance(reply, dict):
+        reply = reply.get('chat', reply)
+      if isinstance(reply, dict) and reply.get('content'):
+        assistant = {'role': reply.get('role', 'assistant'), 'content': reply['content']}
+      elif isinstance(reply, str):
+        assistant = {'role': 'assistant', 'content': reply}
+      else:
+        return
+      self.sessions.append(session_id, {'role': 'user', 'content': message}, assistant)
+
+    if not inspect.isgenerator(result):
+      record(result)
+      return result
+
+    def recording():
+      from .streaming import Append, OutputState, Patch
+      outputs = OutputState(_serialize_result, track=False)
+      last = None
+      for chunk in result:
+        last = chunk
+        if isinstance(chunk, (dict, Append, Patch)):
+          outputs.apply(chunk)
+        yield chunk
+      record(outputs.current if isinstance(last, (dict, Append, Patch)) else last)
+    return recording()
+
+  def _handle_upload(self, req):
+    """Chunked upload routes:
+
+      POST   /api/uploads                {size, filename?, sha256?, chunk_size?}
+      GET    /api/uploads/<id>           status with received part indices
+      PUT    /api/uploads/<id>/<index>   raw part bytes (X-Content-SHA256 optional)
+      POST   /api/uploads/<id>/complete  verify and finalize
+      DELETE /api/uploads/<id>           abort
+    """
+    parts = req.path.split('/')[3:]
+    try:
+      if not parts and req.method == 'POST':
+        try:
+          opts = json.loads(req.read() or b'{}')
+        except (json.JSONDecodeError, ValueError) as e:
+          raise ValueError('Invalid request: ' + str(e))
+        if not isinstance(opts, dict):
+          raise ValueError('Expected a JSON object')
+        return _json_response(self.uploads.create(
+          opts.get('size'),
+          filename=opts.get('filename'),
+          sha256=opts.get('sha256'),
+          chunk_size=opts.get('chunk_size'),
+        ), 201)
+      if len(parts) == 1 and req.method == 'GET':
+        return _json_response(self.uploads.status(parts[0]))
+      if len(parts) == 1 and req.method == 'DELETE':
+        self.uploads.delete(parts[0])
+        return _json_response({'id': parts[0], 'deleted': True})
+      if len(parts) == 2 and parts[1] == 'complete' and req.method == 'POST':
+        return _json_response(self.uploads.complete(parts[0]))
+      if len(parts) == 2 and parts[1].isdigit() and req.method == 'PUT':
+        return _json_response(self.uploads.write_part(
+          parts[0], int(parts[1]), req.rfile, req.content_length,
+          sha256=req.headers.get('x-content-sha256'),
+        ))
+    except KeyError as e:
+      return _error_response(_error_message(e), 404)
+    except ValueError as e:
+      return _error_response(str(e), 400)
+    return _error_response('Unsupported upload request', 405)
+
+  def wsgi(self, environ, start_response):
+    """WSGI entry point."""
+    headers = {}
+    for key, value in environ.items():
+      if key.startswith('HTTP_'):
+        headers[key[5:].replace('_', '-')] = value
+    if environ.get('CONTENT_TYPE'):
+      headers['Content-Type'] = environ['CONTENT_TYPE']
+    path = environ.get('PATH_INFO', '/')
+    if environ.get('QUERY_STRING'):
+      path += '?' + environ['QUERY_STRING']
+    req = _Request(
+      environ.get('REQUEST_METHOD', 'GET'), path, headers,
+      environ['wsgi.input'], int(environ.get('CONTENT_LENGTH', 0) or 0),
+    )
+    status, resp_headers, body = self.handle(req)
+    from http import HTTPStatus
+    start_response('{} {}'.format(status, HTTPStatus(status).phrase), resp_headers)
+    if self.metrics is None and not self.profiling:
+      return [body] if isinstance(body, bytes) else body
+    return _Written(self, req, status, body)
+
+
+class _Written:
+  """WSGI response iterable that reports to _App.finish() on close()."""
+
+  def __init__(self, app, req, status, body):
+    self.app = app
+    self.req = req
+    self.status = status
+    self.body = body
+    self.streamed = not isinstance(body, bytes)
+    self.sent = 0
+    self.write_ns = 0
+
+  def __iter__(self):
+    chunks = [self.body] if not self.streamed else self.body
+    for chunk in chunks:
+      self.sent += len(chunk)
+      t = time.perf_counter_ns()
+      yield chunk
+      # Time the server spent writing before asking for the next chunk
+      self.write_ns += time.perf_counter_ns() - t
+
+  def close(self):
+    close = getattr(self.body, 'close', None)
+    if close:
+      close()
+    self.app.finish(self.req, self.status, self.sent, self.write_ns, self.streamed)
+
+
+def _make_handler(app):
+  """Build a BaseHTTPRequestHandler class dispatching to an _App."""
+  from http.server import BaseHTTPRequestHandler
+
+  class Handler(BaseHTTPRequestHandler):
+    def log_message(self, format, *args):
+      pass
 
+    def _dispatch(self):
+      req = _Request(
+        self.command, self.path, self.headers, self.rfile,
+        int(self.headers.get('Content-Length', 0) or 0),
+      )
+      status, headers, body = app.handle(req)
+      t = time.perf_counter_ns()
+      sent = 0
       try:
-        result = funcs[model_name](**data)
-        # Generator → SSE streaming response
-        if inspect.isgenerator(result) or inspect.isasyncgen(result):
-          self.send_response(200)
-          self.send_header('Content-Type', 'text/event-stream; charset=utf-8')
-          self.send_header('Cache-Control', 'no-cache')
-          self.send_header('Access-Control-Allow-Origin', '*')
-          self.end_headers()
-          try:
-            for chunk in result:
-              payload = json.dumps(_serialize_result(chunk))
-              self.wfile.write('data: {}\n\n'.format(payload).encode('utf-8'))
-              self.wfile.flush()
-            self.wfile.write('data: [DONE]\n\n'.encode('utf-8'))
+        self.send_response(status)
+        for key, value in headers:
+          self.send_header(key, value)
+        self.end_headers()
+        if isinstance(body, bytes):
+          self.wfile.write(body)
+          sent = len(body)
+          return
+        try:
+          for chunk in body:
+            self.wfile.write(chunk)
             self.wfile.flush()
-          except (BrokenPipeError, ConnectionResetError):
-            pass
-        else:
-          self._send_json(_serialize_result(result))
-      except Exception as e:
-        self._send_error(str(e), 500)
-
-  server = HTTPServer((host, port), Handler)
-  print('JSEE server: http://{}:{}'.format(
-    'localhost' if host == '0.0.0.0' else host, port))
-  print('  GUI: http://localhost:{}/'.format(port))
-  print('  API: http://localhost:{}/api'.format(port))
-  print('  OpenAPI: http://localhost:{}/api/openapi.json'.format(port))
+            sent += len(chunk)
+        except (BrokenPipeError, ConnectionResetError):
+          pass
+        finally:
+          # Stop the model generator when the client goes away
+          close = getattr(body, 'close', None)
+          if close:
+            close()
+      finally:
+        app.finish(req, status, sent, time.perf_counter_ns() - t, not isinstance(body, bytes))
+
+    do_GET = do_POST = do_PUT = do_DELETE = do_OPTIONS = _dispatch
+
+  return Handler
+
+
+def serve(target, host='0.0.0.0', port=5050, **kwargs):
+  """Start a server with GUI + JSON API.
+
+  target can be:
+    - A Python function (schema auto-generated from type hints)
+    - A dict (pre-built JSEE schema)
+    - A string path to schema.json
+
+  Keyword args (passed to generate_schema when target is callable):
+    title, description, examples, reactive, chat
+
+  Server options:
+    uploads: True or directory path — enable resumable chunked uploads
+      at /api/uploads (default directory: <tmp>/jsee-uploads);
+      upload_max_size caps one upload in bytes (default 1 GB)
+    sessions: True, directory path, or SessionStore — keep chat history
+      server-side per conversation (chat mode; directory adds a disk tier)
+    sse_interval: float — coalesce streamed chunks into at most one SSE
+      frame per interval (seconds); sse_max_bytes flushes earlier once that
+      much change is pending, sse_heartbeat sends keepalive comments
+    processes: int — run model calls in a pool of worker processes;
+      large buffers are passed through shared memory (see jsee.executor)
+    batch_workers: int — items of a POST /<model>/batch, and the models of
+      a POST /api/fanout, run concurrently on a pool of this many threads
+      (default: CPU count, or 2 per process with `processes`)
+    pipeline: bool — for a schema with several models: run them all in
+      one request at POST /api/pipeline, as the page does client-side
+      (each gets the inputs merged with the previous outputs), passing
+      Python objects between stages and caching each stage's result by
+      the inputs it reads (see jsee.pipeline); pipeline_cache sets the
+      number of stage results kept (default 128). Also set by
+      "pipeline": true in the schema
+    cache_control: str — Cache-Control of GET /<model> responses for
+      models marked deterministic (default "public, max-age=3600"); a
+      schema model's "cache_control" overrides it
+    cache: SQLite path or ResultCache — persistent cache of model results,
+      shared by all server processes and kept across restarts, keyed by
+      model, inputs and the model's source file (see jsee.cache);
+      cache_size caps it in bytes (default 1 GB). Only models marked
+      deterministic are cached; "cache": false in a schema model opts
+      one out
+    idempotency: bool or IdempotencyStore — POSTs with an Idempotency-Key
+      header run once; retries wait for the running request or replay its
+      stored response (see jsee.idempotency). Off by default. Stored
+      responses live in the memory of each server process, so with
+      workers > 1 a retry replays only if it reaches the same process.
+      idempotency_ttl (seconds, default 1 day) and idempotency_bytes
+      (memory, default 64 MB) bound them
+    jobs: True, SQLite path, or JobQueue — background jobs at
+      POST /<model>/jobs, polled or streamed from /api/jobs/<id>; a path
+      keeps the queue and results across restarts. job_workers, max_jobs
+      and job_ttl tune the default queue
+    coordinator: bool — serve the job routes of remote `jsee worker`
+      processes (see jsee.worker); implies jobs, with job_workers=0
+      unless set. Needs worker_token, the secret the workers must send
+    metrics: bool — expose request counts, latency histograms (by phase),
+      in-flight requests, job queue depth and bytes in/out at /metrics in
+      the Prometheus text format
+    profiling: bool — allow `"_profile": "pstats" | "collapsed"` in model
+      requests and sample running requests at /api/profile (see
+      jsee.profiling); exposes code paths, so enable only for trusted
+      clients
+    workers: int — fork this many server processes sharing the listening
+      socket, supervised and restarted by the parent (see jsee.prefork;
+      Unix only, not with jobs, sessions or processes)
+    lazy: bool — import the .py models of a schema on their first request
+      instead of at startup (see jsee.models); warm imports them in a
+      background thread after startup. max_models (LRU count), model_ttl
+      (seconds idle) and model_memory (RSS bytes, Linux) unload idle
+      models, which load again on their next request. /api reports which
+      models are loaded. Not with processes
+    pool: int — instances per process of model classes that are not
+      thread-safe (see jsee.lifecycle); default one shared instance
+    warmup: bool — after setup, model classes run over the schema
+      examples before the server accepts requests; True also warms up
+      function models, False disables it
+    build: str — directory written by `jsee build` (see jsee.artifact):
+      load the prebuilt schema, page, OpenAPI spec and compressed runtime
+      instead of generating them; ignored with a warning when stale
+    unix_socket: str — listen on a Unix domain socket at this path instead
+      of host:port (e.g. behind nginx on the same host)
+    sock: socket or fd — serve on an already bound, listening socket; a
+      socket passed by systemd socket activation is used automatically
+      (see jsee.sockets)
+  """
+  workers = kwargs.pop('workers', None) or 1
+  if workers > 1:
+    shared = [k for k in ('jobs', 'coordinator', 'sessions', 'processes') if kwargs.get(k)]
+    if shared:
+      raise ValueError('workers > 1 cannot be combined with {}: their state lives in one '
+                       'process'.format(', '.join(shared)))
+  unix_socket = kwargs.pop('unix_socket', None)
+  sock = kwargs.pop('sock', None)
+  app = _App(target, host, port, **kwargs)
+  if workers == 1:
+    # Ready before the port opens; prefork children start their own models
+    app.start()
+  from .prefork import inherited_socket
+  from .sockets import adopt_server, describe, systemd_fd, unix_server
+  # A socket from a reloading prefork parent or systemd wins over binding
+  fd, inherited_path = inherited_socket()
+  if fd is None and sock is None and unix_socket is None:
+    fd = systemd_fd()
+  if fd is not None or sock is not None:
+    server = adopt_server(sock if fd is None else fd, _make_handler(app))
+    # A reloaded server still owns the socket file it bound before
+    unix_socket = inherited_path
+  elif unix_socket:
+    server = unix_server(unix_socket, _make_handler(app))
+  else:
+    from http.server import ThreadingHTTPServer
+    server = ThreadingHTTPServer((host, port), _make_handler(app))
+  address = describe(server)
+  print('JSEE server: ' + address)
+  if address.startswith('unix:'):
+    print('  curl --unix-socket {} http://localhost/api'.format(address[len('unix:'):]))
+  else:
+    print('  GUI: {}/'.format(address))
+    print('  API: {}/api'.format(address))
+    print('  OpenAPI: {}/api/openapi.json'.format(address))
   try:
-    server.serve_forever()
+    if workers > 1:
+      from .prefork import Supervisor
+      if app._warming is not None:
+        # Import before forking, so the children share the loaded models
+        app._warming.join()
+      print('  Workers: {} (pid {}; SIGHUP reloads)'.format(workers, os.getpid()))
+      Supervisor(server, workers, on_start=app.start, on_stop=app.close,
+                 unix_socket=unix_socket).run()
+    else:
+      server.serve_forever()
   except KeyboardInterrupt:
     pass
+  finally:
+    if workers == 1:
+      app.close()
+    # Sockets this server bound itself; adopted ones belong to their owner
+    if unix_socket and os.path.exists(unix_socket):
+      os.unlink(unix_socket)
 
 
 def create_app(target, **kwargs):
@@ -692,9 +2051,11 @@ def create_app(target, **kwargs):
     - A dict (pre-built JSEE schema)
     - A string path to schema.json
 
-  Returns a WSGI callable ``app(environ, start_response)``.
+  Returns a WSGI callable ``app(environ, start_response)``. Accepts the
+  same keyword args as serve().
 
-  Note: SSE streaming is not supported in basic WSGI.
+  Note: generator models return an iterable SSE body; use a WSGI server
+  that does not buffer responses.
 
   Example::
 
@@ -703,180 +2064,10 @@ def create_app(target, **kwargs):
       app = jsee.create_app(lambda x=5: {'result': x * 2})
       # gunicorn app:app
   """
-  funcs = {}
-  schema_cwd = '.'
   host = kwargs.pop('host', '0.0.0.0')
   port = kwargs.pop('port', 5050)
-
-  if isinstance(target, str):
-    schema_cwd = os.path.dirname(os.path.abspath(target))
-    with open(target, 'r') as f:
-      schema = json.load(f)
-    funcs = _load_model_func(schema, schema_cwd)
-  elif isinstance(target, dict):
-    schema = target
-    funcs = _load_model_func(schema, schema_cwd)
-  elif callable(target):
-    schema = generate_schema(target, host, port, **kwargs)
-    if kwargs.get('chat'):
-      original_fn = target
-      def _chat_wrapper(**data):
-        result = original_fn(**data)
-        if isinstance(result, str):
-          return {'chat': result}
-        return result
-      funcs[target.__name__] = _chat_wrapper
-    else:
-      funcs[target.__name__] = target
-  else:
-    raise ValueError('target must be a function, dict, or path to schema.json')
-
-  models = schema.get('model', {})
-  if isinstance(models, dict):
-    models = [models]
-  elif not models:
-    models = []
-
-  for m in models:
-    name = m.get('name', 'model')
-    m['type'] = 'post'
-    m['url'] = '/{}'.format(name)
-    m['worker'] = False
-
-  runtime_path = _find_runtime(schema)
-  runtime_code = None
-  if runtime_path:
-    with open(runtime_path, 'r') as f:
-      runtime_code = f.read()
-
-  model_name = models[0].get('title') or models[0].get('name', 'JSEE') if models else 'JSEE'
-  display_host = 'localhost' if host == '0.0.0.0' else host
-  html = TEMPLATE.format(
-    name=model_name,
-    schema_json=json.dumps(schema),
-    address='{}:{}'.format(display_host, port)
-  )
-  html_bytes = html.encode('utf-8')
-
-  mime_types = {
-    '.html': 'text/html; charset=utf-8',
-    '.js': 'application/javascript; charset=utf-8',
-    '.css': 'text/css; charset=utf-8',
-    '.json': 'application/json; charset=utf-8',
-  }
-
-  def app(environ, start_response):
-    method = environ.get('REQUEST_METHOD', 'GET')
-    path_info = environ.get('PATH_INFO', '/').rstrip('/') or '/'
-
-    if method == 'OPTIONS':
-      start_response('204 No Content', [
-        ('Access-Control-Allow-Origin', '*'),
-        ('Access-Control-Allow-Methods', 'GET, POST, OPTIONS'),
-        ('Access-Control-Allow-Headers', 'Content-Type'),
-      ])
-      return [b'']
-
-    if method == 'GET':
-      if path_info == '/':
-        start_response('200 OK', [
-          ('Content-Type', 'text/html; charset=utf-8'),
-          ('Content-Length', str(len(html_bytes))),
-        ])
-        return [html_bytes]
-
-      if path_info == '/api':
-        api_models = [{'name': m['name'], 'endpoint': m['url'], 'method': 'POST'} for m in models]
-        body = json.dumps({'schema': schema, 'models': api_models}).encode('utf-8')
-        start_response('200 OK', [
-          ('Content-Type', 'application/json; charset=utf-8'),
-          ('Content-Length', str(len(body))),
-          ('Access-Control-Allow-Origin', '*'),
-        ])
-        return [body]
-
-      if path_info == '/api/openapi.json':
-        body = json.dumps(generate_openapi_spec(schema)).encode('utf-8')
-        start_response('200 OK', [
-          ('Content-Type', 'application/json; charset=utf-8'),
-          ('Content-Length', str(len(body))),
-          ('Access-Control-Allow-Origin', '*'),
-        ])
-        return [body]
-
-      if path_info == '/static/jsee.js' and runtime_code:
-        body = runtime_code.encode('utf-8')
-        start_response('200 OK', [
-          ('Content-Type', 'application/javascript; charset=utf-8'),
-          ('Content-Length', str(len(body))),
-        ])
-        return [body]
-
-      # Static files from schema directory
-      rel = path_info.lstrip('/')
-      filepath = os.path.normpath(os.path.join(schema_cwd, rel))
-      if filepath.startswith(os.path.normpath(schema_cwd)) and os.path.isfile(filepath):
-        ext = os.path.splitext(filepath)[1].lower()
-        content_type = mime_types.get(ext, 'application/octet-stream')
-        with open(filepath, 'rb') as f:
-          body = f.read()
-        start_response('200 OK', [
-          ('Content-Type', content_type),
-          ('Content-Length', str(len(body))),
-        ])
-        return [body]
-
-      start_response('404 Not Found', [('Content-Type', 'text/plain')])
-      return [b'Not Found']
-
-    if method == 'POST':
-      model_name_req = path_info.lstrip('/')
-      if model_name_req not in funcs:
-        body = json.dumps({'error': 'Unknown model: ' + model_name_req}).encode('utf-8')
-        start_response('404 Not Found', [
-          ('Content-Type', 'application/json; charset=utf-8'),
-          ('Content-Length', str(len(body))),
-          ('Access-Control-Allow-Origin', '*'),
-        ])
-        return [body]
-
-      content_length = int(environ.get('CONTENT_LENGTH', 0) or 0)
-      raw_body = environ['wsgi.input'].read(content_length) if content_length else b'{}'
-      content_type = environ.get('CONTENT_TYPE', '')
-
-      try:
-        if 'multipart/form-data' in content_type:
-          data = _parse_multipart(content_type, raw_body)
-        else:
-          data = json.loads(raw_body)
-      except (json.JSONDecodeError, ValueError) as e:
-        body = json.dumps({'error': 'Invalid request: ' + str(e)}).encode('utf-8')
-        start_response('400 Bad Request', [
-          ('Content-Type', 'application/json; charset=utf-8'),
-          ('Content-Length', str(len(body))),
-          ('Access-Control-Allow-Origin', '*'),
-        ])
-        return [body]
-
-      try:
-        result = funcs[model_name_req](**data)
-        body = json.dumps(_serialize_result(result)).encode('utf-8')
-        start_response('200 OK', [
-          ('Content-Type', 'application/json; charset=utf-8'),
-          ('Content-Length', str(len(body))),
-          ('Access-Control-Allow-Origin', '*'),
-        ])
-        return [body]
-      except Exception as e:
-        body = json.dumps({'error': str(e)}).encode('utf-8')
-        start_response('500 Internal Server Error', [
-          ('Content-Type', 'application/json; charset=utf-8'),
-          ('Content-Length', str(len(body))),
-          ('Access-Control-Allow-Origin', '*'),
-        ])
-        return [body]
-
-    start_response('405 Method Not Allowed', [('Content-Type', 'text/plain')])
-    return [b'Method Not Allowed']
-
-  return app
+  app = _App(target, host, port, **kwargs)
+  # Each WSGI worker process sets up its models when it loads the app
+  app.start()
+  atexit.register(app.close)
+  return app.wsgi
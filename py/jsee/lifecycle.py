@@ -0,0 +1,127 @@
+"""Class-based models with setup, warmup and teardown.
+
+A model can be a class instead of a function:
+
+    class Classifier:
+      def setup(self):                  # optional: load weights, open pools
+        self.model = load_weights()
+
+      def __call__(self, text: str) -> dict:
+        return self.model(text)
+
+      def teardown(self):               # optional: release resources
+        self.model.close()
+
+The schema is generated from __call__. The server builds the instances
+before it accepts requests: one per process (serve, each prefork worker,
+each WSGI worker, each `processes` worker on its first call), or `pool`
+instances for models that are not thread-safe, each serving one request
+at a time. After setup the model runs over the schema examples to warm
+caches and JITs. teardown() runs when the server stops.
+"""
+
+import inspect
+import os
+import queue
+import sys
+import threading
+
+
+def is_model_class(target):
+  """Whether target is a class served through its __call__ method."""
+  return inspect.isclass(target) and any('__call__' in vars(c) for c in target.__mro__[:-1])
+
+
+def _consume(result):
+  if inspect.isgenerator(result):
+    for _ in result:
+      pass
+  return result
+
+
+class Lifecycle:
+  """Callable running requests on instances of a model class.
+
+  cls: the model class (instantiated without arguments)
+  pool: instances per process; each serves one request at a time.
+    None shares one instance between all request threads.
+  examples: inputs to call each instance with after setup
+  """
+
+  def __init__(self, cls, pool=None, examples=None):
+    self.cls = cls
+    self.pool = pool
+    self.examples = examples or []
+    self.__name__ = cls.__name__
+    self.__doc__ = cls.__doc__
+    self.__wrapped__ = cls.__call__
+    self._lock = threading.Lock()
+    self._pid = None
+    self._instances = []
+    self._idle = None
+
+  def _new(self):
+    instance = self.cls()
+    setup = getattr(instance, 'setup', None)
+    if setup:
+      setup()
+    for data in self.examples:
+      try:
+        _consume(instance(**data))
+      except Exception as e:
+        print('jsee: warmup of {} with {} failed: {}: {}'.format(
+          self.__name__, data, type(e).__name__, e), file=sys.stderr)
+    return instance
+
+  def start(self):
+    """Create, set up and warm the instances of this process."""
+    with self._lock:
+      if self._pid == os.getpid():
+        return self
+      # Instances inherited over fork belong to the parent
+      self._instances = [self._new() for _ in range(self.pool or 1)]
+      self._idle = queue.LifoQueue()
+      for instance in self._instances:
+        self._idle.put(instance)
+      self._pid = os.getpid()
+    return self
+
+  def close(self):
+    """Tear down this process's instances."""
+    with self._lock:
+      instances, self._instances = self._instances, []
+      started = self._pid == os.getpid()
+      self._pid = None
+    if not started:
+      return
+    for instance in instances:
+      teardown = getattr(instance, 'teardown', None)
+      if teardown:
+        try:
+          teardown()
+        except Exception as e:
+          print('jsee: teardown of {} failed: {}: {}'.format(
+            self.__name__, type(e).__name__, e), file=sys.stderr)
+
+  def __call__(self, **data):
+    if self._pid != os.getpid():
+      self.start()
+    if not self.pool:
+      return self._instances[0](**data)
+    instance = self._idle.get()
+    try:
+      result = instance(**data)
+    except BaseException:
+      self._idle.put(instance)
+      raise
+    if not inspect.isgenerator(result):
+      self._idle.put(instance)
+      return result
+    return self._stream(instance, result)
+
+  def _stream(self, instance, result):
+    # The instance stays checked out until the stream ends
+    try:
+      yield from result
+    finally:
+      self._idle.put(instance)
@@ -0,0 +1,163 @@
+"""In-process metrics in the Prometheus text format.
+
+Counters, gauges and histograms are kept in per-thread shards, so
+recording a value is a plain dict update without locks. The lock is only
+taken when a thread records its first value and when /metrics is
+scraped. Shards of finished threads (http.server starts one per
+connection) are folded into a base shard at both points, so only live
+threads keep a shard.
+"""
+
+import bisect
+import threading
+
+
+# Latency buckets in seconds, from 0.5 ms to 60 s
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25,
+                   0.5, 1, 2.5, 5, 10, 30, 60)
+
+
+class Metrics:
+  """Registry of labelled counters, gauges and histograms.
+
+  Labels are tuples of (name, value) pairs, e.g. (('model', 'sum'),).
+  Gauges are counters that also go down (add with negative values);
+  gauges computed at scrape time come from collector callbacks.
+  """
+
+  def __init__(self, buckets=DEFAULT_BUCKETS):
+    self.buckets = tuple(buckets)
+    self._local = threading.local()
+    self._lock = threading.Lock()
+    self._shards = []
+    self._base = {}
+    self._meta = {}
+    self._collectors = []
+
+  def describe(self, name, kind, help_text):
+    """Declare a metric: kind is counter, gauge or histogram."""
+    self._meta[name] = (kind, help_text)
+
+  def collector(self, func):
+    """Register func() → [(name, labels, value)], evaluated on scrape."""
+    self._collectors.append(func)
+
+  def _shard(self):
+    shard = getattr(self._local, 'shard', None)
+    if shard is None:
+      shard = self._local.shard = {}
+      with self._lock:
+        self._fold()
+        self._shards.append((threading.current_thread(), shard))
+    return shard
+
+  def add(self, name, labels=(), value=1):
+    """Add to a counter or gauge."""
+    shard = self._shard()
+    key = (name, labels)
+    shard[key] = shard.get(key, 0) + value
+
+  def observe(self, name, labels, value):
+    """Record one histogram observation (seconds)."""
+    shard = self._shard()
+    key = (name, labels)
+    hist = shard.get(key)
+    if hist is None:
+      # Per-bucket counts (last one is +Inf), then the sum
+      hist = shard[key] = [0] * (len(self.buckets) + 1) + [0.0]
+    hist[bisect.bisect_left(self.buckets, value)] += 1
+    hist[-1] += value
+
+  def _merge(self, into, shard):
+    for key, value in list(shard.items()):
+      old = into.get(key)
+      if isinstance(value, list):
+        into[key] = [a + b for a, b in zip(old, value)] if old else list(value)
+      else:
+        into[key] = (old or 0) + value
+
+  def _fold(self):
+    """Merge shards of finished threads into the base shard (lock held)."""
+    live = []
+    for thread, shard in self._shards:
+      if thread.is_alive():
+        live.append((thread, shard))
+      else:
+        self._merge(self._base, shard)
+    self._shards = live
+
+  def snapshot(self):
+    """Merged values of all shards: {(name, labels): value or histogram}."""
+    with self._lock:
+      self._fold()
+      merged = {}
+      self._merge(merged, self._base)
+      for _, shard in self._shards:
+        self._merge(merged, shard)
+    for func in self._collectors:
+      for name, labels, value in func():
+        merged[(name, labels)] = value
+    return merged
+
+  def value(self, name, labels=()):
+    """Current value of a counter or gauge (0 if never recorded)."""
+    return self.snapshot().get((name, labels), 0)
+
+  def render(self):
+    """Prometheus text exposition format (version 0.0.4)."""
+    by_name = {}
+    for (name, labels), value in self.snapshot().items():
+      by_name.setdefault(name, []).append((labels, value))
+    lines = []
+    for name in sorted(by_name):
+      kind, help_text = self._meta.get(name, ('untyped', ''))
+      if help_text:
+        lines.append('# HELP {} {}'.format(name, help_text))
+      lines.append('# TYPE {} {}'.format(name, kind))
+      for labels, value in sorted(by_name[name], key=lambda item: item[0]):
+        if isinstance(value, list):
+          total = 0
+          for bound, count in zip(self.buckets + ('+Inf',), value):
+            total += count
+            lines.append('{}_bucket{} {}'.format(
+              name, _labels(labels + (('le', _number(bound)),)), total))
+          lines.append('{}_sum{} {}'.format(name, _labels(labels), _number(value[-1])))
+          lines.append('{}_count{} {}'.format(name, _labels(labels), total))
+        else:
+          lines.append('{}{} {}'.format(name, _labels(labels), _number(value)))
+    return '\n'.join(lines) + '\n'
+
+
+def _number(value):
+  if isinstance(value, str):
+    return value
+  if isinstance(value, float) and value.is_integer():
+    return repr(value)
+  return str(value)
+
+
+def _labels(labels):
+  if not labels:
+    return ''
+  return '{' + ','.join('{}="{}"'.format(k, str(v).replace('\\', '\\\\').replace('"', '\\"')
+                                                 .replace('\n', '\\n'))
+                        for k, v in labels) + '}'
+
+
+def server_metrics():
+  """Registry with the metrics recorded by the jsee server."""
+  metrics = Metrics()
+  metrics.describe('jsee_requests_total', 'counter',
+                   'Requests by model ("" for other routes) and status code')
+  metrics.describe('jsee_request_duration_seconds', 'histogram',
+                   'Time from receiving a request to writing the last byte')
+  metrics.describe('jsee_request_phase_seconds', 'histogram',
+                   'Model request time by phase: parse, execute, serialize, write')
+  metrics.describe('jsee_stream_duration_seconds', 'histogram',
+                   'Duration of streamed (SSE) responses')
+  metrics.describe('jsee_requests_in_flight', 'gauge', 'Requests being handled')
+  metrics.describe('jsee_request_bytes_total', 'counter', 'Request body bytes received')
+  metrics.describe('jsee_response_bytes_total', 'counter', 'Response body bytes sent')
+  metrics.describe('jsee_jobs', 'gauge', 'Background jobs by status (queue depth: queued)')
+  metrics.describe('jsee_cache_requests_total', 'counter', 'Result cache lookups by model and result (hit, miss)')
+  return metrics
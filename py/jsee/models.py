@@ -0,0 +1,252 @@
+"""Loading of Python models referenced by a schema.
+
+A schema model with a .py url names a file and a function in it:
+
+    {"name": "predict", "url": "predict.py"}
+
+load_model() imports the file and returns the function. ModelRegistry
+does that lazily for multi-model servers: a model is imported on its
+first request (or in the background with warm()), and idle models are
+unloaded when more than max_models are loaded, after ttl seconds without
+a request, or while the process is over a memory budget. A model is idle
+when no call() of it is running. An unloaded model is imported again on
+its next request.
+"""
+
+import gc
+import importlib.util
+import inspect
+import os
+import threading
+import time
+import weakref
+from collections import OrderedDict
+from collections.abc import Mapping
+
+from .lifecycle import Lifecycle, is_model_class
+
+
+def load_model(name, path):
+  """Import a model file and return its function.
+
+  The function is the module attribute called `name`, or else the only
+  public function (or model class, see jsee.lifecycle) defined in the file;
+  imported helpers don't count.
+  """
+  spec = importlib.util.spec_from_file_location(name, path)
+  mod = importlib.util.module_from_spec(spec)
+  spec.loader.exec_module(mod)
+  func = getattr(mod, name, None)
+  if func is not None:
+    return func
+  candidates = [
+    value for key, value in vars(mod).items()
+    if not key.startswith('_') and (inspect.isfunction(value) or is_model_class(value))
+    and value.__module__ == mod.__name__
+  ]
+  if len(candidates) == 1:
+    return candidates[0]
+  raise ValueError('{}: no function named {}{}'.format(
+    path, name, ' (and several candidates: {})'.format(
+      ', '.join(f.__name__ for f in candidates)) if candidates else ''))
+
+
+def schema_models(schema, cwd='.'):
+  """{name: file path} of the Python models in a schema."""
+  models = schema.get('model', [])
+  if isinstance(models, dict):
+    models = [models]
+  return {
+    m.get('name', 'model'): os.path.join(cwd, m['url'])
+    for m in models if (m.get('url') or '').endswith('.py')
+  }
+
+
+def rss():
+  """Resident set size of this process in bytes (None where unknown)."""
+  try:
+    with open('/proc/self/statm') as f:
+      return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+  except (OSError, ValueError, IndexError, AttributeError):
+    return None
+
+
+class ModelRegistry(Mapping):
+  """Mapping of model name → function, importing models on first access.
+
+  paths: {name: file path}, see schema_models()
+  max_models: models kept loaded, least recently used unloaded first
+  ttl: seconds without a request after which a model is unloaded
+  memory: RSS budget in bytes; after a load, idle models are unloaded
+    (least recently used first) until the process is within it (Linux)
+  loader: (name, path) → function (default: load_model)
+
+  Models with calls in flight (see call()) are never unloaded by the
+  limits; the registry may stay over them until those calls return.
+  """
+
+  def __init__(self, paths, max_models=None, ttl=None, memory=None, loader=None):
+    self.paths = dict(paths)
+    self.max_models = max_models
+    self.ttl = ttl
+    self.memory = memory
+    self.loader = loader or load_model
+    # name → [func, last used, calls in flight], least recently used first
+    self._loaded = OrderedDict()
+    self._start()
+    if hasattr(os, 'register_at_fork'):
+      # Forked servers (workers=N) get fresh locks and their own janitor
+      ref = weakref.ref(self)
+      os.register_at_fork(after_in_child=lambda: ref() and ref()._start())
+
+  def _start(self):
+    self._lock = threading.Lock()
+    # Per-model locks, so concurrent first requests import once
+    self._loading = {name: threading.Lock() for name in self.paths}
+    if self.ttl:
+      threading.Thread(target=_expire_loop, args=(weakref.ref(self),), daemon=True).start()
+
+  def __contains__(self, name):
+    return name in self.paths
+
+  def __iter__(self):
+    return iter(self.paths)
+
+  def __len__(self):
+    return len(self.paths)
+
+  def __getitem__(self, name):
+    return self._entry(name)[0]
+
+  def _entry(self, name, busy=0):
+    """Loaded entry of a model, importing it if needed; busy is added to
+    its calls in flight."""
+    if name not in self.paths:
+      raise KeyError(name)
+    with self._lock:
+      entry = self._loaded.get(name)
+      if entry is not None:
+        entry[1] = time.monotonic()
+        entry[2] += busy
+        self._loaded.move_to_end(name)
+        return entry
+    with self._loading[name]:
+      with self._lock:
+        entry = self._loaded.get(name)
+        if entry is not None:
+          entry[2] += busy
+          return entry
+      func = self.loader(name, self.paths[name])
+      with self._lock:
+        entry = self._loaded[name] = [func, time.monotonic(), busy]
+        evicted = self._evict(keep=name)
+      _close(evicted)
+    return entry
+
+  def call(self, name, data, run=None):
+    """Call a model, keeping it loaded until the call returns.
+
+    run: (func, data) → result (default: func(**data)). A generator
+    result keeps the model loaded until it is exhausted or closed.
+    """
+    entry = self._entry(name, busy=1)
+    try:
+      result = run(entry[0], data) if run else entry[0](**data)
+    except BaseException:
+      self._release(entry)
+      raise
+    if inspect.isgenerator(result):
+      return self._releasing(entry, result)
+    self._release(entry)
+    return result
+
+  def _releasing(self, entry, gen):
+    try:
+      yield from gen
+    finally:
+      self._release(entry)
+
+  def _release(self, entry):
+    with self._lock:
+      entry[2] -= 1
+      # Limits skipped while the model was busy apply now
+      evicted = self._evict(keep=None) if not entry[2] else []
+    _close(evicted)
+
+  def loaded(self):
+    """Names of the models currently loaded, least recently used first."""
+    with self._lock:
+      return list(self._loaded)
+
+  def unload(self, name):
+    with self._lock:
+      entry = self._loaded.pop(name, None)
+    if entry is not None:
+      _close([entry[0]])
+    return entry is not None
+
+  def warm(self, names=None):
+    """Import models in a background thread (all by default)."""
+    def run():
+      for name in names or list(self.paths):
+        try:
+          self[name]
+        except Exception:
+          # Reported on the model's first request instead
+          pass
+    thread = threading.Thread(target=run, daemon=True)
+    thread.start()
+    return thread
+
+  def _evict(self, keep):
+    """Unload least recently used idle models over the limits (lock held).
+
+    Returns the unloaded functions, to be closed outside the lock.
+    """
+    def victim():
+      return next((n for n, e in self._loaded.items() if n != keep and not e[2]), None)
+
+    evicted = []
+    while self.max_models and len(self._loaded) > self.max_models:
+      name = victim()
+      if name is None:
+        break
+      evicted.append(self._loaded.pop(name)[0])
+    if self.memory:
+      if evicted:
+        gc.collect()
+      while len(self._loaded) > 1 and (rss() or 0) > self.memory:
+        name = victim()
+        if name is None:
+          break
+        evicted.append(self._loaded.pop(name)[0])
+        gc.collect()
+    return evicted
+
+
+def _close(funcs):
+  """Tear down unloaded class models, then free their memory."""
+  for func in funcs:
+    if isinstance(func, Lifecycle):
+      func.close()
+  if funcs:
+    gc.collect()
+
+
+def _expire_loop(ref):
+  """Unload models idle for longer than the registry's ttl, until it is gone."""
+  registry = ref()
+  interval = max(min(registry.ttl / 2.0, 30), 0.05)
+  del registry
+  while True:
+    time.sleep(interval)
+    registry = ref()
+    if registry is None:
+      return
+    now = time.monotonic()
+    with registry._lock:
+      idle = [n for n, (_, used, busy) in registry._loaded.items()
+              if not busy and now - used > registry.ttl]
+      evicted = [registry._loaded.pop(name)[0] for name in idle]
+    del registry
+    _close(evicted)
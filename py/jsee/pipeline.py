@@ -0,0 +1,134 @@
+"""Server-side execution of multi-model pipelines.
+
+A schema with several models is a pipeline: the runtime calls each model
+with the result of the previous one, merged over it when both are
+objects. Declared with "pipeline": true (or serve(..., pipeline=True),
+CLI --pipeline), the server runs all the stages in one request at
+POST /api/pipeline, with the same semantics as the runtime:
+
+    stage 1  called with the inputs
+    stage n  called with the inputs and the outputs of stages 1..n-1
+             (a dict result is merged over them; any other result
+             replaces them and is passed as the next stage's first
+             argument); a result with a truthy "stop" ends the pipeline
+
+Values pass between stages as Python objects, without JSON in between.
+A stage gets only the keys its function accepts (all of them with
+**kwargs), and its result is cached by those arguments: changing an
+input only a later stage reads reruns that stage and what follows, not
+the stages before it.
+
+Cache keys don't hash upstream objects. A stage output is identified by
+the key of the call that produced it, and a request input by its
+canonical JSON. Cached outputs are shared between requests, so stages
+must not modify their arguments in place.
+"""
+
+import hashlib
+import inspect
+import threading
+from collections import OrderedDict
+
+from .cache import canonical
+
+
+def accepted(func):
+  """(parameter names, takes **kwargs) of a stage function."""
+  cls = getattr(func, 'cls', None)
+  target = cls.__call__ if cls is not None else func
+  try:
+    params = list(inspect.signature(target).parameters.values())
+  except (TypeError, ValueError):
+    return [], True
+  if cls is not None:
+    params = params[1:]
+  names = [p.name for p in params if p.kind in (p.POSITIONAL_OR_KEYWORD, p.KEYWORD_ONLY)]
+  return names, any(p.kind == p.VAR_KEYWORD for p in params)
+
+
+def _token(value):
+  """Identity of a request input, or None when it has none (not JSON)."""
+  try:
+    return canonical(value)
+  except (TypeError, ValueError):
+    return None
+
+
+class Pipeline:
+  """Run model stages in order, caching each stage's result.
+
+  stages: model names, in order
+  funcs: mapping of model name → function (read on each run, so lazily
+    loaded models work)
+  call: (name, kwargs) → result, runs one stage (default funcs[name](**kwargs))
+  cache_size: stage results kept (least recently used dropped); 0 disables
+  """
+
+  def __init__(self, stages, funcs, call=None, cache_size=128):
+    self.stages = list(stages)
+    self.funcs = funcs
+    self.call = call or (lambda name, kwargs: funcs[name](**kwargs))
+    self.cache_size = cache_size
+    self._cache = OrderedDict()
+    self._lock = threading.Lock()
+
+  def _args(self, name, data, tokens):
+    """Arguments of a stage and the cache key of calling it with them."""
+    names, var_kw = accepted(self.funcs[name])
+    args = dict(data) if var_kw else {k: data[k] for k in names if k in data}
+    parts = [name]
+    for key in sorted(args):
+      token = tokens.get(key)
+      if token is None:
+        return args, None
+      parts.append('{}={}'.format(key, token))
+    return args, hashlib.sha256('\0'.join(parts).encode('utf-8')).hexdigest()
+
+  def _cached(self, key):
+    with self._lock:
+      if key in self._cache:
+        self._cache.move_to_end(key)
+        return True, self._cache[key]
+    return False, None
+
+  def _store(self, key, result):
+    with self._lock:
+      self._cache[key] = result
+      while len(self._cache) > self.cache_size:
+        self._cache.popitem(last=False)
+
+  def run(self, inputs, finish=None):
+    """Run the stages on inputs. Returns (result, {stage: 'hit' | 'miss'}).
+
+    finish: applied to each stage result (e.g. to consume generators)
+    """
+    data = dict(inputs)
+    tokens = {key: _token(value) for key, value in data.items()}
+    result = data
+    trace = OrderedDict()
+    for name in self.stages:
+      if isinstance(result, dict) and result.get('stop'):
+        break
+      if not isinstance(result, dict):
+        # A non-dict result is the first argument of the next stage
+        names, _ = accepted(self.funcs[name])
+        data = {names[0]: result} if names else {}
+        tokens = {k: tokens.get('$value') for k in data}
+      args, key = self._args(name, data, tokens)
+      hit, value = self._cached(key) if key and self.cache_size else (False, None)
+      if not hit:
+        value = self.call(name, args)
+        if finish:
+          value = finish(value)
+        if key and self.cache_size:
+          self._store(key, value)
+      trace[name] = 'hit' if hit else 'miss'
+      if isinstance(value, dict):
+        data = dict(data, **value)
+        tokens = dict(tokens, **{k: key and '{}.{}'.format(key, k) for k in value})
+        result = data
+      elif value is not None:
+        tokens = {'$value': key}
+        result = value
+      # None passes the previous result through
+    return result, trace
@@ -0,0 +1,191 @@
+"""Prefork server: several processes accepting on one listening socket.
+
+serve(..., workers=N) (CLI: --workers N) imports the target, builds the
+app and binds the socket once, then forks N children that each run the
+HTTP server on the inherited socket. The kernel spreads connections over
+the processes, and the imported model code and loaded runtime bundle are
+shared copy-on-write.
+
+The parent supervises the children:
+
+    child exits       restarted (with a delay when children keep crashing)
+    SIGTERM, SIGINT   children stop accepting, finish their requests, exit
+    SIGHUP            graceful reload: the parent re-executes itself with
+                      the listening socket inherited (JSEE_LISTEN_FD, and
+                      JSEE_LISTEN_PATH for a Unix socket it bound), so
+                      new code is loaded while the socket stays open and
+                      no connection is refused; old children drain and exit
+    SIGTTIN, SIGTTOU  one more / one fewer child
+
+Unix only (needs os.fork).
+"""
+
+import os
+import signal
+import sys
+import threading
+import time
+
+
+LISTEN_FD_ENV = 'JSEE_LISTEN_FD'
+# Unix socket file the server bound, so the reloaded server still unlinks it
+LISTEN_PATH_ENV = 'JSEE_LISTEN_PATH'
+BACKLOG = 1024
+
+
+def inherited_socket():
+  """(fd, unix socket path) passed by a reloading parent; None when unset."""
+  fd = os.environ.pop(LISTEN_FD_ENV, None)
+  path = os.environ.pop(LISTEN_PATH_ENV, None)
+  return (int(fd) if fd else None), (path or None)
+
+
+class Supervisor:
+  """Fork and supervise server children.
+
+  server: a bound socketserver server; children call its serve_forever()
+  workers: number of children
+  graceful_timeout: seconds a stopping child gets to finish its requests
+  on_start, on_stop: called in each child before it accepts connections
+    and after it stopped (model setup and teardown)
+  unix_socket: path of the Unix socket file the server bound, handed to
+    the reloaded parent, which unlinks it on shutdown
+  """
+
+  def __init__(self, server, workers, graceful_timeout=30, on_start=None, on_stop=None,
+               unix_socket=None):
+    if not hasattr(os, 'fork'):
+      raise RuntimeError('workers needs os.fork (not available on this platform)')
+    self.server = server
+    self.workers = workers
+    self.graceful_timeout = graceful_timeout
+    self.on_start = on_start
+    self.on_stop = on_stop
+    self.unix_socket = unix_socket
+    self.children = {}
+    self._signal = None
+    self._stopping = False
+    self._failures = 0
+    # Queue connections while children restart instead of refusing them
+    server.socket.listen(BACKLOG)
+
+  def _child(self):
+    server = self.server
+    # Wait for running requests on close, up to graceful_timeout
+    server.daemon_threads = False
+    server.block_on_close = True
+
+    def stop(signum, frame):
+      signal.alarm(self.graceful_timeout)
+      threading.Thread(target=server.shutdown, daemon=True).start()
+
+    signal.signal(signal.SIGTERM, stop)
+    # Terminal signals reach the whole process group; the parent coordinates
+    for sig in (signal.SIGINT, signal.SIGHUP, signal.SIGTTIN, signal.SIGTTOU):
+      signal.signal(sig, signal.SIG_IGN)
+    code = 0
+    try:
+      if self.on_start:
+        self.on_start()
+      server.serve_forever()
+      server.server_close()
+      if self.on_stop:
+        self.on_stop()
+    except BaseException:
+      code = 1
+      import traceback
+      traceback.print_exc()
+    finally:
+      sys.stdout.flush()
+      sys.stderr.flush()
+      os._exit(code)
+
+  def _spawn(self):
+    pid = os.fork()
+    if pid == 0:
+      self._child()
+    self.children[pid] = time.monotonic()
+
+  def _on_signal(self, signum, frame):
+    self._signal = signum
+
+  def _reap(self):
+    while self.children:
+      try:
+        pid, _ = os.waitpid(-1, os.WNOHANG)
+      except ChildProcessError:
+        self.children.clear()
+        return
+      if pid == 0:
+        return
+      started = self.children.pop(pid, None)
+      if started is not None and not self._stopping:
+        # Back off when children die right after starting (broken code)
+        self._failures = self._failures + 1 if time.monotonic() - started < 1 else 0
+        if self._failures > 3:
+          time.sleep(min(self._failures, 10))
+
+  def _stop_children(self, timeout):
+    for pid in list(self.children):
+      try:
+        os.kill(pid, signal.SIGTERM)
+      except ProcessLookupError:
+        pass
+    deadline = time.monotonic() + timeout
+    while self.children and time.monotonic() < deadline:
+      self._reap()
+      time.sleep(0.05)
+    for pid in list(self.children):
+      try:
+        os.kill(pid, signal.SIGKILL)
+      except ProcessLookupError:
+        pass
+    while self.children:
+      self._reap()
+      time.sleep(0.01)
+
+  def _reload(self):
+    """Re-execute the parent, keeping the listening socket open."""
+    fd = self.server.socket.fileno()
+    os.set_inheritable(fd, True)
+    os.environ[LISTEN_FD_ENV] = str(fd)
+    if self.unix_socket:
+      os.environ[LISTEN_PATH_ENV] = self.unix_socket
+    for pid in list(self.children):
+      try:
+        os.kill(pid, signal.SIGTERM)
+      except ProcessLookupError:
+        pass
+    # Drained children finish on their own (graceful_timeout alarm)
+    sys.stdout.flush()
+    sys.stderr.flush()
+    os.execv(sys.executable, [sys.executable] + sys.argv)
+
+  def run(self):
+    """Run until SIGTERM/SIGINT; SIGHUP reloads."""
+    for sig in (signal.SIGTERM, signal.SIGINT, signal.SIGHUP, signal.SIGTTIN, signal.SIGTTOU):
+      signal.signal(sig, self._on_signal)
+    try:
+      while True:
+        while len(self.children) < self.workers and not self._stopping:
+          self._spawn()
+        signum, self._signal = self._signal, None
+        if signum in (signal.SIGTERM, signal.SIGINT):
+          self._stopping = True
+          break
+        if signum == signal.SIGHUP:
+          self._reload()
+        elif signum == signal.SIGTTIN:
+          self.workers += 1
+        elif signum == signal.SIGTTOU and self.workers > 1:
+          self.workers -= 1
+          # Stop the newest child; untracked, so it is not replaced
+          pid = max(self.children, key=self.children.get)
+          self.children.pop(pid)
+          os.kill(pid, signal.SIGTERM)
+        self._reap()
+        time.sleep(0.1)
+    finally:
+      self._stopping = True
+      self._stop_children(self.graceful_timeout)
+      self.server.server_close()
@@ -0,0 +1,102 @@
+"""Profiling of model calls on a running server.
+
+- profile_call() runs one call under cProfile (pstats text) or under the
+  sampler restricted to the calling thread (collapsed stacks).
+- Sampler polls sys._current_frames() from a background thread and
+  counts stacks of the selected threads. Its output is the collapsed
+  format read by flamegraph.pl, speedscope and similar tools:
+
+      serve_forever (socketserver.py:215);...;predict (app.py:12) 42
+"""
+
+import cProfile
+import io
+import os
+import pstats
+import sys
+import threading
+import time
+from collections import Counter
+
+
+FORMATS = ('pstats', 'collapsed')
+
+
+def _frame_name(code):
+  return '{} ({}:{})'.format(code.co_name, os.path.basename(code.co_filename), code.co_firstlineno)
+
+
+def _stack(frame):
+  names = []
+  while frame is not None:
+    names.append(_frame_name(frame.f_code))
+    frame = frame.f_back
+  return ';'.join(reversed(names))
+
+
+class Sampler:
+  """Background sampling profiler.
+
+  interval: seconds between samples
+  threads: callable returning the thread idents to sample (default: all
+    threads except the sampler)
+  """
+
+  def __init__(self, interval=0.005, threads=None):
+    self.interval = interval
+    self.threads = threads
+    self.counts = Counter()
+    self.samples = 0
+    self._stop = threading.Event()
+    self._thread = None
+
+  def _run(self):
+    own = threading.get_ident()
+    while not self._stop.wait(self.interval):
+      frames = sys._current_frames()
+      idents = self.threads() if self.threads else frames.keys()
+      for ident in list(idents):
+        frame = frames.get(ident)
+        if ident != own and frame is not None:
+          self.counts[_stack(frame)] += 1
+      self.samples += 1
+
+  def start(self):
+    self._thread = threading.Thread(target=self._run, daemon=True)
+    self._thread.start()
+    return self
+
+  def stop(self):
+    self._stop.set()
+    if self._thread:
+      self._thread.join()
+    return self
+
+  def run_for(self, seconds):
+    """Sample for `seconds`, then return the collapsed stacks."""
+    self.start()
+    time.sleep(seconds)
+    return self.stop().collapsed()
+
+  def collapsed(self):
+    """Stacks in collapsed format, most frequent first."""
+    return ''.join('{} {}\n'.format(stack, n) for stack, n in self.counts.most_common())
+
+
+def profile_call(func, data, fmt='pstats', sort='cumulative', limit=40, interval=0.001):
+  """Run func(**data) under a profiler. Returns (result, report text)."""
+  if fmt not in FORMATS:
+    raise ValueError('Unknown profile format: {} (use {})'.format(fmt, ' or '.join(FORMATS)))
+  if fmt == 'collapsed':
+    ident = threading.get_ident()
+    sampler = Sampler(interval, threads=lambda: (ident,)).start()
+    try:
+      result = func(**data)
+    finally:
+      sampler.stop()
+    return result, sampler.collapsed()
+  profiler = cProfile.Profile()
+  result = profiler.runcall(func, **data)
+  out = io.StringIO()
+  pstats.Stats(profiler, stream=out).sort_stats(sort).print_stats(limit)
+  return result, out.getvalue()
@@ -0,0 +1,166 @@
+"""Server-side chat history store.
+
+In chat mode the runtime normally sends the whole conversation with every
+message. With a SessionStore the client sends only the new message and a
+conversation ID; the server keeps the history and passes it to the model.
+
+Sessions live in memory (LRU by last access). With a directory, sessions
+evicted from memory are spilled to disk as JSON and reloaded on demand;
+files not touched for ttl seconds are swept periodically.
+"""
+
+import json
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+
+
+_ID_RE = re.compile(r'^[A-Za-z0-9_-]{1,128}$')
+# Seconds between sweeps of expired session files
+SWEEP_INTERVAL = 300
+
+
+class SessionStore:
+  """Per-conversation chat histories with size caps and eviction.
+
+  max_sessions: sessions kept in memory before the least recently used
+    one is evicted (to disk when `directory` is set)
+  max_messages: messages kept per session, oldest dropped first
+  max_bytes: approximate JSON size kept per session, oldest dropped first
+  ttl: seconds of inactivity after which a session expires
+  """
+
+  def __init__(self, directory=None, max_sessions=1000, max_messages=200,
+               max_bytes=1024 * 1024, ttl=24 * 3600):
+    self.directory = directory
+    self.max_sessions = max_sessions
+    self.max_messages = max_messages
+    self.max_bytes = max_bytes
+    self.ttl = ttl
+    self._lock = threading.Lock()
+    # id → [messages, sizes, touched]
+    self._sessions = OrderedDict()
+    self._swept = time.time()
+    if directory:
+      os.makedirs(directory, exist_ok=True)
+      self._sweep()
+
+  def _check_id(self, session_id):
+    if not isinstance(session_id, str) or not _ID_RE.match(session_id):
+      raise ValueError('Invalid session id')
+
+  def _disk_path(self, session_id):
+    return os.path.join(self.directory, session_id + '.json')
+
+  def _expired(self, touched):
+    return self.ttl and time.time() - touched > self.ttl
+
+  def _load(self, session_id):
+    """Return the in-memory entry for a session, reloading it from disk."""
+    entry = self._sessions.get(session_id)
+    if entry is not None:
+      if self._expired(entry[2]):
+        del self._sessions[session_id]
+        entry = None
+      else:
+        self._sessions.move_to_end(session_id)
+        return entry
+    if not self.directory:
+      return None
+    path = self._disk_path(session_id)
+    try:
+      if self._expired(os.path.getmtime(path)):
+        os.remove(path)
+        return None
+      with open(path, 'r') as f:
+        messages = json.load(f)
+      os.remove(path)
+    except (OSError, ValueError):
+      return None
+    entry = [messages, [_size(m) for m in messages], time.time()]
+    self._store(session_id, entry)
+    return entry
+
+  def _sweep(self):
+    """Delete session files older than ttl (lock held or at startup)."""
+    self._swept = time.time()
+    if not self.ttl:
+      return
+    for name in os.listdir(self.directory):
+      if not name.endswith('.json'):
+        continue
+      path = os.path.join(self.directory, name)
+      try:
+        if self._expired(os.path.getmtime(path)):
+          os.remove(path)
+      except OSError:
+        pass
+
+  def _store(self, session_id, entry):
+    if self.directory and time.time() - self._swept > min(SWEEP_INTERVAL, self.ttl or SWEEP_INTERVAL):
+      self._sweep()
+    self._sessions[session_id] = entry
+    self._sessions.move_to_end(session_id)
+    while len(self._sessions) > self.max_sessions:
+      evicted_id, evicted = self._sessions.popitem(last=False)
+      if self.directory and not self._expired(evicted[2]):
+        tmp = self._disk_path(evicted_id) + '.tmp'
+        with open(tmp, 'w') as f:
+          json.dump(evicted[0], f)
+        os.replace(tmp, self._disk_path(evicted_id))
+
+  def _trim(self, entry):
+    messages, sizes = entry[0], entry[1]
+    total = sum(sizes)
+    while messages and (len(messages) > self.max_messages or total > self.max_bytes):
+      messages.pop(0)
+      total -= sizes.pop(0)
+
+  def get(self, session_id):
+    """Return a copy of the session's history ([] for a new session)."""
+    self._check_id(session_id)
+    with self._lock:
+      entry = self._load(session_id)
+      return list(entry[0]) if entry else []
+
+  def set(self, session_id, history):
+    """Replace the session's history (e.g. when a client resyncs)."""
+    self._check_id(session_id)
+    messages = list(history or [])
+    with self._lock:
+      entry = [messages, [_size(m) for m in messages], time.time()]
+      self._trim(entry)
+      self._store(session_id, entry)
+
+  def append(self, session_id, *messages):
+    """Append messages, enforcing the per-session caps."""
+    self._check_id(session_id)
+    with self._lock:
+      entry = self._load(session_id)
+      if entry is None:
+        entry = [[], [], time.time()]
+        self._store(session_id, entry)
+      for m in messages:
+        entry[0].append(m)
+        entry[1].append(_size(m))
+      entry[2] = time.time()
+      self._trim(entry)
+
+  def delete(self, session_id):
+    self._check_id(session_id)
+    with self._lock:
+      self._sessions.pop(session_id, None)
+      if self.directory:
+        try:
+          os.remove(self._disk_path(session_id))
+        except OSError:
+          pass
+
+  def __len__(self):
+    return len(self._sessions)
+
+
+def _size(message):
+  return len(json.dumps(message, default=str))
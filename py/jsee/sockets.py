@@ -0,0 +1,112 @@
+"""Listening sockets other than host:port.
+
+- Unix domain sockets (serve(unix_socket=path), CLI --unix PATH), for a
+  reverse proxy on the same host: no TCP loopback, no port to allocate.
+- Pre-opened sockets (serve(sock=socket_or_fd), CLI --fd N), including
+  systemd socket activation, which is picked up automatically: systemd
+  binds the socket, starts the server on the first connection and holds
+  connections while it starts. A minimal unit pair:
+
+      # jsee.socket
+      [Socket]
+      ListenStream=/run/jsee.sock
+
+      # jsee.service
+      [Service]
+      ExecStart=/usr/bin/jsee /srv/app/model.py predict
+"""
+
+import errno
+import os
+import socket
+import stat
+from http.server import ThreadingHTTPServer
+from socketserver import TCPServer
+
+
+# First fd passed by systemd (sd_listen_fds)
+SD_LISTEN_FDS_START = 3
+
+
+def systemd_fd():
+  """fd of a socket passed by systemd socket activation, or None."""
+  if os.environ.get('LISTEN_PID') != str(os.getpid()):
+    return None
+  try:
+    count = int(os.environ.get('LISTEN_FDS', '0'))
+  except ValueError:
+    return None
+  # Not inherited by processes the model starts
+  for key in ('LISTEN_PID', 'LISTEN_FDS', 'LISTEN_FDNAMES'):
+    os.environ.pop(key, None)
+  return SD_LISTEN_FDS_START if count >= 1 else None
+
+
+class UnixHTTPServer(ThreadingHTTPServer):
+  """ThreadingHTTPServer on a Unix domain socket."""
+
+  address_family = socket.AF_UNIX
+
+  def server_bind(self):
+    # HTTPServer.server_bind expects a (host, port) address
+    TCPServer.server_bind(self)
+    self.server_name = 'localhost'
+    self.server_port = 0
+
+  def get_request(self):
+    request, _ = self.socket.accept()
+    # Handlers expect a (host, port) client address
+    return request, ('unix', 0)
+
+
+def _remove_stale(path):
+  """Unlink a socket file left by a server that is gone.
+
+  A socket something still listens on raises OSError(EADDRINUSE).
+  """
+  try:
+    mode = os.stat(path).st_mode
+  except FileNotFoundError:
+    return
+  if not stat.S_ISSOCK(mode):
+    raise ValueError('Not a socket: {}'.format(path))
+  probe = socket.socket(socket.AF_UNIX)
+  try:
+    probe.connect(path)
+  except OSError as e:
+    if e.errno == errno.ENOENT:
+      return
+    if e.errno != errno.ECONNREFUSED:
+      raise
+  else:
+    raise OSError(errno.EADDRINUSE, 'Address already in use', path)
+  finally:
+    probe.close()
+  os.unlink(path)
+
+
+def unix_server(path, handler):
+  """Bind a Unix domain socket server at path (replacing a stale socket)."""
+  _remove_stale(path)
+  return UnixHTTPServer(path, handler)
+
+
+def adopt_server(sock, handler):
+  """Server on an already bound and listening socket (object or fd)."""
+  if not isinstance(sock, socket.socket):
+    # Family and type are read from the fd
+    sock = socket.socket(fileno=sock)
+  cls = UnixHTTPServer if sock.family == socket.AF_UNIX else ThreadingHTTPServer
+  server = cls(sock.getsockname(), handler, bind_and_activate=False)
+  server.socket.close()
+  server.socket = sock
+  return server
+
+
+def describe(server):
+  """Address a server listens on, for the startup banner."""
+  address = server.socket.getsockname()
+  if server.socket.family == socket.AF_UNIX:
+    return 'unix:' + (address if isinstance(address, str) else address.decode())
+  return 'http://{}:{}'.format(
+    'localhost' if address[0] in ('0.0.0.0', '::') else address[0], address[1])
@@ -0,0 +1,374 @@
+"""SSE framing for generator models.
+
+By default every yielded chunk becomes one `data:` frame. Models can
+yield Append / Patch chunks to change parts of outputs (rows of a table,
+text of a log) without resending them; these are sent as
+{"_append": {name: items}} and {"_patch": [JSON Patch ops]}. Two opt-in
+refinements reduce traffic further:
+
+- Delta frames (requested by the client with `X-JSEE-Stream: delta`):
+  unchanged outputs are skipped, and strings, lists and tables that
+  extend the previously sent value are sent as _append deltas.
+- Coalescing (server option `sse_interval`): the model runs in a producer
+  thread that updates a mirror of the client state; the response writes
+  at most one frame per interval (or sooner once `sse_max_bytes` of
+  changes are pending) and heartbeat comments while idle. The producer
+  never waits for the client, and buffering is bounded by the size of the
+  latest outputs, because only the most recent value of each key is kept.
+
+Chunks merge into the client state the way the runtime applies them:
+keys present in a chunk replace the previous value, absent keys are kept.
+"""
+
+import json
+import threading
+import time
+
+
+DONE = b'data: [DONE]\n\n'
+HEARTBEAT = b': keepalive\n\n'
+
+
+def _encode(payload):
+  return 'data: {}\n\n'.format(json.dumps(payload)).encode('utf-8')
+
+
+_MISSING = object()
+
+
+class Append:
+  """Stream chunk that appends to outputs instead of replacing them.
+
+  Strings are concatenated; rows (lists, list-of-dicts) are added to list
+  and table outputs. Dict rows follow the existing table's columns.
+
+      yield jsee.Append(data=[{'step': i, 'loss': loss}], log='epoch done\n')
+  """
+
+  def __init__(self, **outputs):
+    self.outputs = outputs
+
+
+class Patch:
+  """Stream chunk with JSON Patch (RFC 6902) add / replace / remove ops.
+
+  Paths point into the outputs, e.g. '/chart/title' or '/data/rows/-'.
+
+      yield jsee.Patch([{'op': 'replace', 'path': '/summary', 'value': text}])
+  """
+
+  OPS = ('add', 'replace', 'remove')
+
+  def __init__(self, ops):
+    self.ops = list(ops)
+    for op in self.ops:
+      if op.get('op') not in self.OPS:
+        raise ValueError('Unsupported patch op: {}'.format(op.get('op')))
+      if not isinstance(op.get('path'), str) or not op['path'].startswith('/'):
+        raise ValueError('Patch path must start with /: {}'.format(op.get('path')))
+
+
+def _pointer(path):
+  return [t.replace('~1', '/').replace('~0', '~') for t in path.split('/')[1:]]
+
+
+def _escape(key):
+  return key.replace('~', '~0').replace('/', '~1')
+
+
+def _apply_op(doc, op):
+  """Apply one JSON Patch op to doc in place."""
+  tokens = _pointer(op['path'])
+  parent = doc
+  for token in tokens[:-1]:
+    parent = parent[int(token)] if isinstance(parent, list) else parent[token]
+  last = tokens[-1]
+  if isinstance(parent, list):
+    index = len(parent) if last == '-' else int(last)
+    if op['op'] == 'add':
+      parent.insert(index, op['value'])
+    elif op['op'] == 'replace':
+      parent[index] = op['value']
+    else:
+      del parent[index]
+  elif op['op'] == 'remove':
+    del parent[last]
+  else:
+    parent[last] = op['value']
+
+
+def _is_table(value):
+  return isinstance(value, dict) and isinstance(value.get('rows'), list) and 'columns' in value
+
+
+def _appended(old, new):
+  """Items appended to old to get new, or None if new doesn't extend old."""
+  if isinstance(new, str) and isinstance(old, str):
+    return new[len(old):] if new.startswith(old) else None
+  if isinstance(new, list) and isinstance(old, list):
+    n = len(old)
+    return new[n:] if len(new) >= n and new[:n] == old else None
+  if _is_table(new) and _is_table(old) and new['columns'] == old['columns']:
+    return _appended(old['rows'], new['rows'])
+  return None
+
+
+def _snapshot(value):
+  """Copy nested lists and dicts, so a model that edits a yielded value in
+  place neither races with encoding in the writer nor changes the value
+  the next chunk is compared with (delta frames)."""
+  if isinstance(value, list):
+    return [_snapshot(v) for v in value]
+  if isinstance(value, dict):
+    return {k: _snapshot(v) for k, v in value.items()}
+  return value
+
+
+def _size(value):
+  """Approximate encoded size, for the byte budget."""
+  if isinstance(value, str):
+    return len(value)
+  if isinstance(value, (list, dict)):
+    return 16 * len(value)
+  return 16
+
+
+class OutputState:
+  """Server-side copy of the client's output state.
+
+  Chunks (dicts, Append, Patch) are applied to `current`; `pending` records per output what the
+  client hasn't seen yet, compacted so that coalesced chunks become one
+  frame: 'set' (send the current value, or its growth in delta mode),
+  ['append', items] or ['patch', ops].
+  """
+
+  def __init__(self, serialize, delta=False, track=True):
+    self.serialize = serialize
+    self.delta = delta
+    # track=False keeps only `current` (no frames are taken)
+    self.track = track
+    self.current = {}
+    self.pending = {}
+    # Value the client holds for outputs pending 'set' (delta comparison)
+    self.base = {}
+    self.size = 0
+
+  def _serialize_value(self, value):
+    return self.serialize({'_': value})['_']
+
+  def apply(self, chunk):
+    if isinstance(chunk, Append):
+      for key, value in chunk.outputs.items():
+        self._append(key, value)
+    elif isinstance(chunk, Patch):
+      for op in chunk.ops:
+        if 'value' in op:
+          op = dict(op, value=self._serialize_value(op['value']))
+        self._patch(op)
+    else:
+      for key, value in self.serialize(chunk).items():
+        self._set(key, value)
+
+  def _set(self, key, value):
+    if not self.track:
+      self.current[key] = _snapshot(value)
+      return
+    if key not in self.pending:
+      self.base[key] = self.current.get(key, _MISSING)
+    elif self.pending[key] != 'set':
+      # Client state before the pending ops is gone; send the full value
+      self.base[key] = _MISSING
+    self.pending[key] = 'set'
+    self.current[key] = _snapshot(value)
+    self.size += _size(value)
+
+  def _append(self, key, value):
+    old = self.current.get(key, _MISSING)
+    if old is _MISSING:
+      return self._set(key, self._serialize_value(value))
+    if isinstance(old, str):
+      if not isinstance(value, str):
+        raise TypeError('Cannot append {} to text output {}'.format(type(value).__name__, key))
+      self.current[key] = old + value
+      items = value
+    else:
+      rows = old['rows'] if _is_table(old) else old
+      if not isinstance(rows, list):
+        raise TypeError('Cannot append to output {}'.format(key))
+      items = list(value) if isinstance(value, (list, tuple)) else [value]
+      if _is_table(old):
+        items = [[r.get(c) for c in old['columns']] if isinstance(r, dict) else r for r in items]
+      items = [self._serialize_value(r) for r in items]
+      rows.extend(items)
+    if not self.track:
+      return
+    self.size += _size(items)
+    pending = self.pending.get(key)
+    if pending is None:
+      self.pending[key] = ['append', [items]]
+    elif pending != 'set':
+      if pending[0] == 'append':
+        pending[1].append(items)
+      else:
+        self.pending[key] = 'set'
+        self.base[key] = _MISSING
+
+  def _patch(self, op):
+    _apply_op(self.current, op)
+    if not self.track:
+      return
+    key = _pointer(op['path'])[0]
+    self.size += _size(op.get('value'))
+    pending = self.pending.get(key)
+    if pending is None:
+      self.pending[key] = ['patch', [op]]
+    elif pending != 'set':
+      if pending[0] == 'patch':
+        pending[1].append(op)
+      else:
+        self.pending[key] = 'set'
+        self.base[key] = _MISSING
+
+  def take(self):
+    """Return the frame payload for all pending changes and reset."""
+    payload = {}
+    appends = {}
+    patches = []
+    for key, pending in self.pending.items():
+      if key not in self.current:
+        patches.append({'op': 'remove', 'path': '/' + _escape(key)})
+      elif pending == 'set':
+        value = self.current[key]
+        old = self.base.get(key, _MISSING)
+        if self.delta and old is not _MISSING:
+          if value == old:
+            continue
+          growth = _appended(old, value)
+          if growth is not None:
+            appends[key] = growth
+            continue
+        payload[key] = value
+      elif pending[0] == 'append':
+        parts = pending[1]
+        if isinstance(parts[0], str):
+          appends[key] = ''.join(parts)
+        else:
+          appends[key] = [item for part in parts for item in part]
+      else:
+        patches.extend(pending[1])
+    if appends:
+      payload['_append'] = appends
+    if patches:
+      payload['_patch'] = patches
+    self.pending = {}
+    self.base = {}
+    self.size = 0
+    return payload
+
+
+def sse_stream(result, serialize, delta=False, interval=None, max_bytes=64 * 1024, heartbeat=None):
+  """Yield SSE frames for a generator result, ending with [DONE].
+
+  serialize: maps a yielded chunk to a dict of outputs
+  delta: send unchanged outputs not at all and growing strings, lists
+    and tables as _append deltas
+  interval: coalesce chunks into at most one frame per interval (seconds)
+  max_bytes: flush before the interval once this much change is pending
+  heartbeat: seconds of silence after which a comment frame is sent
+
+  Append and Patch chunks are always sent as _append / _patch.
+  """
+  mirror = OutputState(serialize, delta)
+  if interval is None and not heartbeat:
+    return _direct(result, mirror)
+  return _coalesced(result, mirror, interval or 0, max_bytes, heartbeat)
+
+
+def _direct(result, mirror):
+  """One frame per chunk, written as the model yields."""
+  try:
+    for chunk in result:
+      mirror.apply(chunk)
+      payload = mirror.take()
+      if payload or not mirror.delta:
+        yield _encode(payload)
+  except Exception as e:
+    yield _encode({'error': str(e)})
+  yield DONE
+
+
+class _State:
+  def __init__(self, mirror):
+    self.cond = threading.Condition()
+    self.mirror = mirror
+    self.done = False
+    self.error = None
+    self.cancelled = False
+
+
+def _produce(result, state):
+  try:
+    for chunk in result:
+      if state.cancelled:
+        break
+      with state.cond:
+        state.mirror.apply(chunk)
+        state.cond.notify()
+  except Exception as e:
+    with state.cond:
+      state.error = str(e)
+  finally:
+    if state.cancelled and hasattr(result, 'close'):
+      result.close()
+    with state.cond:
+      state.done = True
+      state.cond.notify()
+
+
+def _coalesced(result, mirror, interval, max_bytes, heartbeat):
+  state = _State(mirror)
+  producer = threading.Thread(target=_produce, args=(result, state), daemon=True)
+  producer.start()
+  # The first chunk goes out immediately; later ones wait for the interval
+  last_flush = float('-inf')
+  last_write = time.monotonic()
+  try:
+    while True:
+      with state.cond:
+        while True:
+          now = time.monotonic()
+          dirty = bool(mirror.pending)
+          if dirty and (state.done or mirror.size >= max_bytes
+                        or now - last_flush >= interval):
+            break
+          if state.done:
+            break
+          if heartbeat and now - last_write >= heartbeat:
+            break
+          timeouts = []
+          if dirty:
+            timeouts.append(interval - (now - last_flush))
+          if heartbeat:
+            timeouts.append(heartbeat - (now - last_write))
+          state.cond.wait(min(timeouts) if timeouts else None)
+        # Encode under the lock: payload values are shared with the mirror
+        payload = mirror.take() if dirty else None
+        frame = _encode(payload) if payload else None
+        done, error = state.done, state.error
+      now = time.monotonic()
+      if dirty:
+        last_flush = now
+      if frame:
+        last_write = now
+        yield frame
+      elif not dirty and not done:
+        last_write = now
+        yield HEARTBEAT
+      if done:
+        if error:
+          yield _encode({'error': error})
+        yield DONE
+        return
+  finally:
+    # Client went away (or stream ended): let the producer stop the model
+    state.cancelled = True
@@ -0,0 +1,220 @@
+"""Resumable chunked uploads assembled on disk.
+
+A client creates an upload with the total size, sends the parts in any
+order (and in parallel), then completes it. Each upload lives in its own
+directory so parts can be written by several threads or processes:
+
+    <root>/<id>/meta.json     upload metadata (size, chunk size, hashes)
+    <root>/<id>/data          preallocated file, parts written at offsets
+    <root>/<id>/parts/<n>     marker with the sha256 of a verified part
+
+Completed uploads are referenced from model inputs as {"$upload": id}.
+"""
+
+import hashlib
+import json
+import os
+import re
+import shutil
+import tempfile
+import time
+import uuid
+
+
+DEFAULT_CHUNK_SIZE = 8 * 1024 * 1024
+DEFAULT_MAX_SIZE = 1024 ** 3
+MAX_PARTS = 10000
+READ_BLOCK = 1024 * 1024
+
+_ID_RE = re.compile(r'^[0-9a-f]{32}$')
+
+
+class UploadStore:
+  """Directory-backed store for resumable uploads.
+
+  max_size: largest upload in bytes (None: unbounded)
+  """
+
+  def __init__(self, root=None, chunk_size=DEFAULT_CHUNK_SIZE, max_size=DEFAULT_MAX_SIZE,
+               ttl=24 * 3600):
+    self.root = root or os.path.join(tempfile.gettempdir(), 'jsee-uploads')
+    self.chunk_size = chunk_size
+    self.max_size = max_size
+    self.ttl = ttl
+    os.makedirs(self.root, exist_ok=True)
+
+  def _dir(self, upload_id):
+    if not isinstance(upload_id, str) or not _ID_RE.match(upload_id):
+      raise KeyError('Unknown upload: {}'.format(upload_id))
+    path = os.path.join(self.root, upload_id)
+    if not os.path.isfile(os.path.join(path, 'meta.json')):
+      raise KeyError('Unknown upload: {}'.format(upload_id))
+    return path
+
+  def _read_meta(self, path):
+    with open(os.path.join(path, 'meta.json'), 'r') as f:
+      return json.load(f)
+
+  def _write_meta(self, path, meta):
+    tmp = os.path.join(path, 'meta.json.{}.tmp'.format(uuid.uuid4().hex))
+    with open(tmp, 'w') as f:
+      json.dump(meta, f)
+    os.replace(tmp, os.path.join(path, 'meta.json'))
+
+  def _received(self, path):
+    parts_dir = os.path.join(path, 'parts')
+    return sorted(int(n) for n in os.listdir(parts_dir) if n.isdigit())
+
+  def _status(self, path, meta):
+    status = dict(meta)
+    status['received'] = self._received(path)
+    return status
+
+  def purge(self):
+    """Remove uploads not touched for longer than ttl seconds.
+
+    meta.json is touched by every part written, so uploads still
+    receiving parts are kept.
+    """
+    if not self.ttl:
+      return
+    cutoff = time.time() - self.ttl
+    for name in os.listdir(self.root):
+      path = os.path.join(self.root, name)
+      meta_path = os.path.join(path, 'meta.json')
+      try:
+        if os.path.getmtime(meta_path) < cutoff:
+          shutil.rmtree(path, ignore_errors=True)
+      except OSError:
+        pass
+
+  def create(self, size, filename=None, sha256=None, chunk_size=None):
+    """Start a new upload of `size` bytes. Returns the upload status."""
+    if not isinstance(size, int) or isinstance(size, bool) or size < 0:
+      raise ValueError('size must be a non-negative integer')
+    if self.max_size is not None and size > self.max_size:
+      raise ValueError('Upload exceeds maximum size of {} bytes'.format(self.max_size))
+    if chunk_size is None:
+      chunk_size = max(self.chunk_size, -(-size // MAX_PARTS))
+    if not isinstance(chunk_size, int) or chunk_size <= 0:
+      raise ValueError('chunk_size must be a positive integer')
+    parts = max(1, -(-size // chunk_size))
+    if parts > MAX_PARTS:
+      raise ValueError('Too many parts: {} (max {})'.format(parts, MAX_PARTS))
+    self.purge()
+    upload_id = uuid.uuid4().hex
+    path = os.path.join(self.root, upload_id)
+    os.makedirs(os.path.join(path, 'parts'))
+    with open(os.path.join(path, 'data'), 'wb') as f:
+      f.truncate(size)
+    meta = {
+      'id': upload_id,
+      'filename': filename,
+      'size': size,
+      'chunk_size': chunk_size,
+      'parts': parts,
+      'sha256': sha256.lower() if sha256 else None,
+      'complete': False,
+    }
+    self._write_meta(path, meta)
+    return self._status(path, meta)
+
+  def status(self, upload_id):
+    """Return metadata and the list of received part indices."""
+    path = self._dir(upload_id)
+    return self._status(path, self._read_meta(path))
+
+  def write_part(self, upload_id, index, rfile, length, sha256=None):
+    """Stream part `index` from `rfile` into place and verify its hash.
+
+    Parts are idempotent: resending a part overwrites the same byte range.
+    The part counts as received only once it is verified, so a failed
+    resend leaves it missing rather than marked with stale data.
+    """
+    path = self._dir(upload_id)
+    meta = self._read_meta(path)
+    if meta['complete']:
+      raise ValueError('Upload already complete')
+    if not 0 <= index < meta['parts']:
+      raise ValueError('Part index out of range: {}'.format(index))
+    offset = index * meta['chunk_size']
+    expected = min(meta['chunk_size'], meta['size'] - offset)
+    if length != expected:
+      raise ValueError('Part {} must be {} bytes, got {}'.format(index, expected, length))
+    marker = os.path.join(path, 'parts', str(index))
+    try:
+      os.remove(marker)
+    except FileNotFoundError:
+      pass
+    digest = hashlib.sha256()
+    remaining = length
+    with open(os.path.join(path, 'data'), 'r+b') as f:
+      f.seek(offset)
+      while remaining:
+        block = rfile.read(min(READ_BLOCK, remaining))
+        if not block:
+          raise ValueError('Part {} truncated'.format(index))
+        digest.update(block)
+        f.write(block)
+        remaining -= len(block)
+    hexdigest = digest.hexdigest()
+    if sha256 and sha256.lower() != hexdigest:
+      raise ValueError('Part {} sha256 mismatch'.format(index))
+    tmp = '{}.{}.tmp'.format(marker, uuid.uuid4().hex)
+    with open(tmp, 'w') as f:
+      f.write(hexdigest)
+    os.replace(tmp, marker)
+    # Activity for purge()
+    os.utime(os.path.join(path, 'meta.json'))
+    return {'id': upload_id, 'index': index, 'sha256': hexdigest,
+            'received': self._received(path)}
+
+  def complete(self, upload_id):
+    """Check that all parts arrived and the whole-file hash matches."""
+    path = self._dir(upload_id)
+    meta = self._read_meta(path)
+    if meta['complete']:
+      return self._status(path, meta)
+    received = self._received(path)
+    missing = sorted(set(range(meta['parts'])) - set(received))
+    if missing:
+      raise ValueError('Missing parts: {}'.format(missing[:20]))
+    digest = hashlib.sha256()
+    with open(os.path.join(path, 'data'), 'rb') as f:
+      for block in iter(lambda: f.read(READ_BLOCK), b''):
+        digest.update(block)
+    hexdigest = digest.hexdigest()
+    if meta['sha256'] and meta['sha256'] != hexdigest:
+      raise ValueError('Upload sha256 mismatch')
+    meta['sha256'] = hexdigest
+    meta['complete'] = True
+    self._write_meta(path, meta)
+    return self._status(path, meta)
+
+  def delete(self, upload_id):
+    shutil.rmtree(self._dir(upload_id), ignore_errors=True)
+
+  def path(self, upload_id):
+    """Path to the assembled file of a completed upload."""
+    path = self._dir(upload_id)
+    if not self._read_meta(path)['complete']:
+      raise ValueError('Upload not complete: {}'.format(upload_id))
+    return os.path.join(path, 'data')
+
+  def resolve(self, data):
+    """Replace {"$upload": id} input values with file contents.
+
+    {"$upload": id, "as": "path"} passes the assembled file path instead,
+    for models that stream large files from disk.
+    """
+    resolved = {}
+    for key, value in data.items():
+      if isinstance(value, dict) and '$upload' in value:
+        filepath = self.path(value['$upload'])
+        if value.get('as') == 'path':
+          value = filepath
+        else:
+          with open(filepath, 'rb') as f:
+            value = f.read()
+      resolved[key] = value
+    return resolved
@@ -0,0 +1,200 @@
+"""Remote job workers for scaling a jsee app across machines.
+
+A coordinator is a normal jsee server with background jobs enabled
+(`jsee app.py func --coordinator`). Workers load the same target and pull
+jobs from it over HTTP (`jsee worker http://coordinator:5050 app.py func`):
+
+    POST /api/jobs/claim           lease the next queued job (long poll)
+    POST /api/jobs/<id>/heartbeat  extend the lease, report progress
+    POST /api/jobs/<id>/result     report the result or error
+
+A worker that dies stops heartbeating; when its lease runs out the
+coordinator queues the job again for another worker.
+"""
+
+import copy
+import inspect
+import json
+import os
+import socket
+import sys
+import threading
+import time
+import urllib.error
+import urllib.request
+
+from .jsee import _load_model_func, _serialize_result
+from .streaming import OutputState
+
+
+def load_funcs(target, function=None):
+  """Load model functions from schema.json or a .py file, as the server does."""
+  cwd = os.path.dirname(os.path.abspath(target))
+  if target.endswith('.json'):
+    with open(target, 'r') as f:
+      schema = json.load(f)
+  else:
+    name = function or os.path.splitext(os.path.basename(target))[0]
+    schema = {'model': {'name': name, 'url': os.path.basename(target)}}
+  funcs = _load_model_func(schema, cwd)
+  if not funcs:
+    raise ValueError('No model functions found in ' + target)
+  return funcs
+
+
+class Worker:
+  """Pull jobs from a coordinator and run them.
+
+  url: base URL of the coordinator
+  funcs: {model name: function}; only jobs of these models are claimed
+  concurrency: jobs run at once (one thread each)
+  token: shared secret matching the coordinator's worker_token
+  wait: seconds a claim long-polls for a job
+  progress_interval: seconds between progress reports of generator models
+  """
+
+  def __init__(self, url, funcs, concurrency=1, worker_id=None, token=None,
+               wait=20, progress_interval=1.0):
+    self.url = url.rstrip('/')
+    self.funcs = funcs
+    self.concurrency = concurrency
+    self.worker_id = worker_id or '{}:{}'.format(socket.gethostname(), os.getpid())
+    self.token = token
+    self.wait = wait
+    self.progress_interval = progress_interval
+    self._stop = threading.Event()
+
+  def _request(self, path, payload, timeout=None):
+    """POST JSON to the coordinator. Returns (status, data or None)."""
+    headers = {'Content-Type': 'application/json'}
+    if self.token:
+      headers['X-JSEE-Worker-Token'] = self.token
+    req = urllib.request.Request(
+      self.url + path, data=json.dumps(payload).encode('utf-8'), headers=headers)
+    try:
+      with urllib.request.urlopen(req, timeout=timeout or self.wait + 10) as resp:
+        body = resp.read()
+        return resp.status, json.loads(body) if body else None
+    except urllib.error.HTTPError as e:
+      return e.code, None
+
+  def run_once(self, wait=None):
+    """Claim one job and run it. Returns False if no job was available."""
+    status, job = self._request('/api/jobs/claim', {
+      'worker': self.worker_id,
+      'models': list(self.funcs),
+      'wait': self.wait if wait is None else wait,
+    })
+    if status == 403:
+      raise PermissionError('Coordinator rejected the worker token')
+    if status != 200 or not job:
+      return False
+    self._run(job)
+    return True
+
+  def _run(self, job):
+    lost = threading.Event()
+    done = threading.Event()
+    lock = threading.Lock()
+    state = {'progress': None, 'version': 0}
+
+    def heartbeat():
+      sent = 0
+      interval = min(job['lease'] / 3.0, self.progress_interval)
+      while not done.wait(interval):
+        payload = {'token': job['token']}
+        with lock:
+          if state['version'] != sent:
+            payload['progress'] = copy.deepcopy(state['progress'])
+            sent = state['version']
+        try:
+          status, _ = self._request('/api/jobs/{}/heartbeat'.format(job['id']), payload)
+        except (OSError, ValueError, TypeError):
+          # TypeError: progress that isn't JSON, skipped until it changes
+          continue
+        if status in (404, 409):
+          lost.set()
+          return
+
+    beat = threading.Thread(target=heartbeat, daemon=True)
+    beat.start()
+    result, error = None, None
+    try:
+      output = self.funcs[job['model']](**job['inputs'])
+      if inspect.isgenerator(output):
+        outputs = OutputState(_serialize_result, track=False)
+        for chunk in output:
+          if lost.is_set():
+            output.close()
+            break
+          with lock:
+            outputs.apply(chunk)
+            state['progress'] = outputs.current
+            state['version'] += 1
+        result = outputs.current
+      else:
+        result = _serialize_result(output)
+    except Exception as e:
+      error = str(e) or type(e).__name__
+    finally:
+      done.set()
+      beat.join()
+    if lost.is_set():
+      return
+    if error is None:
+      try:
+        json.dumps(result)
+      except (TypeError, ValueError) as e:
+        error = 'Result is not JSON serializable: {}'.format(e)
+    payload = {'token': job['token']}
+    if error is not None:
+      payload['error'] = error
+    else:
+      payload['result'] = result
+    for attempt in range(5):
+      try:
+        self._request('/api/jobs/{}/result'.format(job['id']), payload)
+        return
+      except (OSError, ValueError):
+        time.sleep(2 ** attempt * 0.5)
+
+  def _loop(self):
+    backoff = 0.5
+    while not self._stop.is_set():
+      try:
+        self.run_once()
+        backoff = 0.5
+      except PermissionError:
+        self.stop()
+        raise
+      except (OSError, ValueError):
+        # Coordinator unreachable: retry with backoff
+        self._stop.wait(backoff)
+        backoff = min(backoff * 2, 10)
+      except Exception as e:
+        # One bad job must not stop the worker
+        print('jsee worker: {}: {}'.format(type(e).__name__, e), file=sys.stderr)
+        self._stop.wait(backoff)
+
+  def serve_forever(self):
+    """Run `concurrency` claim loops until stop() is called."""
+    threads = [threading.Thread(target=self._loop, daemon=True) for _ in range(self.concurrency)]
+    for t in threads:
+      t.start()
+    try:
+      while any(t.is_alive() for t in threads):
+        for t in threads:
+          t.join(0.5)
+    except KeyboardInterrupt:
+      self.stop()
+
+  def stop(self):
+    """Stop claiming jobs; jobs already running finish first."""
+    self._stop.set()
+
+
+def run_worker(url, target, function=None, **kwargs):
+  """Load a target and pull its jobs from the coordinator at url."""
+  worker = Worker(url, load_funcs(target, function), **kwargs)
+  print('JSEE worker {} → {} ({})'.format(worker.worker_id, worker.url, ', '.join(worker.funcs)))
+  worker.serve_forever()
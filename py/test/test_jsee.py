@@ -2,6 +2,8 @@
 
 import datetime
 import enum
+import hashlib
+import io
 import json
 import os
 import sys
@@ -25,8 +27,18 @@ from jsee.jsee import (
     _return_hint_to_output,
     _serialize_result,
     _to_table_format,
+    create_app,
     serve,
 )
+from jsee.batch import completed_indexes, read_records, run_batch
+from jsee.bench import random_inputs, run_benchmark, summary
+from jsee.jobs import JobQueue, LeaseLost, QueueFull
+from jsee.metrics import Metrics
+from jsee.profiling import Sampler, profile_call
+from jsee.sessions import SessionStore
+from jsee.streaming import Append, Patch, sse_stream
+from jsee.uploads import UploadStore
+from jsee.executor import ProcessRunner, SharedBuffers, SharedRef, pack, unpack
 from jsee.types import (
     Slider, Text, Radio, Select, MultiSelect, Range, Color,
     Markdown, Html, Code, Image, Table, Svg, File,
@@ -1105,3 +1117,1978 @@ class TestServerWithGenerator:
         assert chunks[2] == {'count': 2}
         # Last line is [DONE]
         assert lines[3].strip() == 'data: [DONE]'
+
+
+# ---------------------------------------------------------------------------
+# Resumable chunked uploads
+# ---------------------------------------------------------------------------
+
+class TestUploadStore:
+    def setup_method(self):
+        self.store = UploadStore(tempfile.mkdtemp(), chunk_size=4)
+
+    def _put(self, upload_id, index, data, sha256=None):
+        return self.store.write_part(upload_id, index, io.BytesIO(data), len(data), sha256)
+
+    def test_parts_in_any_order(self):
+        data = b'0123456789'
+        up = self.store.create(len(data), filename='a.bin')
+        assert up['parts'] == 3
+        self._put(up['id'], 2, data[8:])
+        self._put(up['id'], 0, data[:4])
+        assert self.store.status(up['id'])['received'] == [0, 2]
+        self._put(up['id'], 1, data[4:8])
+        done = self.store.complete(up['id'])
+        assert done['complete'] is True
+        assert done['sha256'] == hashlib.sha256(data).hexdigest()
+        with open(self.store.path(up['id']), 'rb') as f:
+            assert f.read() == data
+
+    def test_part_hash_mismatch_not_recorded(self):
+        up = self.store.create(4)
+        with pytest.raises(ValueError):
+            self._put(up['id'], 0, b'abcd', sha256='0' * 64)
+        assert self.store.status(up['id'])['received'] == []
+
+    def test_failed_resend_unmarks_part(self):
+        up = self.store.create(4)
+        self._put(up['id'], 0, b'abcd')
+        with pytest.raises(ValueError):
+            self._put(up['id'], 0, b'wxyz', sha256='0' * 64)
+        assert self.store.status(up['id'])['received'] == []
+        with pytest.raises(ValueError, match='Missing parts'):
+            self.store.complete(up['id'])
+
+    def test_parts_keep_upload_alive(self):
+        self.store.ttl = 60
+        up = self.store.create(8)
+        meta = os.path.join(self.store.root, up['id'], 'meta.json')
+        old = time.time() - 120
+        os.utime(meta, (old, old))
+        self._put(up['id'], 0, b'abcd')
+        self.store.purge()
+        assert self.store.status(up['id'])['received'] == [0]
+
+    def test_max_size(self):
+        store = UploadStore(self.store.root, max_size=8)
+        with pytest.raises(ValueError, match='maximum size'):
+            store.create(9)
+        assert store.create(8)['size'] == 8
+
+    def test_wrong_part_length(self):
+        up = self.store.create(10)
+        with pytest.raises(ValueError):
+            self._put(up['id'], 0, b'abc')
+
+    def test_complete_with_missing_parts(self):
+        up = self.store.create(10)
+        self._put(up['id'], 0, b'0123')
+        with pytest.raises(ValueError, match='Missing parts'):
+            self.store.complete(up['id'])
+
+    def test_whole_file_hash_checked(self):
+        up = self.store.create(4, sha256='0' * 64)
+        self._put(up['id'], 0, b'abcd')
+        with pytest.raises(ValueError, match='mismatch'):
+            self.store.complete(up['id'])
+
+    def test_unknown_or_invalid_id(self):
+        with pytest.raises(KeyError):
+            self.store.status('0' * 32)
+        with pytest.raises(KeyError):
+            self.store.status('../etc')
+
+    def test_resolve_inputs(self):
+        up = self.store.create(4)
+        self._put(up['id'], 0, b'abcd')
+        self.store.complete(up['id'])
+        data = self.store.resolve({'data': {'$upload': up['id']}, 'n': 1})
+        assert data == {'data': b'abcd', 'n': 1}
+        data = self.store.resolve({'data': {'$upload': up['id'], 'as': 'path'}})
+        assert data['data'] == self.store.path(up['id'])
+
+    def test_resolve_incomplete_upload(self):
+        up = self.store.create(4)
+        with pytest.raises(ValueError):
+            self.store.resolve({'data': {'$upload': up['id']}})
+
+
+class TestServerWithUploads:
+    @classmethod
+    def setup_class(cls):
+        def size(data: bytes) -> int:
+            return len(data)
+        cls.port = 15072
+        cls.thread = _start_server(size, cls.port, uploads=tempfile.mkdtemp())
+        cls.base = 'http://localhost:{}'.format(cls.port)
+
+    def _json(self, path, payload=None, method='POST'):
+        data = json.dumps(payload).encode() if payload is not None else None
+        req = Request(self.base + path, data=data, method=method,
+                      headers={'Content-Type': 'application/json'})
+        return json.loads(urlopen(req).read())
+
+    def test_api_advertises_uploads(self):
+        data = json.loads(urlopen(self.base + '/api').read())
+        assert data['uploads'] == '/api/uploads'
+
+    def test_chunked_upload_then_model_call(self):
+        payload = os.urandom(2500)
+        up = self._json('/api/uploads', {
+            'size': len(payload), 'chunk_size': 1000,
+            'sha256': hashlib.sha256(payload).hexdigest(),
+        })
+        assert up['parts'] == 3
+        for i in range(up['parts']):
+            part = payload[i * 1000:(i + 1) * 1000]
+            req = Request(
+                '{}/api/uploads/{}/{}'.format(self.base, up['id'], i),
+                data=part, method='PUT',
+                headers={'X-Content-SHA256': hashlib.sha256(part).hexdigest()},
+            )
+            urlopen(req)
+        status = self._json('/api/uploads/' + up['id'], method='GET')
+        assert status['received'] == [0, 1, 2]
+        done = self._json('/api/uploads/{}/complete'.format(up['id']), {})
+        assert done['complete'] is True
+        result = self._json('/size', {'data': {'$upload': up['id']}})
+        assert result['result'] == 2500
+
+    def test_unknown_upload_in_model_input_400(self):
+        try:
+            self._json('/size', {'data': {'$upload': 'f' * 32}})
+            assert False, 'Should have raised'
+        except HTTPError as e:
+            assert e.code == 400
+
+    def test_unknown_upload_status_404(self):
+        try:
+            self._json('/api/uploads/' + 'f' * 32, method='GET')
+            assert False, 'Should have raised'
+        except HTTPError as e:
+            assert e.code == 404
+
+
+# ---------------------------------------------------------------------------
+# Worker processes with shared-memory handoff
+# ---------------------------------------------------------------------------
+
+def _shm_model(n: int = 1, blob: bytes = None) -> dict:
+    return {'pid': os.getpid(), 'len': len(blob or b''), 'out': b'x' * n}
+
+
+def _die_later():
+    time.sleep(0.5)
+    os._exit(1)
+
+
+class TestSharedMemoryHandoff:
+    def test_pack_unpack_roundtrip(self):
+        segments = []
+        data = {'big': b'a' * 100, 'small': b'b', 'nested': [bytearray(b'c' * 100)]}
+        packed = pack(data, threshold=50, segments=segments)
+        assert isinstance(packed['big'], SharedRef)
+        assert packed['small'] == b'b'
+        assert isinstance(packed['nested'][0], SharedRef)
+        attached = []
+        assert unpack(packed, attached) == data
+        for shm in attached:
+            shm.close()
+        for shm in segments:
+            shm.close()
+            shm.unlink()
+
+    def test_shared_buffers_registry(self):
+        buffers = SharedBuffers()
+        segments = []
+        first = pack(b'z' * 10, threshold=1, segments=segments)
+        pack(b'w' * 10, threshold=1, segments=segments)
+        for shm in segments:
+            buffers.add(shm)
+        assert len(buffers) == 2
+        buffers.release(first.name)
+        assert len(buffers) == 1
+        buffers.close()
+        assert len(buffers) == 0
+
+    def test_process_call_uses_shared_memory(self):
+        runner = ProcessRunner({'m': _shm_model}, 1, threshold=1024)
+        try:
+            result = runner.call('m', {'n': 4096, 'blob': b'y' * 4096})
+            assert result['pid'] != os.getpid()
+            assert result['len'] == 4096
+            assert result['out'] == b'x' * 4096
+            assert len(runner.buffers) == 0
+        finally:
+            runner.shutdown()
+
+    def test_dead_worker_replaces_pool_once(self):
+        runner = ProcessRunner({'die': _die_later, 'm': _shm_model}, 2)
+        starts = []
+        start = runner._start
+        runner._start = lambda: (starts.append(1), start())
+        errors = []
+
+        def call():
+            try:
+                runner.call('die', {})
+            except RuntimeError as e:
+                errors.append(e)
+
+        try:
+            threads = [threading.Thread(target=call) for _ in range(4)]
+            for t in threads:
+                t.start()
+            for t in threads:
+                t.join()
+            assert len(errors) == 4 and len(starts) == 1
+            assert runner.call('m', {})['pid'] != os.getpid()
+        finally:
+            runner.shutdown()
+
+    def test_generator_models_stay_in_process(self):
+        def gen():
+            yield 1
+        runner = ProcessRunner({}, 1)
+        try:
+            assert runner.accepts(_shm_model)
+            assert not runner.accepts(gen)
+        finally:
+            runner.shutdown()
+
+
+# ---------------------------------------------------------------------------
+# Server-side chat sessions
+# ---------------------------------------------------------------------------
+
+class TestSessionStore:
+    def test_append_and_get(self):
+        store = SessionStore()
+        assert store.get('s1') == []
+        store.append('s1', {'role': 'user', 'content': 'hi'})
+        assert store.get('s1') == [{'role': 'user', 'content': 'hi'}]
+
+    def test_message_cap(self):
+        store = SessionStore(max_messages=2)
+        store.append('s1', {'content': 'a'}, {'content': 'b'}, {'content': 'c'})
+        assert store.get('s1') == [{'content': 'b'}, {'content': 'c'}]
+
+    def test_byte_cap(self):
+        store = SessionStore(max_bytes=60)
+        store.append('s1', {'content': 'x' * 30}, {'content': 'y' * 30})
+        assert store.get('s1') == [{'content': 'y' * 30}]
+
+    def test_lru_eviction_without_disk(self):
+        store = SessionStore(max_sessions=1)
+        store.append('a', {'content': '1'})
+        store.append('b', {'content': '2'})
+        assert len(store) == 1
+        assert store.get('a') == []
+
+    def test_eviction_spills_to_disk(self):
+        store = SessionStore(tempfile.mkdtemp(), max_sessions=1)
+        store.append('a', {'content': '1'})
+        store.append('b', {'content': '2'})
+        assert store.get('a') == [{'content': '1'}]
+        assert store.get('b') == [{'content': '2'}]
+
+    def test_ttl_expiry(self):
+        store = SessionStore(ttl=0.01)
+        store.append('a', {'content': '1'})
+        time.sleep(0.02)
+        assert store.get('a') == []
+
+    def test_invalid_id(self):
+        with pytest.raises(ValueError):
+            SessionStore().get('../x')
+
+    def test_expired_files_are_swept(self, tmp_path):
+        old = tmp_path / 'gone.json'
+        old.write_text('[]')
+        os.utime(str(old), (time.time() - 120, time.time() - 120))
+        store = SessionStore(str(tmp_path), max_sessions=1, ttl=60)
+        assert not old.exists()
+        store.append('a', {'content': '1'})
+        store.append('b', {'content': '2'})
+        spilled = tmp_path / 'a.json'
+        os.utime(str(spilled), (time.time() - 120, time.time() - 120))
+        store._swept = 0
+        store.append('c', {'content': '3'})
+        assert not spilled.exists()
+
+    def test_streamed_appends_are_recorded(self):
+        def chat(message: str, history: list = []):
+            yield Append(chat=message)
+            yield Append(chat=' after {}'.format(len(history)))
+
+        app = create_app(chat, chat=True, sessions=True)
+        _post(app, '/chat', {'message': 'a', '_session': 's'})
+        events = _post(app, '/chat', {'message': 'b', '_session': 's'})[2]
+        # The first reply was recorded along with the first message
+        assert b'after 2' in events
+
+
+class TestServerWithChatSessions:
+    @classmethod
+    def setup_class(cls):
+        def chat(message: str, history: list = []) -> str:
+            return '{} after {}'.format(message, len(history))
+        cls.port = 15073
+        cls.thread = _start_server(chat, cls.port, chat=True, sessions=True)
+        cls.base = 'http://localhost:{}'.format(cls.port)
+
+    def _post(self, payload, headers=None):
+        h = {'Content-Type': 'application/json'}
+        h.update(headers or {})
+        req = Request(self.base + '/chat', data=json.dumps(payload).encode(), headers=h)
+        return json.loads(urlopen(req).read())
+
+    def test_model_flagged_for_sessions(self):
+        data = json.loads(urlopen(self.base + '/api').read())
+        assert data['schema']['model']['session'] is True
+
+    def test_history_kept_server_side(self):
+        assert self._post({'message': 'a', '_session': 'conv1'}) == {'chat': 'a after 0'}
+        assert self._post({'message': 'b', '_session': 'conv1'}) == {'chat': 'b after 2'}
+        assert self._post({'message': 'c'}, {'X-JSEE-Session': 'conv1'}) == {'chat': 'c after 4'}
+
+    def test_client_history_resyncs_session(self):
+        history = [{'role': 'user', 'content': 'x'}]
+        assert self._post({'message': 'a', 'history': history, '_session': 'conv2'}) == {'chat': 'a after 1'}
+        assert self._post({'message': 'b', '_session': 'conv2'}) == {'chat': 'b after 3'}
+
+    def test_without_session_history_is_stateless(self):
+        assert self._post({'message': 'a', 'history': []}) == {'chat': 'a after 0'}
+
+
+# ---------------------------------------------------------------------------
+# SSE deltas and coalescing
+# ---------------------------------------------------------------------------
+
+def _sse_payloads(frames):
+    out = []
+    for frame in frames:
+        text = frame.decode('utf-8')
+        if text.startswith('data:') and '[DONE]' not in text:
+            out.append(json.loads(text[5:].strip()))
+    return out
+
+
+def _cumulative(n=5):
+    text = ''
+    for i in range(n):
+        text += str(i)
+        yield {'chat': text, 'step': i}
+
+
+class TestSSEStream:
+    def test_default_one_frame_per_chunk(self):
+        frames = list(sse_stream(_cumulative(3), _serialize_result))
+        assert frames[-1] == b'data: [DONE]\n\n'
+        assert _sse_payloads(frames) == [
+            {'chat': '0', 'step': 0}, {'chat': '01', 'step': 1}, {'chat': '012', 'step': 2}]
+
+    def test_delta_frames_append_strings(self):
+        payloads = _sse_payloads(sse_stream(_cumulative(3), _serialize_result, delta=True))
+        assert payloads == [
+            {'chat': '0', 'step': 0},
+            {'step': 1, '_append': {'chat': '1'}},
+            {'step': 2, '_append': {'chat': '2'}},
+        ]
+
+    def test_delta_resends_non_prefix_strings(self):
+        def gen():
+            yield {'t': 'abc'}
+            yield {'t': 'xyz'}
+        payloads = _sse_payloads(sse_stream(gen(), _serialize_result, delta=True))
+        assert payloads == [{'t': 'abc'}, {'t': 'xyz'}]
+
+    def test_delta_sees_in_place_edits(self):
+        def gen():
+            rows = [[0]]
+            out = {'data': {'columns': ['n'], 'rows': rows}}
+            for i in range(1, 3):
+                yield out
+                rows.append([i])
+            yield out
+        payloads = _sse_payloads(sse_stream(gen(), _serialize_result, delta=True))
+        assert payloads == [
+            {'data': {'columns': ['n'], 'rows': [[0]]}},
+            {'_append': {'data': [[1]]}},
+            {'_append': {'data': [[2]]}},
+        ]
+
+    def test_coalescing_keeps_final_state(self):
+        def gen():
+            for i in range(200):
+                yield {'chat': 'x' * (i + 1)}
+        frames = list(sse_stream(gen(), _serialize_result, delta=True, interval=0.05))
+        payloads = _sse_payloads(frames)
+        assert len(payloads) < 200
+        text = ''
+        for p in payloads:
+            text = p.get('chat', text) + p.get('_append', {}).get('chat', '')
+        assert text == 'x' * 200
+
+    def test_heartbeat_on_idle_stream(self):
+        def slow():
+            time.sleep(0.15)
+            yield {'a': 1}
+        frames = list(sse_stream(slow(), _serialize_result, heartbeat=0.05))
+        assert b': keepalive\n\n' in frames
+        assert _sse_payloads(frames) == [{'a': 1}]
+
+    def test_error_frame(self):
+        def broken():
+            yield {'a': 1}
+            raise RuntimeError('boom')
+        for kw in ({}, {'interval': 0.01}):
+            payloads = _sse_payloads(sse_stream(broken(), _serialize_result, **kw))
+            assert payloads[-1] == {'error': 'boom'}
+
+    def test_close_stops_producer(self):
+        stopped = threading.Event()
+        def endless():
+            try:
+                while True:
+                    yield {'a': 1}
+                    time.sleep(0.001)
+            finally:
+                stopped.set()
+        stream = sse_stream(endless(), _serialize_result, interval=0.01)
+        next(stream)
+        stream.close()
+        assert stopped.wait(2)
+
+
+class TestServerWithDeltaStream:
+    @classmethod
+    def setup_class(cls):
+        def typing_model(n: int = 4):
+            text = ''
+            for i in range(n):
+                text += 'ab'
+                yield {'chat': text}
+        cls.port = 15074
+        cls.thread = _start_server(typing_model, cls.port, stream=True, sse_interval=0.01)
+        cls.base = 'http://localhost:{}'.format(cls.port)
+
+    def test_delta_requested_by_header(self):
+        req = Request(
+            self.base + '/typing_model',
+            data=json.dumps({'n': 4}).encode(),
+            headers={'Content-Type': 'application/json', 'X-JSEE-Stream': 'delta'}
+        )
+        body = urlopen(req).read().decode('utf-8')
+        assert body.endswith('data: [DONE]\n\n')
+        text = ''
+        for line in body.split('\n'):
+            if line.startswith('data: {'):
+                p = json.loads(line[5:])
+                text = p.get('chat', text) + p.get('_append', {}).get('chat', '')
+        assert text == 'ab' * 4
+
+
+# ---------------------------------------------------------------------------
+# Partial-output patch streaming
+# ---------------------------------------------------------------------------
+
+def _progressive_report():
+    yield {'data': [{'i': 0}], 'summary': 'running', 'log': ''}
+    for i in range(1, 3):
+        yield Append(data=[{'i': i}], log='step {}\n'.format(i))
+    yield Patch([{'op': 'replace', 'path': '/summary', 'value': 'done'}])
+
+
+class TestPatchStreaming:
+    def test_append_and_patch_frames(self):
+        payloads = _sse_payloads(sse_stream(_progressive_report(), _serialize_result))
+        assert payloads[0] == {
+            'data': {'columns': ['i'], 'rows': [[0]]}, 'summary': 'running', 'log': ''}
+        assert payloads[1] == {'_append': {'data': [[1]], 'log': 'step 1\n'}}
+        assert payloads[3] == {'_patch': [{'op': 'replace', 'path': '/summary', 'value': 'done'}]}
+
+    def test_coalesced_appends_are_merged(self):
+        def gen():
+            yield {'rows': [1]}
+            time.sleep(0.05)
+            for i in range(2, 6):
+                yield Append(rows=[i])
+        payloads = _sse_payloads(sse_stream(gen(), _serialize_result, interval=10))
+        assert payloads == [{'rows': [1]}, {'_append': {'rows': [2, 3, 4, 5]}}]
+
+    def test_delta_skips_unchanged_and_appends_table_rows(self):
+        def gen():
+            rows = []
+            for i in range(3):
+                rows.append({'i': i})
+                yield {'data': rows, 'title': 'Report'}
+        payloads = _sse_payloads(sse_stream(gen(), _serialize_result, delta=True))
+        assert payloads == [
+            {'data': {'columns': ['i'], 'rows': [[0]]}, 'title': 'Report'},
+            {'_append': {'data': [[1]]}},
+            {'_append': {'data': [[2]]}},
+        ]
+
+    def test_patch_validates_ops(self):
+        with pytest.raises(ValueError):
+            Patch([{'op': 'move', 'path': '/a'}])
+        with pytest.raises(ValueError):
+            Patch([{'op': 'add', 'path': 'a', 'value': 1}])
+
+    def test_append_to_text_requires_string(self):
+        def gen():
+            yield {'log': 'a'}
+            yield Append(log=[1])
+        payloads = _sse_payloads(sse_stream(gen(), _serialize_result))
+        assert 'error' in payloads[-1]
+
+
+# ---------------------------------------------------------------------------
+# Background jobs
+# ---------------------------------------------------------------------------
+
+def _wait_job(queue, job_id, timeout=5):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        job = queue.get(job_id)
+        if job['status'] in ('done', 'error', 'cancelled'):
+            return job
+        time.sleep(0.02)
+    raise AssertionError('Job did not finish')
+
+
+def _job_run(model, inputs):
+    if model == 'fail':
+        raise ValueError('boom')
+    if model == 'steps':
+        return ({'step': i} for i in range(inputs['n']))
+    return {'result': inputs['x'] * 2}
+
+
+class TestJobQueue:
+    def test_submit_and_result(self):
+        q = JobQueue(workers=1)
+        q.start(_job_run, _serialize_result)
+        job = q.submit('double', {'x': 4})
+        assert job['status'] == 'queued'
+        done = _wait_job(q, job['id'])
+        assert done['status'] == 'done'
+        assert done['result'] == {'result': 8}
+
+    def test_error_and_generator_progress(self):
+        q = JobQueue(workers=1)
+        q.start(_job_run, _serialize_result)
+        assert _wait_job(q, q.submit('fail', {})['id'])['error'] == 'boom'
+        assert _wait_job(q, q.submit('steps', {'n': 3})['id'])['result'] == {'step': 2}
+
+    def test_queue_full_and_unknown_job(self):
+        q = JobQueue(max_jobs=1)
+        q.submit('double', {'x': 1})
+        with pytest.raises(QueueFull):
+            q.submit('double', {'x': 2})
+        with pytest.raises(KeyError):
+            q.get('missing')
+
+    def test_cancel_queued_job(self):
+        q = JobQueue()
+        job = q.submit('double', {'x': 1})
+        assert q.cancel(job['id'])['status'] == 'cancelled'
+        assert q.cancel(job['id'])['status'] == 'deleted'
+        assert len(q) == 0
+
+    def test_events_end_with_result(self):
+        q = JobQueue(workers=1)
+        q.start(_job_run, _serialize_result)
+        job = q.submit('double', {'x': 2})
+        frames = b''.join(q.events(job['id'])).decode()
+        assert 'event: result\ndata: {"result": 4}' in frames
+        assert frames.endswith('data: [DONE]\n\n')
+
+    def test_sqlite_queue_survives_restart(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            db = os.path.join(tmp, 'jobs.db')
+            q = JobQueue(db)
+            pending = q.submit('double', {'x': 5})
+            with pytest.raises(ValueError):
+                q.submit('double', {'x': b'raw'})
+            q2 = JobQueue(db, workers=1)
+            q2.start(_job_run, _serialize_result)
+            assert _wait_job(q2, pending['id'])['result'] == {'result': 10}
+            q3 = JobQueue(db)
+            assert q3.get(pending['id'])['result'] == {'result': 10}
+
+    def test_remote_only_queue_is_not_buffered(self):
+        q = JobQueue(workers=0)
+        q.start(_job_run, _serialize_result)
+        job = q.submit('double', {'x': 1})
+        assert q._queue.qsize() == 0
+        assert q.claim()['id'] == job['id']
+
+
+class TestServerWithJobs:
+    @classmethod
+    def setup_class(cls):
+        def slow(x: int = 1):
+            for i in range(x):
+                time.sleep(0.01)
+                yield {'step': i}
+        cls.port = 15075
+        cls.thread = _start_server(slow, cls.port, jobs=True)
+        cls.base = 'http://localhost:{}'.format(cls.port)
+
+    def _submit(self, payload, path='/slow/jobs', headers=None):
+        h = {'Content-Type': 'application/json'}
+        h.update(headers or {})
+        req = Request(self.base + path, data=json.dumps(payload).encode(), headers=h)
+        return urlopen(req)
+
+    def test_submit_and_poll(self):
+        resp = self._submit({'x': 3})
+        assert resp.status == 202
+        job = json.loads(resp.read())
+        assert resp.headers['Location'] == '/api/jobs/' + job['id']
+        for _ in range(100):
+            job = json.loads(urlopen(self.base + '/api/jobs/' + job['id']).read())
+            if job['status'] == 'done':
+                break
+            time.sleep(0.02)
+        assert job['result'] == {'step': 2}
+
+    def test_prefer_respond_async(self):
+        resp = self._submit({'x': 1}, path='/slow', headers={'Prefer': 'respond-async'})
+        assert resp.status == 202
+
+    def test_events_stream(self):
+        job = json.loads(self._submit({'x': 2}).read())
+        body = urlopen(self.base + '/api/jobs/{}/events'.format(job['id'])).read().decode()
+        assert 'event: status' in body
+        assert 'event: result' in body
+
+    def test_unknown_job_404(self):
+        with pytest.raises(HTTPError) as e:
+            urlopen(self.base + '/api/jobs/nope')
+        assert e.value.code == 404
+
+    def test_jobs_are_not_listed(self):
+        self._submit({'x': 1})
+        with pytest.raises(HTTPError) as e:
+            urlopen(self.base + '/api/jobs')
+        assert e.value.code == 405
+
+    def test_discovery_and_openapi(self):
+        api = json.loads(urlopen(self.base + '/api').read())
+        assert api['jobs'] == '/api/jobs'
+        spec = json.loads(urlopen(self.base + '/api/openapi.json').read())
+        assert '/slow/jobs' in spec['paths']
+        assert '/api/jobs/{id}/events' in spec['paths']
+
+
+class TestJobLeases:
+    def test_claim_heartbeat_complete(self):
+        q = JobQueue(workers=0)
+        job = q.submit('double', {'x': 1})
+        claimed = q.claim(['double'], worker='w1')
+        assert claimed['id'] == job['id'] and claimed['inputs'] == {'x': 1}
+        assert q.claim(['double']) is None
+        q.heartbeat(job['id'], claimed['token'], progress={'step': 1})
+        assert q.get(job['id'])['progress'] == {'step': 1}
+        assert q.get(job['id'])['worker'] == 'w1'
+        q.complete(job['id'], claimed['token'], result={'result': 2})
+        assert q.get(job['id'])['result'] == {'result': 2}
+
+    def test_claim_filters_models(self):
+        q = JobQueue(workers=0)
+        q.submit('other', {})
+        assert q.claim(['double']) is None
+
+    def test_expired_lease_is_retried_then_fails(self):
+        q = JobQueue(workers=0, lease=0.05, max_attempts=2)
+        job = q.submit('double', {'x': 1})
+        first = q.claim()
+        time.sleep(0.1)
+        second = q.claim()
+        assert second['id'] == job['id'] and second['token'] != first['token']
+        with pytest.raises(LeaseLost):
+            q.heartbeat(job['id'], first['token'])
+        time.sleep(0.1)
+        failed = q.get(job['id'])
+        assert failed['status'] == 'error' and 'Worker lost' in failed['error']
+
+    def test_cancel_reaches_worker_heartbeat(self):
+        q = JobQueue(workers=0)
+        job = q.submit('double', {'x': 1})
+        claimed = q.claim()
+        q.cancel(job['id'])
+        with pytest.raises(LeaseLost):
+            q.heartbeat(job['id'], claimed['token'])
+        q.complete(job['id'], claimed['token'], result={'result': 2})
+        assert q.get(job['id'])['status'] == 'cancelled'
+
+
+class TestWorker:
+    def _worker(self, funcs):
+        from jsee.worker import Worker
+        worker = Worker('http://localhost:1', funcs)
+        worker.sent = []
+        worker._request = lambda path, payload, timeout=None: worker.sent.append((path, payload)) or (200, None)
+        return worker
+
+    def test_unserializable_result_is_reported(self):
+        from decimal import Decimal
+        worker = self._worker({'m': lambda: Decimal('1.5')})
+        worker._run({'id': 'j', 'token': 't', 'model': 'm', 'inputs': {}, 'lease': 30})
+        path, payload = worker.sent[-1]
+        assert path == '/api/jobs/j/result' and 'not JSON serializable' in payload['error']
+
+    def test_loop_survives_unexpected_errors(self):
+        worker = self._worker({})
+        calls = []
+
+        def run_once():
+            calls.append(1)
+            if len(calls) == 1:
+                raise TypeError('bad job')
+            worker.stop()
+
+        worker.run_once = run_once
+        worker._loop()
+        assert len(calls) == 2
+
+
+class TestRemoteWorkers:
+    """Coordinator in a thread, two `jsee worker` processes."""
+
+    @classmethod
+    def setup_class(cls):
+        cls.tmpdir = tempfile.mkdtemp()
+        with open(os.path.join(cls.tmpdir, 'calc.py'), 'w') as f:
+            f.write('import os\n'
+                    'def calc(a: int = 1):\n'
+                    '    return {"result": a * 10, "pid": os.getpid()}\n')
+        schema = {
+            'model': {'name': 'calc', 'url': 'calc.py', 'type': 'function'},
+            'inputs': [{'name': 'a', 'type': 'int', 'default': 1}],
+        }
+        cls.schema_path = os.path.join(cls.tmpdir, 'schema.json')
+        with open(cls.schema_path, 'w') as f:
+            json.dump(schema, f)
+        cls.port = 15076
+        cls.base = 'http://localhost:{}'.format(cls.port)
+        cls.thread = _start_server(cls.schema_path, cls.port, coordinator=True,
+                                   worker_token='s3cret')
+        cli_path = os.path.join(PY_ROOT, 'bin', 'jsee')
+        cls.workers = [subprocess.Popen(
+            [sys.executable, cli_path, 'worker', cls.base, cls.schema_path, '--token', 's3cret'],
+            stdout=subprocess.PIPE, stderr=subprocess.PIPE, env=_cli_env(),
+        ) for _ in range(2)]
+
+    @classmethod
+    def teardown_class(cls):
+        for proc in cls.workers:
+            proc.terminate()
+            proc.wait()
+
+    def test_workers_run_jobs(self):
+        ids = []
+        for a in range(6):
+            req = Request(self.base + '/calc/jobs', data=json.dumps({'a': a}).encode(),
+                          headers={'Content-Type': 'application/json'})
+            ids.append(json.loads(urlopen(req).read())['id'])
+        results = []
+        for job_id in ids:
+            for _ in range(200):
+                job = json.loads(urlopen(self.base + '/api/jobs/' + job_id).read())
+                if job['status'] == 'done':
+                    break
+                time.sleep(0.05)
+            assert job['status'] == 'done'
+            results.append(job['result'])
+        assert [r['result'] for r in results] == [a * 10 for a in range(6)]
+        assert os.getpid() not in {r['pid'] for r in results}
+
+    def test_claim_requires_token(self):
+        req = Request(self.base + '/api/jobs/claim', data=b'{}',
+                      headers={'Content-Type': 'application/json'})
+        with pytest.raises(HTTPError) as e:
+            urlopen(req)
+        assert e.value.code == 403
+
+    def test_worker_routes_only_for_coordinators(self):
+        with pytest.raises(ValueError, match='worker_token'):
+            create_app(self.schema_path, coordinator=True)
+        app = create_app(self.schema_path, jobs=True, job_workers=0, worker_token='s3cret')
+        status, _, _ = _post(app, '/api/jobs/claim', {}, x_jsee_worker_token='s3cret')
+        assert status.startswith('405')
+
+
+# ---------------------------------------------------------------------------
+# Metrics
+# ---------------------------------------------------------------------------
+
+class TestMetrics:
+    def test_counters_merge_across_threads(self):
+        m = Metrics()
+        threads = [threading.Thread(target=lambda: [m.add('hits', (('model', 'a'),)) for _ in range(100)])
+                   for _ in range(4)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        m.add('hits', (('model', 'a'),))
+        assert m.value('hits', (('model', 'a'),)) == 401
+        # Shards of finished threads are folded into the base shard
+        assert len(m._shards) == 1
+
+    def test_finished_thread_shards_folded_without_scrape(self):
+        m = Metrics()
+        for _ in range(50):
+            t = threading.Thread(target=m.add, args=('hits',))
+            t.start()
+            t.join()
+        # Each new thread folds the shards of finished ones
+        assert len(m._shards) == 1
+        assert m.value('hits') == 50
+
+    def test_histogram_render(self):
+        m = Metrics(buckets=(0.1, 1))
+        m.describe('latency', 'histogram', 'Latency')
+        m.observe('latency', (('model', 'a'),), 0.05)
+        m.observe('latency', (('model', 'a'),), 0.5)
+        m.observe('latency', (('model', 'a'),), 5)
+        text = m.render()
+        assert '# TYPE latency histogram' in text
+        assert 'latency_bucket{model="a",le="0.1"} 1' in text
+        assert 'latency_bucket{model="a",le="1"} 2' in text
+        assert 'latency_bucket{model="a",le="+Inf"} 3' in text
+        assert 'latency_count{model="a"} 3' in text
+
+    def test_collector_and_label_escaping(self):
+        m = Metrics()
+        m.collector(lambda: [('depth', (('q', 'a"b'),), 7)])
+        assert 'depth{q="a\\"b"} 7' in m.render()
+
+
+class TestServerWithMetrics:
+    @classmethod
+    def setup_class(cls):
+        cls.port = 15077
+        cls.thread = _start_server(add, cls.port, metrics=True, jobs=True)
+        cls.base = 'http://localhost:{}'.format(cls.port)
+
+    def test_model_requests_are_counted(self):
+        req = Request(self.base + '/add', data=json.dumps({'x': 1, 'y': 2}).encode(),
+                      headers={'Content-Type': 'application/json'})
+        urlopen(req).read()
+        text = urlopen(self.base + '/metrics').read().decode()
+        assert 'jsee_requests_total{model="add",status="200"} 1' in text
+        for phase in ('parse', 'execute', 'serialize', 'write'):
+            assert 'jsee_request_phase_seconds_count{{model="add",phase="{}"}} 1'.format(phase) in text
+        assert 'jsee_request_bytes_total{model="add"} 16' in text
+        assert 'jsee_jobs{status="queued"} 0' in text
+        # The scrape itself is in flight
+        assert 'jsee_requests_in_flight 1' in text
+
+    def test_wsgi_records_metrics(self):
+        app = create_app(add, metrics=True)
+        body = json.dumps({'x': 2, 'y': 3}).encode()
+        environ = {
+            'REQUEST_METHOD': 'POST', 'PATH_INFO': '/add', 'CONTENT_TYPE': 'application/json',
+            'CONTENT_LENGTH': str(len(body)), 'wsgi.input': io.BytesIO(body),
+        }
+        out = app(environ, lambda status, headers: None)
+        assert json.loads(b''.join(out)) == {'result': 5}
+        out.close()
+        metrics = app.__self__.metrics
+        assert metrics.value('jsee_requests_total', (('model', 'add'), ('status', '200'))) == 1
+        assert metrics.value('jsee_requests_in_flight') == 0
+
+
+class TestServerTiming:
+    @classmethod
+    def setup_class(cls):
+        cls.app = create_app(add)
+
+    def _post(self, payload):
+        body = json.dumps(payload).encode()
+        environ = {
+            'REQUEST_METHOD': 'POST', 'PATH_INFO': '/add', 'CONTENT_TYPE': 'application/json',
+            'CONTENT_LENGTH': str(len(body)), 'wsgi.input': io.BytesIO(body),
+        }
+        captured = {}
+        def start_response(status, headers):
+            captured['headers'] = dict(headers)
+        out = b''.join(self.app(environ, start_response))
+        return json.loads(out), captured['headers']
+
+    def test_server_timing_header(self):
+        data, headers = self._post({'x': 1})
+        assert data == {'result': 2}
+        phases = [p.split(';')[0] for p in headers['Server-Timing'].split(', ')]
+        assert phases == ['parse', 'execute', 'serialize']
+        exposed = headers['Access-Control-Expose-Headers'].split(', ')
+        assert {'Server-Timing', 'X-JSEE-Cache', 'ETag', 'Idempotent-Replayed', 'X-JSEE-Pipeline'} <= set(exposed)
+
+    def test_timing_field_on_request(self):
+        data, _ = self._post({'x': 1, '_timing': True})
+        assert data['result'] == 2
+        assert set(data['_timing']) == {'parse', 'execute', 'serialize'}
+        assert all(v >= 0 for v in data['_timing'].values())
+
+
+# ---------------------------------------------------------------------------
+# Profiling
+# ---------------------------------------------------------------------------
+
+def _busy(ms: int = 50):
+    deadline = time.time() + ms / 1000.0
+    n = 0
+    while time.time() < deadline:
+        n += 1
+    return {'n': n}
+
+
+class TestProfiling:
+    def test_profile_call_pstats(self):
+        result, report = profile_call(_busy, {'ms': 10})
+        assert result['n'] > 0
+        assert '_busy' in report and 'cumulative' in report
+
+    def test_profile_call_collapsed(self):
+        _, report = profile_call(_busy, {'ms': 50}, 'collapsed')
+        stack, count = report.splitlines()[0].rsplit(' ', 1)
+        assert '_busy (test_jsee.py' in stack and int(count) > 0
+
+    def test_unknown_format(self):
+        with pytest.raises(ValueError):
+            profile_call(_busy, {}, 'svg')
+
+    def test_sampler_filters_threads(self):
+        t = threading.Thread(target=_busy, kwargs={'ms': 200})
+        t.start()
+        report = Sampler(0.002, threads=lambda: [t.ident]).run_for(0.1)
+        t.join()
+        assert report and all('_busy' in line for line in report.splitlines())
+
+
+class TestServerWithProfiling:
+    @classmethod
+    def setup_class(cls):
+        cls.port = 15078
+        cls.thread = _start_server(_busy, cls.port, profiling=True)
+        cls.base = 'http://localhost:{}'.format(cls.port)
+
+    def _post(self, payload):
+        req = Request(self.base + '/_busy', data=json.dumps(payload).encode(),
+                      headers={'Content-Type': 'application/json'})
+        return json.loads(urlopen(req).read())
+
+    def test_request_profile(self):
+        data = self._post({'ms': 10, '_profile': 'pstats'})
+        assert data['n'] > 0 and '_busy' in data['_profile']
+
+    def test_sampling_window_sees_running_request(self):
+        t = threading.Thread(target=self._post, args=({'ms': 400},))
+        t.start()
+        time.sleep(0.05)
+        report = urlopen(self.base + '/api/profile?seconds=0.2&interval=0.002').read().decode()
+        t.join()
+        assert '_busy (test_jsee.py' in report
+        assert '_sample' not in report
+
+    def test_profile_rejected_when_disabled(self):
+        app = create_app(_busy)
+        body = json.dumps({'_profile': 'pstats'}).encode()
+        environ = {
+            'REQUEST_METHOD': 'POST', 'PATH_INFO': '/_busy', 'CONTENT_TYPE': 'application/json',
+            'CONTENT_LENGTH': str(len(body)), 'wsgi.input': io.BytesIO(body),
+        }
+        statuses = []
+        app(environ, lambda status, headers: statuses.append(status))
+        assert statuses == ['400 Bad Request']
+
+
+# ---------------------------------------------------------------------------
+# jsee bench
+# ---------------------------------------------------------------------------
+
+class Shape(enum.Enum):
+    CIRCLE = 'circle'
+    SQUARE = 'square'
+
+
+def _bench_model(
+    n: Annotated[int, Slider(0, 10, 2)] = 4,
+    t: Annotated[float, Slider(0.5, 1.5, 0.25)] = 1.0,
+    mode: Literal['a', 'b'] = 'a',
+    shape: Shape = Shape.CIRCLE,
+    window: Annotated[list, Range(0, 100, 10)] = None,
+    tags: Annotated[list, MultiSelect(['x', 'y', 'z'])] = None,
+    flag: bool = False,
+    name: str = 'two words',
+) -> dict:
+    return {'n': n, 'mode': mode}
+
+
+class TestBench:
+    def test_random_inputs_follow_schema(self):
+        import random
+        inputs = generate_schema(_bench_model)['inputs']
+        rng = random.Random(0)
+        for _ in range(200):
+            data = random_inputs(inputs, rng)
+            assert data['n'] in (0, 2, 4, 6, 8, 10)
+            assert data['t'] in (0.5, 0.75, 1.0, 1.25, 1.5)
+            assert data['mode'] in ('a', 'b')
+            assert data['shape'] in ('circle', 'square')
+            lo, hi = data['window']
+            assert 0 <= lo <= hi <= 100 and lo % 10 == 0
+            assert set(data['tags']) <= {'x', 'y', 'z'}
+            assert isinstance(data['flag'], bool)
+            assert len(data['name'].split()) == 2
+
+    def test_fixed_inputs_and_seed(self):
+        inputs = generate_schema(_bench_model)['inputs']
+        import random
+        a = random_inputs(inputs, random.Random(3), fixed={'mode': 'b'})
+        b = random_inputs(inputs, random.Random(3), fixed={'mode': 'b'})
+        assert a == b and a['mode'] == 'b'
+
+    def test_run_benchmark_summary(self):
+        stats = summary(run_benchmark(_bench_model, generate_schema(_bench_model),
+                                      iterations=20, workers=2, seed=1))
+        assert stats['ok'] == 20 and stats['errors'] == 0
+        assert stats['latency_ms']['p50'] <= stats['latency_ms']['max']
+        assert stats['output_bytes']['max'] > 0
+        assert stats['peak_memory_bytes'] is not None
+
+    def test_errors_are_counted(self):
+        def broken(x: int = 1):
+            raise RuntimeError('nope')
+        stats = summary(run_benchmark(broken, generate_schema(broken), iterations=5))
+        assert stats['ok'] == 0 and stats['errors'] == 5
+        assert 'nope' in stats['first_error']
+
+
+def _batch_model(x: int, y: int = 1):
+    if x < 0:
+        raise ValueError('negative')
+    time.sleep(0.001 * (x % 3))
+    return {'sum': x + y}
+
+
+class TestBatch:
+    def test_read_records_csv_and_jsonl(self, tmp_path):
+        csv_path = tmp_path / 'in.csv'
+        csv_path.write_text('x,y,tags\n1,2.5,"[1, 2]"\n3,,hello\n')
+        assert list(read_records(str(csv_path))) == [
+            {'x': 1, 'y': 2.5, 'tags': [1, 2]}, {'x': 3, 'tags': 'hello'}]
+        jsonl_path = tmp_path / 'in.jsonl'
+        jsonl_path.write_text('{"x": "1"}\n\n{"x": 2}\n')
+        assert list(read_records(str(jsonl_path))) == [{'x': '1'}, {'x': 2}]
+
+    def test_ordered_results_and_errors(self):
+        records = [{'x': i} for i in range(20)] + [{'x': -1}]
+        out = io.StringIO()
+        stats = run_batch(_batch_model, iter(records), out, workers=4, window=3)
+        lines = [json.loads(l) for l in out.getvalue().splitlines()]
+        assert [l['index'] for l in lines] == list(range(21))
+        assert lines[5] == {'index': 5, 'result': {'sum': 6}}
+        assert lines[20]['error'] == 'ValueError: negative'
+        assert stats['done'] == 21 and stats['errors'] == 1
+
+    def test_unordered_writes_every_index(self):
+        out = io.StringIO()
+        run_batch(_batch_model, ({'x': i} for i in range(30)), out, workers=4, ordered=False)
+        indexes = sorted(json.loads(l)['index'] for l in out.getvalue().splitlines())
+        assert indexes == list(range(30))
+
+    def test_resume_skips_done_and_truncates_partial(self, tmp_path):
+        path = tmp_path / 'out.jsonl'
+        path.write_text('{"index": 0, "result": {"sum": 2}}\n{"index": 2, "result": {"sum": 4}}\n{"ind')
+        done = completed_indexes(str(path))
+        assert done == {0, 2}
+        with open(path, 'a') as f:
+            stats = run_batch(_batch_model, ({'x': i} for i in range(4)), f, workers=2, skip=done)
+        assert stats['skipped'] == 2 and stats['done'] == 2
+        assert sorted(json.loads(l)['index'] for l in path.read_text().splitlines()) == [0, 1, 2, 3]
+
+    def test_cli_batch(self, tmp_path):
+        model = tmp_path / 'model.py'
+        model.write_text('def add(x: int, y: int = 1):\n    return x + y\n')
+        (tmp_path / 'in.csv').write_text('x\n1\n2\n')
+        result = subprocess.run(
+            [sys.executable, os.path.join(PY_ROOT, 'bin', 'jsee'), str(model), 'add',
+             '--batch', str(tmp_path / 'in.csv'), '--out', str(tmp_path / 'out.jsonl'), '--y=10'],
+            capture_output=True, text=True, env=_cli_env(), timeout=30)
+        assert result.returncode == 0, result.stderr
+        assert '2 done, 0 errors' in result.stderr
+        lines = [json.loads(l) for l in (tmp_path / 'out.jsonl').read_text().splitlines()]
+        assert [l['result'] for l in lines] == [{'result': 11}, {'result': 12}]
+
+    def test_cli_batch_bad_lines_fail_alone(self, tmp_path):
+        model = tmp_path / 'model.py'
+        model.write_text('def add(x: int, y: int = 1):\n    return x + y\n')
+        (tmp_path / 'in.jsonl').write_text('{"x": 1}\n{"x": 3\n[4]\n{"x": 2}\n')
+        result = subprocess.run(
+            [sys.executable, os.path.join(PY_ROOT, 'bin', 'jsee'), str(model), 'add',
+             '--batch', str(tmp_path / 'in.jsonl'), '--out', str(tmp_path / 'out.jsonl')],
+            capture_output=True, text=True, env=_cli_env(), timeout=30)
+        assert result.returncode == 0, result.stderr
+        assert '4 done, 2 errors' in result.stderr
+        lines = [json.loads(l) for l in (tmp_path / 'out.jsonl').read_text().splitlines()]
+        assert [l['index'] for l in lines] == [0, 1, 2, 3]
+        assert lines[0]['result'] == {'result': 2}
+        assert lines[1]['error'].startswith('ValueError: Invalid JSON')
+        assert 'must be JSON objects' in lines[2]['error']
+        assert lines[3]['result'] == {'result': 3}
+
+
+class TestServerWithBatch:
+    @classmethod
+    def setup_class(cls):
+        cls.port = 15079
+        cls.thread = _start_server(_batch_model, cls.port, batch_workers=4)
+        cls.base = 'http://localhost:{}'.format(cls.port)
+
+    def _post(self, body, content_type='application/json'):
+        req = Request(self.base + '/_batch_model/batch', data=body,
+                      headers={'Content-Type': content_type})
+        resp = urlopen(req)
+        assert resp.headers['Content-Type'].startswith('application/x-ndjson')
+        return [json.loads(l) for l in resp.read().decode().splitlines()]
+
+    def test_array_results_in_order_with_item_errors(self):
+        items = [{'x': i} for i in range(12)] + [{'x': -1}, 'oops', {'x': 1, 'y': 5}]
+        lines = self._post(json.dumps(items).encode())
+        assert [l['index'] for l in lines] == list(range(15))
+        assert lines[4] == {'index': 4, 'result': {'sum': 5}}
+        assert lines[12]['error'] == 'ValueError: negative'
+        assert 'Expected a JSON object' in lines[13]['error']
+        assert lines[14]['result'] == {'sum': 6}
+
+    def test_ndjson_body(self):
+        body = b'{"x": 1}\n\n{bad json\n{"x": 2, "y": 2}'
+        lines = self._post(body, 'application/x-ndjson')
+        assert [l['index'] for l in lines] == [0, 1, 2]
+        assert lines[0]['result'] == {'sum': 2}
+        assert lines[1]['error'].startswith('ValueError: Invalid JSON')
+        assert lines[2]['result'] == {'sum': 4}
+
+    def test_non_array_is_rejected(self):
+        req = Request(self.base + '/_batch_model/batch', data=b'{"x": 1}',
+                      headers={'Content-Type': 'application/json'})
+        with pytest.raises(HTTPError) as exc:
+            urlopen(req)
+        assert exc.value.code == 400
+
+    def test_openapi_documents_batch(self):
+        spec = json.loads(urlopen(self.base + '/api/openapi.json').read())
+        op = spec['paths']['/_batch_model/batch']['post']
+        assert 'application/x-ndjson' in op['requestBody']['content']
+        assert 'application/x-ndjson' in op['responses']['200']['content']
+
+    def test_wsgi_batch(self):
+        app = create_app(_batch_model)
+        body = json.dumps([{'x': 3}, {'x': -2}]).encode()
+        environ = {
+            'REQUEST_METHOD': 'POST', 'PATH_INFO': '/_batch_model/batch',
+            'CONTENT_TYPE': 'application/json', 'CONTENT_LENGTH': str(len(body)),
+            'wsgi.input': io.BytesIO(body),
+        }
+        out = b''.join(app(environ, lambda status, headers: None))
+        lines = [json.loads(l) for l in out.decode().splitlines()]
+        assert lines == [{'index': 0, 'result': {'sum': 4}}, {'index': 1, 'error': 'ValueError: negative'}]
+
+
+@pytest.mark.skipif(not hasattr(os, 'fork'), reason='prefork needs os.fork')
+class TestPrefork:
+    def test_shared_state_options_are_rejected(self):
+        with pytest.raises(ValueError, match='jobs'):
+            serve(add, port=15080, workers=2, jobs=True)
+
+    def test_workers_serve_restart_and_stop(self, tmp_path):
+        import signal
+        model = tmp_path / 'model.py'
+        model.write_text('import os\n\ndef pid(x: int = 1):\n    return {"pid": os.getpid()}\n')
+        proc = subprocess.Popen(
+            [sys.executable, os.path.join(PY_ROOT, 'bin', 'jsee'), str(model), 'pid',
+             '--port', '15080', '--workers', '2'],
+            env=_cli_env(), stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
+        base = 'http://localhost:15080'
+
+        def pids(n):
+            seen = set()
+            for _ in range(n):
+                req = Request(base + '/pid', data=b'{}', headers={'Content-Type': 'application/json'})
+                seen.add(json.loads(urlopen(req, timeout=5).read())['pid'])
+            return seen
+
+        try:
+            for _ in range(50):
+                try:
+                    urlopen(base + '/api', timeout=1)
+                    break
+                except Exception:
+                    time.sleep(0.1)
+            first = pids(20)
+            assert proc.pid not in first
+            os.kill(first.pop(), signal.SIGKILL)
+            time.sleep(0.5)
+            # The parent replaced the killed child; requests keep working
+            assert pids(10)
+        finally:
+            proc.send_signal(signal.SIGTERM)
+            assert proc.wait(timeout=10) == 0, proc.stderr.read().decode()
+
+    def test_reload_keeps_unix_socket_cleanup(self, tmp_path):
+        import signal
+        path = str(tmp_path / 'jsee.sock')
+        model = tmp_path / 'model.py'
+        model.write_text('def add(x: int, y: int = 1):\n    return x + y\n')
+        proc = subprocess.Popen(
+            [sys.executable, os.path.join(PY_ROOT, 'bin', 'jsee'), str(model), 'add',
+             '--unix', path, '--workers', '2'],
+            env=_cli_env(), stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
+
+        def wait_ready():
+            for _ in range(50):
+                try:
+                    return _unix_get(path, '/api')[0]
+                except OSError:
+                    time.sleep(0.1)
+
+        try:
+            assert wait_ready() == 200
+            proc.send_signal(signal.SIGHUP)
+            time.sleep(1)
+            assert wait_ready() == 200
+        finally:
+            proc.send_signal(signal.SIGTERM)
+            assert proc.wait(timeout=10) == 0, proc.stderr.read().decode()
+        # The reloaded server removed the socket file it inherited
+        assert not os.path.exists(path)
+
+
+def _unix_get(path, url):
+    import http.client
+    import socket
+
+    class UnixConnection(http.client.HTTPConnection):
+        def connect(self):
+            self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            self.sock.connect(path)
+
+    conn = UnixConnection('localhost', timeout=5)
+    try:
+        conn.request('GET', url)
+        resp = conn.getresponse()
+        return resp.status, resp.read()
+    finally:
+        conn.close()
+
+
+@pytest.mark.skipif(not hasattr(os, 'fork'), reason='Unix sockets and fd passing')
+class TestListenSockets:
+    def test_unix_socket(self, tmp_path):
+        path = str(tmp_path / 'jsee.sock')
+        # A stale socket file from a previous run is replaced
+        import socket
+        stale = socket.socket(socket.AF_UNIX)
+        stale.bind(path)
+        stale.close()
+        threading.Thread(target=serve, args=(add,), kwargs={'unix_socket': path}, daemon=True).start()
+        for _ in range(30):
+            try:
+                status, body = _unix_get(path, '/api')
+                break
+            except OSError:
+                time.sleep(0.1)
+        assert status == 200
+        assert json.loads(body)['models'][0]['name'] == 'add'
+
+    def test_unix_socket_refuses_regular_file(self, tmp_path):
+        from jsee.sockets import unix_server
+        path = tmp_path / 'not-a-socket'
+        path.write_text('data')
+        with pytest.raises(ValueError):
+            unix_server(str(path), None)
+
+    def test_unix_socket_refuses_live_socket(self, tmp_path):
+        import errno
+        import socket
+        from jsee.sockets import unix_server
+        path = str(tmp_path / 'live.sock')
+        live = socket.socket(socket.AF_UNIX)
+        live.bind(path)
+        live.listen(1)
+        try:
+            with pytest.raises(OSError) as e:
+                unix_server(path, None)
+            assert e.value.errno == errno.EADDRINUSE
+            assert os.path.exists(path)
+        finally:
+            live.close()
+
+    def test_adopts_socket(self):
+        import socket
+        sock = socket.socket()
+        sock.bind(('127.0.0.1', 0))
+        sock.listen(16)
+        port = sock.getsockname()[1]
+        threading.Thread(target=serve, args=(add,), kwargs={'sock': sock}, daemon=True).start()
+        req = Request('http://127.0.0.1:{}/add'.format(port), data=b'{"x": 2}',
+                      headers={'Content-Type': 'application/json'})
+        assert json.loads(urlopen(req, timeout=5).read()) == {'result': 3}
+
+    def test_systemd_socket_activation(self, tmp_path):
+        import socket
+        sock = socket.socket()
+        sock.bind(('127.0.0.1', 0))
+        sock.listen(16)
+        port = sock.getsockname()[1]
+        model = tmp_path / 'model.py'
+        model.write_text('def add(x: int, y: int = 1):\n    return x + y\n')
+        fd = sock.fileno()
+        # systemd passes the socket as fd 3 with LISTEN_PID set to the server's pid
+        proc = subprocess.Popen(
+            ['sh', '-c', 'LISTEN_PID=$$ LISTEN_FDS=1 exec "$0" "$@"', sys.executable,
+             os.path.join(PY_ROOT, 'bin', 'jsee'), str(model), 'add', '--port', '1'],
+            env=_cli_env(), pass_fds=(3,), preexec_fn=lambda: os.dup2(fd, 3),
+            stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+        sock.close()
+        try:
+            req = Request('http://127.0.0.1:{}/add'.format(port), data=b'{"x": 4}',
+                          headers={'Content-Type': 'application/json'})
+            assert json.loads(urlopen(req, timeout=10).read()) == {'result': 5}
+        finally:
+            proc.terminate()
+            proc.wait(timeout=10)
+
+
+def _write_models(tmp_path, names):
+    for name in names:
+        (tmp_path / (name + '.py')).write_text(
+            'import os\n\ndef {}(x: int = 1):\n    return {{"pid": os.getpid(), "x": x}}\n'.format(name))
+    return {name: str(tmp_path / (name + '.py')) for name in names}
+
+
+class TestModelRegistry:
+    def test_load_model_fallback_ignores_imports(self, tmp_path):
+        from jsee.models import load_model
+        path = tmp_path / 'model.py'
+        path.write_text('from os.path import join\n\ndef predict(x: int = 1):\n    return x\n')
+        # Named differently from the model: the one function defined in the file
+        assert load_model('other', str(path)).__name__ == 'predict'
+        path.write_text('def a():\n    pass\n\ndef b():\n    pass\n')
+        with pytest.raises(ValueError, match='several candidates: a, b'):
+            load_model('other', str(path))
+
+    def test_loads_on_first_access(self, tmp_path):
+        from jsee.models import ModelRegistry
+        calls = []
+
+        def loader(name, path):
+            calls.append(name)
+            return lambda **data: name
+
+        registry = ModelRegistry(_write_models(tmp_path, ['a', 'b']), loader=loader)
+        assert 'a' in registry and len(registry) == 2
+        assert registry.loaded() == [] and calls == []
+        assert registry['a']() == 'a'
+        registry['a']
+        assert calls == ['a'] and registry.loaded() == ['a']
+        with pytest.raises(KeyError):
+            registry['c']
+
+    def test_lru_and_ttl_unloading(self, tmp_path):
+        from jsee.models import ModelRegistry
+        paths = _write_models(tmp_path, ['a', 'b', 'c'])
+        registry = ModelRegistry(paths, max_models=2)
+        registry['a'], registry['b'], registry['a'], registry['c']
+        assert registry.loaded() == ['a', 'c']
+        registry = ModelRegistry(paths, ttl=0.1)
+        registry['a']
+        time.sleep(0.5)
+        assert registry.loaded() == []
+        # Reloaded on demand
+        assert registry['a'](x=2)['x'] == 2
+
+    def test_busy_models_are_not_unloaded(self, tmp_path):
+        from jsee.models import ModelRegistry
+        registry = ModelRegistry(_write_models(tmp_path, ['a', 'b']), max_models=1, ttl=0.1,
+                                 loader=lambda name, path: lambda **data: name)
+        stream = registry.call('a', {}, lambda func, data: (func() for _ in range(2)))
+        assert registry.call('b', {}) == 'b'
+        time.sleep(0.4)
+        # 'a' is still streaming: kept over max_models and past its ttl
+        assert registry.loaded() == ['a']
+        assert list(stream) == ['a', 'a']
+        time.sleep(0.4)
+        assert registry.loaded() == []
+
+    def test_warm_and_api_reports_loaded(self, tmp_path):
+        _write_models(tmp_path, ['a', 'b'])
+        schema = {'model': [{'name': 'a', 'url': 'a.py'}, {'name': 'b', 'url': 'b.py'}], 'inputs': []}
+        path = tmp_path / 'schema.json'
+        path.write_text(json.dumps(schema))
+        app = create_app(str(path), lazy=True)
+
+        def api():
+            environ = {'REQUEST_METHOD': 'GET', 'PATH_INFO': '/api', 'wsgi.input': io.BytesIO()}
+            return {m['name']: m['loaded'] for m in
+                    json.loads(b''.join(app(environ, lambda status, headers: None)))['models']}
+
+        assert api() == {'a': False, 'b': False}
+        environ = {'REQUEST_METHOD': 'POST', 'PATH_INFO': '/b', 'CONTENT_TYPE': 'application/json',
+                   'CONTENT_LENGTH': '2', 'wsgi.input': io.BytesIO(b'{}')}
+        assert json.loads(b''.join(app(environ, lambda status, headers: None)))['x'] == 1
+        assert api() == {'a': False, 'b': True}
+        warm = create_app(str(path), warm=True).__self__
+        warm._warming.join()
+        assert sorted(warm.funcs.loaded()) == ['a', 'b']
+
+    def test_lazy_rejects_processes(self, tmp_path):
+        _write_models(tmp_path, ['a'])
+        with pytest.raises(ValueError, match='processes'):
+            create_app({'model': {'name': 'a', 'url': str(tmp_path / 'a.py')}}, lazy=True, processes=2)
+
+
+class _Scaler:
+    """Scale a number."""
+    instances = []
+
+    def setup(self):
+        self.factor = 10
+        self.calls = 0
+        self.closed = False
+        _Scaler.instances.append(self)
+
+    def __call__(self, x: int, offset: int = 0) -> dict:
+        self.calls += 1
+        return {'y': x * self.factor + offset}
+
+    def teardown(self):
+        self.closed = True
+
+
+class TestLifecycle:
+    def setup_method(self):
+        _Scaler.instances = []
+
+    def test_schema_from_call(self):
+        schema = generate_schema(_Scaler)
+        assert schema['model']['name'] == '_Scaler'
+        assert [i['name'] for i in schema['inputs']] == ['x', 'offset']
+        assert schema['model']['description'] == 'Scale a number.'
+
+    def test_setup_warmup_and_teardown(self):
+        app = create_app(_Scaler, examples=[{'x': 1}, {'x': 2}]).__self__
+        # Set up and warmed before the first request
+        assert len(_Scaler.instances) == 1 and _Scaler.instances[0].calls == 2
+        body = b'{"x": 3, "offset": 1}'
+        environ = {'REQUEST_METHOD': 'POST', 'PATH_INFO': '/_Scaler', 'CONTENT_TYPE': 'application/json',
+                   'CONTENT_LENGTH': str(len(body)), 'wsgi.input': io.BytesIO(body)}
+        assert json.loads(b''.join(app.wsgi(environ, lambda status, headers: None))) == {'y': 31}
+        app.close()
+        assert _Scaler.instances[0].closed
+
+    def test_pool_serves_one_request_per_instance(self):
+        from jsee.lifecycle import Lifecycle
+        active = []
+        peak = []
+
+        class Slow:
+            def __call__(self, x: int = 0):
+                active.append(self)
+                peak.append(len(set(map(id, active))))
+                time.sleep(0.02)
+                active.remove(self)
+                return x
+
+        model = Lifecycle(Slow, pool=2, examples=[{'x': 1}]).start()
+        from concurrent.futures import ThreadPoolExecutor
+        with ThreadPoolExecutor(6) as pool:
+            assert list(pool.map(lambda x: model(x=x), range(12))) == list(range(12))
+        assert len(model._instances) == 2 and max(peak) <= 2
+
+    def test_warmup_can_be_disabled(self):
+        create_app(_Scaler, examples=[{'x': 1}], warmup=False)
+        assert _Scaler.instances[0].calls == 0
+
+    def test_class_in_model_file(self, tmp_path):
+        (tmp_path / 'scaler.py').write_text(
+            'class Scaler:\n'
+            '    def setup(self):\n        self.k = 3\n'
+            '    def __call__(self, x: int = 1):\n        return {"y": x * self.k}\n')
+        schema = {'model': {'name': 'scale', 'url': str(tmp_path / 'scaler.py')}, 'inputs': [],
+                  'examples': [{'x': 2}]}
+        app = create_app(schema).__self__
+        assert app.funcs['scale'](x=2) == {'y': 6}
+
+
+def _get(app, path, **headers):
+    path, _, query = path.partition('?')
+    environ = {'REQUEST_METHOD': 'GET', 'PATH_INFO': path, 'QUERY_STRING': query, 'wsgi.input': io.BytesIO()}
+    environ.update({'HTTP_' + k.upper(): v for k, v in headers.items()})
+    status_headers = []
+    body = b''.join(app(environ, lambda status, h: status_headers.extend([status, dict(h)])))
+    return status_headers[0], status_headers[1], body
+
+
+class TestArtifact:
+    def _model(self, tmp_path):
+        from jsee.models import load_model
+        return load_model('predict', _write_models(tmp_path, ['predict'])['predict'])
+
+    def test_roundtrip(self, tmp_path):
+        from jsee.artifact import build
+        func = self._model(tmp_path)
+        manifest = build(func, str(tmp_path / 'build'), title='Predict')
+        assert set(manifest['files']) >= {'schema.json', 'openapi.json', 'index.html'}
+        plain = create_app(func, title='Predict', port=7000)
+        app = create_app(func, title='Predict', port=7000, build=str(tmp_path / 'build'))
+        assert app.__self__.schema == plain.__self__.schema
+        # Same page as without the build, address filled in
+        assert _get(app, '/')[2] == _get(plain, '/')[2]
+        assert b'localhost:7000' in _get(app, '/')[2]
+        assert json.loads(_get(app, '/api/openapi.json')[2]) == json.loads(_get(plain, '/api/openapi.json')[2])
+
+    def test_stale_build_is_ignored(self, tmp_path, capsys):
+        from jsee.artifact import build
+        func = self._model(tmp_path)
+        build(func, str(tmp_path / 'build'))
+        # Options that change the schema invalidate the build
+        app = create_app(func, title='Other', build=str(tmp_path / 'build')).__self__
+        assert 'out of date' in capsys.readouterr().err
+        assert app.schema['model']['title'] == 'Other'
+        # So do edits of the model source
+        with open(tmp_path / 'predict.py', 'a') as f:
+            f.write('\n# edited\n')
+        create_app(func, build=str(tmp_path / 'build'))
+        assert 'out of date' in capsys.readouterr().err
+        create_app(func, build=str(tmp_path / 'missing'))
+        assert 'ignoring build' in capsys.readouterr().err
+
+    def test_gzip_runtime(self, tmp_path):
+        import gzip
+        from jsee.artifact import build
+        func = self._model(tmp_path)
+        path = tmp_path / 'build'
+        manifest = build(func, str(path))
+        if 'jsee.js.gz' not in manifest['files']:
+            # Runtime bundle not built in this checkout; add a stand-in
+            (path / 'jsee.js.gz').write_bytes(gzip.compress(b'console.log(1)'))
+            manifest['files'].append('jsee.js.gz')
+            (path / 'manifest.json').write_text(json.dumps(manifest))
+        app = create_app(func, build=str(path))
+        status, headers, body = _get(app, '/static/jsee.js', accept_encoding='gzip, br')
+        assert status.startswith('200') and headers['Content-Encoding'] == 'gzip'
+        assert body == (path / 'jsee.js.gz').read_bytes()
+        status, headers, body = _get(app, '/static/jsee.js')
+        assert 'Content-Encoding' not in headers and body == gzip.decompress((path / 'jsee.js.gz').read_bytes())
+
+    def test_cli_build(self, tmp_path):
+        _write_models(tmp_path, ['predict'])
+        result = subprocess.run(
+            [sys.executable, os.path.join(PY_ROOT, 'bin', 'jsee'), 'build', 'predict.py', 'predict',
+             '-o', 'out', '--x=5'],
+            cwd=str(tmp_path), env=_cli_env(), stderr=subprocess.PIPE, universal_newlines=True, timeout=30)
+        assert result.returncode == 0, result.stderr
+        schema = json.loads((tmp_path / 'out' / 'schema.json').read_text())
+        assert schema['inputs'][0]['default'] == 5
+
+    @pytest.mark.parametrize('flags', [[], ['--pipeline'], ['--deterministic']])
+    def test_cli_build_then_serve(self, tmp_path, flags):
+        _write_models(tmp_path, ['predict'])
+        cli = [sys.executable, os.path.join(PY_ROOT, 'bin', 'jsee')]
+        subprocess.run(cli + ['build', 'predict.py', 'predict', '-o', 'out'] + flags,
+                       cwd=str(tmp_path), env=_cli_env(), check=True, timeout=30)
+        proc = subprocess.Popen(cli + ['predict.py', 'predict', '--build', 'out', '--port', '15082'] + flags,
+                                cwd=str(tmp_path), env=_cli_env(), stderr=subprocess.PIPE,
+                                universal_newlines=True)
+        api = None
+        try:
+            for _ in range(50):
+                try:
+                    api = json.loads(urlopen('http://localhost:15082/api', timeout=1).read())
+                    break
+                except Exception:
+                    time.sleep(0.1)
+        finally:
+            proc.terminate()
+            _, stderr = proc.communicate(timeout=10)
+        assert api['models'][0]['name'] == 'predict'
+        assert 'out of date' not in stderr and 'ignoring build' not in stderr
+
+    def test_import_is_lazy(self):
+        code = ('import sys, jsee\n'
+                'assert "http.server" not in sys.modules and "jsee.jsee" not in sys.modules\n'
+                'jsee.create_app\n'
+                'assert "jsee.jsee" in sys.modules and "http.server" not in sys.modules\n')
+        subprocess.run([sys.executable, '-c', code], check=True, env=_cli_env(), timeout=30)
+
+
+def _post(app, path, data, **headers):
+    body = json.dumps(data).encode()
+    path, _, query = path.partition('?')
+    environ = {'REQUEST_METHOD': 'POST', 'PATH_INFO': path, 'QUERY_STRING': query,
+               'CONTENT_TYPE': 'application/json', 'CONTENT_LENGTH': str(len(body)),
+               'wsgi.input': io.BytesIO(body)}
+    environ.update({'HTTP_' + k.upper(): v for k, v in headers.items()})
+    status_headers = []
+    body = b''.join(app(environ, lambda status, h: status_headers.extend([status, dict(h)])))
+    return status_headers[0], status_headers[1], body
+
+
+class TestResultCache:
+    def test_key_is_canonical(self, tmp_path):
+        from jsee.cache import ResultCache
+        cache = ResultCache(str(tmp_path / 'c.db'))
+        assert cache.key('m', _batch_model, {'x': 1, 'y': 2}) == cache.key('m', _batch_model, {'y': 2, 'x': 1})
+        assert cache.key('m', _batch_model, {'x': 1}) != cache.key('n', _batch_model, {'x': 1})
+        assert cache.key('m', _batch_model, {'x': b'ab'}) == cache.key('m', _batch_model, {'x': bytearray(b'ab')})
+        assert cache.key('m', _batch_model, {'x': object()}) is None
+
+    def test_source_edit_invalidates(self, tmp_path):
+        from jsee.cache import ResultCache
+        from jsee.models import load_model
+        path = _write_models(tmp_path, ['predict'])['predict']
+        cache = ResultCache(str(tmp_path / 'c.db'))
+        key = cache.key('predict', load_model('predict', path), {'x': 1})
+        assert cache.key('predict', load_model('predict', path), {'x': 1}) == key
+        with open(path, 'a') as f:
+            f.write('\n# edited\n')
+        assert cache.key('predict', load_model('predict', path), {'x': 1}) != key
+
+    def test_evicts_least_recently_used(self, tmp_path):
+        from jsee.cache import ResultCache
+        cache = ResultCache(str(tmp_path / 'c.db'), max_bytes=2000)
+        for i in range(40):
+            assert cache.put('k{}'.format(i), 'm', {'result': 'x' * 90})
+        assert cache.stats()['bytes'] <= 2000
+        assert cache.get('k39') == {'result': 'x' * 90} and cache.get('k0') is None
+
+    def test_shared_between_processes(self, tmp_path):
+        from jsee.cache import ResultCache
+        db = str(tmp_path / 'c.db')
+        code = ('from jsee.cache import ResultCache\n'
+                'c = ResultCache({!r})\n'
+                'for i in range(50):\n'
+                '    c.put("p%d-%d" % (P, i), "m", {{"result": i}})\n').format(db)
+        procs = [subprocess.Popen([sys.executable, '-c', 'P = {}\n'.format(p) + code], env=_cli_env())
+                 for p in range(3)]
+        assert [p.wait(timeout=30) for p in procs] == [0, 0, 0]
+        cache = ResultCache(db)
+        assert cache.stats()['entries'] == 150 and cache.get('p2-49') == {'result': 49}
+
+    def test_app_serves_cached_results(self, tmp_path):
+        calls = []
+
+        def slow_add(x: int, y: int = 1):
+            calls.append(x)
+            return x + y
+
+        app = create_app(slow_add, cache=str(tmp_path / 'c.db'), deterministic=True)
+        first = _post(app, '/slow_add', {'x': 2, 'y': 3})
+        second = _post(app, '/slow_add', {'y': 3, 'x': 2})
+        assert first[1]['X-JSEE-Cache'] == 'miss' and second[1]['X-JSEE-Cache'] == 'hit'
+        assert json.loads(second[2]) == json.loads(first[2]) == {'result': 5}
+        assert calls == [2]
+        # A new app (a restart, another worker) uses the same results
+        again = create_app(slow_add, cache=str(tmp_path / 'c.db'), deterministic=True)
+        assert _post(again, '/slow_add', {'x': 2, 'y': 3})[1]['X-JSEE-Cache'] == 'hit'
+        assert calls == [2]
+
+    def test_model_opt_out(self, tmp_path):
+        path = _write_models(tmp_path, ['predict'])['predict']
+        schema = {'model': {'name': 'predict', 'url': path, 'deterministic': True, 'cache': False},
+                  'inputs': []}
+        app = create_app(schema, cache=str(tmp_path / 'c.db'))
+        status, headers, body = _post(app, '/predict', {'x': 2})
+        assert status.startswith('200') and 'X-JSEE-Cache' not in headers
+
+    def test_only_deterministic_models_are_cached(self, tmp_path):
+        calls = []
+
+        def roll(x: int):
+            calls.append(x)
+            return len(calls)
+
+        app = create_app(roll, cache=str(tmp_path / 'c.db'))
+        first = _post(app, '/roll', {'x': 1})
+        second = _post(app, '/roll', {'x': 1})
+        assert 'X-JSEE-Cache' not in first[1] and 'X-JSEE-Cache' not in second[1]
+        assert json.loads(second[2]) == {'result': 2} and calls == [1, 1]
+
+
+def _scale(x: int, factor: float = 1.0, tags: list = None, exact: bool = False, label: str = ''):
+    return {'y': x * factor, 'tags': tags, 'exact': exact, 'label': label}
+
+
+class TestCacheableGet:
+    def test_query_inputs_are_typed(self):
+        from jsee.jsee import _query_inputs
+        inputs = [{'name': 'n', 'type': 'int'}, {'name': 'f', 'type': 'slider'},
+                  {'name': 'b', 'type': 'checkbox'}, {'name': 'r', 'type': 'range'},
+                  {'name': 'm', 'type': 'multi-select'}]
+        pairs = [('b', 'true'), ('f', '0.5'), ('m', 'a'), ('m', 'b'), ('n', '3'), ('r', '[1, 2]'), ('s', '4')]
+        assert _query_inputs(pairs, inputs) == {
+            'n': 3, 'f': 0.5, 'b': True, 'r': [1, 2], 'm': ['a', 'b'], 's': '4'}
+        with pytest.raises(ValueError):
+            _query_inputs([('n', 'x')], inputs)
+        with pytest.raises(ValueError):
+            _query_inputs([('n', '1'), ('n', '2')], inputs)
+
+    def test_get_with_etag(self):
+        app = create_app(_scale, deterministic=True, cache_control='public, max-age=60')
+        status, headers, body = _get(app, '/_scale?exact=true&factor=2&x=3')
+        assert status.startswith('200')
+        assert json.loads(body) == {'y': 6, 'tags': None, 'exact': True, 'label': ''}
+        assert headers['Cache-Control'] == 'public, max-age=60'
+        etag = headers['ETag']
+        assert etag.startswith('"') and not etag.startswith('W/')
+        assert 'ETag' in headers['Access-Control-Expose-Headers']
+        # Same inputs, same tag; a matching If-None-Match skips the model
+        status, headers, body = _get(app, '/_scale?exact=true&factor=2&x=3', if_none_match=etag)
+        assert status.startswith('304') and headers['ETag'] == etag and body == b''
+        assert 'ETag' in headers['Access-Control-Expose-Headers']
+        assert _get(app, '/_scale?exact=true&factor=2&x=4')[1]['ETag'] != etag
+
+    def test_non_canonical_query_redirects(self):
+        app = create_app(_scale, deterministic=True)
+        status, headers, _ = _get(app, '/_scale?x=3&factor=2')
+        assert status.startswith('301') and headers['Location'] == '/_scale?factor=2&x=3'
+        # Repeated parameters keep their order
+        status, headers, _ = _get(app, '/_scale?x=1&tags=b&tags=a')
+        assert headers['Location'] == '/_scale?tags=b&tags=a&x=1'
+
+    def test_only_deterministic_models(self):
+        app = create_app(_scale)
+        assert _get(app, '/_scale?x=1')[0].startswith('404')
+        spec = generate_openapi_spec(generate_schema(_scale))
+        assert 'get' not in spec['paths']['/_scale']
+
+    def test_openapi_documents_get(self):
+        spec = generate_openapi_spec(generate_schema(_scale, deterministic=True))
+        get = spec['paths']['/_scale']['get']
+        params = {p['name']: p for p in get['parameters']}
+        assert params['x']['in'] == 'query' and params['x']['required']
+        assert not params['factor']['required']
+        assert 'ETag' in get['responses']['200']['headers']
+
+
+class TestIdempotency:
+    def test_store_replays_and_bounds(self):
+        from jsee.idempotency import IdempotencyStore, KeyReused
+        store = IdempotencyStore(max_bytes=300)
+        assert store.begin('a', 'f1') is None
+        store.complete('a', (200, [], b'x' * 100))
+        assert store.begin('a', 'f1') == (200, [], b'x' * 100)
+        with pytest.raises(KeyReused):
+            store.begin('a', 'f2')
+        for key in 'bcd':
+            assert store.begin(key, 'f') is None
+            store.complete(key, (200, [], b'x' * 100))
+        # Oldest response dropped to stay within max_bytes
+        assert store.begin('a', 'f1') is None and len(store) <= 3
+
+    def test_store_expires(self):
+        from jsee.idempotency import IdempotencyStore
+        store = IdempotencyStore(ttl=0.01)
+        store.begin('a', 'f')
+        store.complete('a', (200, [], b'{}'))
+        time.sleep(0.02)
+        assert store.begin('a', 'f') is None
+
+    def test_retry_replays_response(self):
+        calls = []
+
+        def charge(amount: int):
+            calls.append(amount)
+            return {'charged': amount, 'n': len(calls)}
+
+        app = create_app(charge, idempotency=True)
+        first = _post(app, '/charge', {'amount': 5}, idempotency_key='k1')
+        retry = _post(app, '/charge', {'amount': 5}, idempotency_key='k1')
+        assert retry[2] == first[2] and calls == [5]
+        assert retry[1]['Idempotent-Replayed'] == 'true' and 'Idempotent-Replayed' not in first[1]
+        assert _post(app, '/charge', {'amount': 6}, idempotency_key='k1')[0].startswith('422')
+        # No key, no deduplication
+        _post(app, '/charge', {'amount': 5})
+        assert calls == [5, 5]
+
+    def test_retry_attaches_to_running_call(self):
+        calls = []
+        started = threading.Event()
+
+        def slow(x: int = 1):
+            calls.append(x)
+            started.set()
+            time.sleep(0.2)
+            return {'x': x}
+
+        app = create_app(slow, idempotency=True)
+        results = []
+        first = threading.Thread(target=lambda: results.append(_post(app, '/slow', {}, idempotency_key='k')))
+        first.start()
+        started.wait(5)
+        results.append(_post(app, '/slow', {}, idempotency_key='k'))
+        first.join()
+        assert calls == [1] and results[0][2] == results[1][2]
+
+    def test_server_errors_are_not_stored(self):
+        calls = []
+
+        def flaky(x: int = 1):
+            calls.append(x)
+            if len(calls) == 1:
+                raise RuntimeError('temporary')
+            return x
+
+        app = create_app(flaky, idempotency=True)
+        assert _post(app, '/flaky', {}, idempotency_key='k')[0].startswith('500')
+        assert _post(app, '/flaky', {}, idempotency_key='k')[0].startswith('200')
+        assert len(calls) == 2
+
+    def test_off_by_default(self):
+        calls = []
+
+        def f(x: int = 1):
+            calls.append(x)
+            return x
+
+        app = create_app(f)
+        _post(app, '/f', {}, idempotency_key='k')
+        _post(app, '/f', {}, idempotency_key='k')
+        assert len(calls) == 2
+
+    def test_serve(self):
+        _start_server(add, 15081, idempotency=True)
+        responses = []
+        for _ in range(2):
+            req = Request('http://localhost:15081/add', data=b'{"x": 2, "y": 3}', method='POST',
+                          headers={'Content-Type': 'application/json', 'Idempotency-Key': 'k'})
+            with urlopen(req, timeout=5) as resp:
+                responses.append((resp.headers.get('Idempotent-Replayed'), resp.read()))
+        assert responses[0][0] is None and responses[1][0] == 'true'
+        assert responses[0][1] == responses[1][1]
+
+
+def _pipeline_schema(tmp_path, **extra):
+    (tmp_path / 'tokenize.py').write_text(
+        'CALLS = []\n\n'
+        'def tokenize(text: str = "a b a", n: int = 1):\n'
+        '    CALLS.append(text)\n'
+        '    # A set: not JSON, passed to the next stage as is\n'
+        '    return {"vocab": set(text.split()), "n": n}\n')
+    (tmp_path / 'describe.py').write_text(
+        'CALLS = []\n\n'
+        'def describe(vocab, n: int = 1, upper: bool = False):\n'
+        '    CALLS.append(upper)\n'
+        '    words = sorted(vocab) * n\n'
+        '    return {"result": " ".join(w.upper() if upper else w for w in words)}\n')
+    schema = {
+        'model': [{'name': 'tokenize', 'url': 'tokenize.py'}, {'name': 'describe', 'url': 'describe.py'}],
+        'inputs': [{'name': 'text', 'type': 'string'}, {'name': 'upper', 'type': 'checkbox'}],
+        'outputs': [{'name': 'result', 'type': 'string'}],
+    }
+    schema.update(extra)
+    path = tmp_path / 'schema.json'
+    path.write_text(json.dumps(schema))
+    return str(path)
+
+
+class TestPipeline:
+    def test_runs_stages_in_one_request(self, tmp_path):
+        app = create_app(_pipeline_schema(tmp_path), pipeline=True)
+        status, headers, body = _post(app, '/api/pipeline', {'text': 'b a b'})
+        assert status.startswith('200'), body
+        assert json.loads(body) == {'result': 'a b'}
+        assert headers['X-JSEE-Pipeline'] == 'tokenize;miss, describe;miss'
+
+    def test_downstream_input_reuses_upstream_stage(self, tmp_path):
+        app = create_app(_pipeline_schema(tmp_path, pipeline=True))
+        funcs = app.__self__.funcs
+        _post(app, '/api/pipeline', {'text': 'b a', 'upper': False})
+        status, headers, body = _post(app, '/api/pipeline', {'text': 'b a', 'upper': True})
+        assert json.loads(body) == {'result': 'A B'}
+        assert headers['X-JSEE-Pipeline'] == 'tokenize;hit, describe;miss'
+        assert funcs['tokenize'].__globals__['CALLS'] == ['b a']
+        # An upstream input reruns everything after it
+        status, headers, body = _post(app, '/api/pipeline', {'text': 'c', 'upper': True})
+        assert headers['X-JSEE-Pipeline'] == 'tokenize;miss, describe;miss'
+
+    def test_page_and_openapi(self, tmp_path):
+        app = create_app(_pipeline_schema(tmp_path), pipeline=True)
+        assert b'/api/pipeline' in _get(app, '/')[2]
+        spec = json.loads(_get(app, '/api/openapi.json')[2])
+        assert 'post' in spec['paths']['/api/pipeline']
+        assert json.loads(_get(app, '/api')[2])['pipeline'] == '/api/pipeline'
+        # Without the option the stages are separate endpoints only
+        plain = create_app(_pipeline_schema(tmp_path))
+        assert _post(plain, '/api/pipeline', {})[0].startswith('404')
+
+    def test_stop_and_non_dict_results(self):
+        from jsee.pipeline import Pipeline
+        funcs = {
+            'double': lambda x=1: x * 2,
+            'square': lambda value: {'y': value ** 2},
+            'halt': lambda y: {'stop': True, 'y': y},
+            'never': lambda y: {'y': -1},
+        }
+        result, trace = Pipeline(['double', 'square', 'halt', 'never'], funcs).run({'x': 3})
+        assert result['y'] == 36 and result['stop'] and list(trace) == ['double', 'square', 'halt']
+
+
+def _sse_events(body):
+    events = []
+    for frame in body.decode().split('\n\n'):
+        lines = dict(line.split(': ', 1) for line in frame.splitlines() if not line.startswith(':'))
+        if 'event' in lines:
+            events.append((lines['event'], json.loads(lines['data'])))
+    return events
+
+
+def _fanout_schema(tmp_path):
+    for name, delay in (('fast', 0), ('slow', 0.3), ('broken', 0)):
+        (tmp_path / (name + '.py')).write_text(
+            'import time\n\n'
+            'def {}(x: int = 1, y: int = 0):\n'
+            '    time.sleep({})\n'
+            '    if "{}" == "broken":\n'
+            '        raise ValueError("no estimate")\n'
+            '    return {{"estimate": x * {} + y}}\n'.format(name, delay, name, len(name)))
+    return {'model': [{'name': n, 'url': str(tmp_path / (n + '.py'))} for n in ('slow', 'fast', 'broken')],
+            'inputs': [{'name': 'x', 'type': 'int'}]}
+
+
+class TestFanout:
+    def test_streams_results_as_they_finish(self, tmp_path):
+        app = create_app(_fanout_schema(tmp_path), batch_workers=4)
+        start = time.time()
+        status, headers, body = _post(app, '/api/fanout', {'x': 2})
+        assert time.time() - start < 0.6
+        assert headers['Content-Type'].startswith('text/event-stream')
+        events = _sse_events(body)
+        assert events[-1] == ('done', {'models': 3, 'errors': 1})
+        by_model = {data['model']: (name, data) for name, data in events[:-1]}
+        assert by_model['fast'][1]['result'] == {'estimate': 8}
+        assert by_model['broken'][0] == 'error' and 'no estimate' in by_model['broken'][1]['error']
+        # The slow model finishes last
+        assert events[-2][1]['model'] == 'slow'
+
+    def test_selected_models(self, tmp_path):
+        app = create_app(_fanout_schema(tmp_path))
+        events = _sse_events(_post(app, '/api/fanout?models=fast,broken', {'x': 1})[2])
+        assert sorted(data['model'] for _, data in events[:-1]) == ['broken', 'fast']
+        assert _post(app, '/api/fanout?models=nope', {})[0].startswith('404')
+
+    def test_openapi(self, tmp_path):
+        spec = generate_openapi_spec(_fanout_schema(tmp_path))
+        assert 'post' in spec['paths']['/api/fanout']
+
+    def test_advertised_with_several_models(self, tmp_path):
+        assert json.loads(_get(create_app(_fanout_schema(tmp_path)), '/api')[2])['fanout'] == '/api/fanout'
+        assert 'fanout' not in json.loads(_get(create_app(add), '/api')[2])
+        assert '/api/fanout' not in generate_openapi_spec(generate_schema(add))['paths']
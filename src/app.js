@@ -288,6 +288,7 @@ function createVueApp (env, mountedCallback, logMain) {
           this.outputs.forEach(output => {
             if (output.type === 'chat') {
               output._messages = []
+              output._session = undefined
             } else {
               output.value = undefined
             }
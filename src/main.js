@@ -913,7 +913,15 @@ export default class JSEE {
         ? this.data.outputs.find(o => o.type === 'chat')
         : null
       if (chatOutput) {
-        inputValues.history = chatOutput._messages || []
+        if (this.model.some(m => m.session)) {
+          // Server keeps the history: send only the new message and a conversation ID
+          if (!chatOutput._session) {
+            chatOutput._session = Date.now().toString(36) + Math.random().toString(36).slice(2)
+          }
+          inputValues._session = chatOutput._session
+        } else {
+          inputValues.history = chatOutput._messages || []
+        }
         this._lastChatMessage = inputValues.message || ''
       }
 
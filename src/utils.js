@@ -763,6 +763,59 @@ function parseSSELine (line) {
   }
 }
 
+// Apply JSON Patch (RFC 6902) add/replace/remove ops to an object in place
+function applyJSONPatch (doc, ops) {
+  ops.forEach(op => {
+    const tokens = op.path.split('/').slice(1).map(t => t.replace(/~1/g, '/').replace(/~0/g, '~'))
+    const last = tokens.pop()
+    const parent = tokens.reduce((node, t) => node[Array.isArray(node) ? parseInt(t) : t], doc)
+    if (Array.isArray(parent)) {
+      const index = last === '-' ? parent.length : parseInt(last)
+      if (op.op === 'add') parent.splice(index, 0, op.value)
+      else if (op.op === 'replace') parent[index] = op.value
+      else if (op.op === 'remove') parent.splice(index, 1)
+    } else if (op.op === 'remove') {
+      delete parent[last]
+    } else {
+      parent[last] = op.value
+    }
+  })
+  return doc
+}
+
+// Merge an SSE chunk into the accumulated stream state.
+// `_append: {name: items}` adds text to strings and rows to arrays or
+// {columns, rows} tables; `_patch` holds JSON Patch ops on the outputs
+function applySSEChunk (state, chunk) {
+  if (!isObject(chunk)) return chunk
+  const { _append, _patch, ...rest } = chunk
+  Object.assign(state, rest)
+  if (!isObject(_append) && !Array.isArray(_patch)) return chunk
+  if (isObject(_append)) {
+    Object.keys(_append).forEach(key => {
+      const items = _append[key]
+      const current = state[key]
+      if (typeof items === 'string') {
+        state[key] = (typeof current === 'string' ? current : '') + items
+      } else if (isObject(current) && Array.isArray(current.rows)) {
+        state[key] = Object.assign({}, current, { rows: current.rows.concat(items) })
+      } else {
+        state[key] = (Array.isArray(current) ? current : []).concat(items)
+      }
+    })
+  }
+  if (Array.isArray(_patch)) {
+    // Copy touched outputs so renderers see a new value
+    _patch.forEach(op => {
+      const key = op.path.split('/')[1].replace(/~1/g, '/').replace(/~0/g, '~')
+      if (Array.isArray(state[key])) state[key] = state[key].slice()
+      else if (isObject(state[key])) state[key] = JSON.parse(JSON.stringify(state[key]))
+    })
+    applyJSONPatch(state, _patch)
+  }
+  return Object.assign({}, state)
+}
+
 function getModelFuncAPI (model, log=console.log, onChunk) {
   switch (model.type) {
     case 'get':
@@ -778,12 +831,16 @@ function getModelFuncAPI (model, log=console.log, onChunk) {
       return (data) => {
         log('Sending POST request to', model.url)
         const accept = model.stream ? 'text/event-stream' : 'application/json'
+        const headers = {
+          'Accept': accept,
+          'Content-Type': 'application/json'
+        }
+        // Ask for append-only deltas of streamed outputs, only from servers
+        // that advertise them: other origins may not allow the header (CORS)
+        if (model.stream && model.streamDelta) headers['X-JSEE-Stream'] = 'delta'
         return fetch(model.url, {
           method: 'POST',
-          headers: {
-            'Accept': accept,
-            'Content-Type': 'application/json'
-          },
+          headers,
           body: JSON.stringify(data)
         }).then(async (response) => {
           const contentType = response.headers.get('content-type') || ''
@@ -793,6 +850,7 @@ function getModelFuncAPI (model, log=console.log, onChunk) {
             const decoder = new TextDecoder()
             let buffer = ''
             let lastResult = null
+            const state = {}
             while (true) {
               const { done, value } = await reader.read()
               if (done) break
@@ -804,8 +862,8 @@ function getModelFuncAPI (model, log=console.log, onChunk) {
                 if (!trimmed) continue
                 const parsed = parseSSELine(trimmed)
                 if (parsed !== null) {
-                  lastResult = parsed
-                  onChunk(parsed)
+                  lastResult = applySSEChunk(state, parsed)
+                  onChunk(lastResult)
                 }
               }
             }
@@ -814,8 +872,8 @@ function getModelFuncAPI (model, log=console.log, onChunk) {
             if (buffer.trim()) {
               const parsed = parseSSELine(buffer.trim())
               if (parsed !== null) {
-                lastResult = parsed
-                onChunk(parsed)
+                lastResult = applySSEChunk(state, parsed)
+                onChunk(lastResult)
               }
             }
             return lastResult
@@ -1356,6 +1414,8 @@ module.exports = {
   serializeResult,
   parseMultipart,
   parseSSELine,
+  applyJSONPatch,
+  applySSEChunk,
   toTypedArray,
   fromTypedArray,
   wrapTypedArrayInputs,
@@ -21,6 +21,8 @@ const {
   serializeResult,
   parseMultipart,
   parseSSELine,
+  applyJSONPatch,
+  applySSEChunk,
   toTypedArray,
   fromTypedArray,
   wrapTypedArrayInputs,
@@ -649,6 +651,17 @@ describe('getModelFuncAPI', () => {
       body: JSON.stringify({ x: 10 })
     })
   })
+
+  test('asks for stream deltas only when the server advertises them', async () => {
+    global.fetch.mockResolvedValue({
+      headers: { get: () => 'application/json' },
+      json: () => Promise.resolve({ result: 1 })
+    })
+    await getModelFuncAPI({ type: 'post', url: 'https://other.example.com/run', stream: true }, mockLog)({})
+    expect(global.fetch.mock.calls[0][1].headers['X-JSEE-Stream']).toBeUndefined()
+    await getModelFuncAPI({ type: 'post', url: '/run', stream: true, streamDelta: true }, mockLog)({})
+    expect(global.fetch.mock.calls[1][1].headers['X-JSEE-Stream']).toBe('delta')
+  })
 })
 
 describe('validateSchema', () => {
@@ -1043,6 +1056,60 @@ describe('parseSSELine', () => {
   })
 })
 
+describe('applySSEChunk', () => {
+  test('passes full chunks through and tracks state', () => {
+    const state = {}
+    expect(applySSEChunk(state, { chat: 'Hel', n: 1 })).toEqual({ chat: 'Hel', n: 1 })
+    expect(state).toEqual({ chat: 'Hel', n: 1 })
+  })
+
+  test('appends _append deltas to string outputs', () => {
+    const state = {}
+    applySSEChunk(state, { chat: 'Hel' })
+    expect(applySSEChunk(state, { _append: { chat: 'lo' }, n: 2 })).toEqual({ chat: 'Hello', n: 2 })
+  })
+
+  test('starts missing outputs from an empty string', () => {
+    expect(applySSEChunk({}, { _append: { text: 'a' } })).toEqual({ text: 'a' })
+  })
+
+  test('returns non-object chunks unchanged', () => {
+    expect(applySSEChunk({}, 'plain')).toBe('plain')
+  })
+
+  test('appends rows to tables and arrays', () => {
+    const state = { data: { columns: ['a'], rows: [[1]] }, items: [1] }
+    const result = applySSEChunk(state, { _append: { data: [[2]], items: [2, 3] } })
+    expect(result.data).toEqual({ columns: ['a'], rows: [[1], [2]] })
+    expect(result.items).toEqual([1, 2, 3])
+  })
+
+  test('applies _patch ops', () => {
+    const state = { summary: 'start', data: { columns: ['a'], rows: [[1]] } }
+    const result = applySSEChunk(state, { _patch: [
+      { op: 'replace', path: '/summary', value: 'done' },
+      { op: 'add', path: '/data/rows/-', value: [2] }
+    ] })
+    expect(result).toEqual({ summary: 'done', data: { columns: ['a'], rows: [[1], [2]] } })
+  })
+})
+
+describe('applyJSONPatch', () => {
+  test('supports add, replace and remove', () => {
+    const doc = { a: [1, 2], b: { c: 1 } }
+    applyJSONPatch(doc, [
+      { op: 'add', path: '/a/0', value: 0 },
+      { op: 'remove', path: '/b/c' },
+      { op: 'replace', path: '/a/2', value: 5 }
+    ])
+    expect(doc).toEqual({ a: [0, 1, 5], b: {} })
+  })
+
+  test('unescapes ~0 and ~1 in paths', () => {
+    expect(applyJSONPatch({}, [{ op: 'add', path: '/a~1b~0', value: 1 }])).toEqual({ 'a/b~': 1 })
+  })
+})
+
 describe('toTypedArray', () => {
   test('converts JS array to Float64Array', () => {
     const result = toTypedArray([1, 2, 3], 'float64')